@@ -0,0 +1,134 @@
+import re
+from typing import Optional
+from email.utils import format_datetime
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from ...database.database import get_db
+from ...core.hierarchy import require_role, RoleEnum
+from ...database import models
+from ...utils.storage import storage, downloads
+
+# Download autenticado dos objetos (originais, miniaturas, prévias e termos) servido pela própria API,
+# em streaming e com suporte a Range (retomar downloads, visualizadores de PDF que leem por partes).
+router = APIRouter()
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _intervalo(cabecalho: Optional[str], tamanho: int):
+    """
+    (inicio, fim) inclusivo pedido no cabeçalho Range, ou None para o objeto inteiro.
+    Só um intervalo por requisição: pedidos com vários intervalos recebem o objeto inteiro (permitido pela RFC 9110).
+    """
+    if not cabecalho:
+        return None
+    match = _RANGE.match(cabecalho.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    inicio, fim = match.groups()
+    if inicio == "":
+        # bytes=-N: os últimos N bytes
+        inicio, fim = max(tamanho - int(fim), 0), tamanho - 1
+    else:
+        inicio, fim = int(inicio), min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or inicio > fim:
+        raise HTTPException(
+            status_code=416, detail="Intervalo não satisfatível", headers={"Content-Range": f"bytes */{tamanho}"}
+        )
+    return inicio, fim
+
+
+class RespostaArquivo(StreamingResponse):
+    """
+    Streaming em blocos; quando o objeto é um arquivo local e o servidor ASGI oferece a extensão
+    "http.response.zerocopysend", o kernel envia o intervalo direto do arquivo para o socket (sendfile).
+    """
+
+    def __init__(self, conteudo, caminho_local: Optional[str], inicio: int, tamanho: int, **kwargs):
+        super().__init__(conteudo, **kwargs)
+        self.caminho_local = caminho_local
+        self.inicio = inicio
+        self.tamanho = tamanho
+
+    async def __call__(self, scope, receive, send):
+        if self.caminho_local is None or "http.response.zerocopysend" not in scope.get("extensions", {}):
+            await super().__call__(scope, receive, send)
+            return
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        with open(self.caminho_local, "rb") as arquivo:
+            await send({
+                "type": "http.response.zerocopysend",
+                "file": arquivo.fileno(),
+                "offset": self.inicio,
+                "count": self.tamanho,
+                "more_body": False,
+            })
+
+
+async def _objeto_referenciado(db: AsyncSession, object_name: str) -> bool:
+    """Só são servidos objetos ligados a um registro (nada de listar o bucket por tentativa)."""
+    imagens = models.RegistroLesoesImagens
+    stmt = select(imagens.id).filter(or_(
+        imagens.arquivo_path == object_name,
+        imagens.thumbnail_path == object_name,
+        imagens.preview_path == object_name,
+    )).limit(1)
+    if (await db.execute(stmt)).first():
+        return True
+    stmt = select(models.TermoConsentimento.id).filter(models.TermoConsentimento.arquivo_path == object_name).limit(1)
+    return (await db.execute(stmt)).first() is not None
+
+
+@router.api_route("/arquivos/{object_name:path}", methods=["GET", "HEAD"])
+async def baixar_arquivo(
+    object_name: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    if not await _objeto_referenciado(db, object_name):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    info = await storage.stat(object_name)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": info.etag,
+        "Last-Modified": format_datetime(info.modificado_em, usegmt=True),
+        "Cache-Control": "private, max-age=3600",
+    }
+    if request.headers.get("if-none-match") == info.etag:
+        return Response(status_code=304, headers=headers)
+
+    intervalo = _intervalo(request.headers.get("range"), info.tamanho)
+    # If-Range: o intervalo só vale se o objeto não mudou desde a primeira parte
+    if intervalo and request.headers.get("if-range", info.etag) != info.etag:
+        intervalo = None
+
+    inicio, fim = intervalo or (0, info.tamanho - 1)
+    tamanho = fim - inicio + 1
+    headers["Content-Length"] = str(tamanho)
+    status_code = 200
+    if intervalo:
+        status_code = 206
+        headers["Content-Range"] = f"bytes {inicio}-{fim}/{info.tamanho}"
+        downloads["parciais"].inc()
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=info.content_type)
+
+    downloads["downloads"].inc()
+    downloads["bytes_enviados"].inc(tamanho)
+    return RespostaArquivo(
+        storage.ler_intervalo(object_name, inicio, tamanho),
+        storage.caminho_local(object_name),
+        inicio,
+        tamanho,
+        status_code=status_code,
+        headers=headers,
+        media_type=info.content_type,
+    )
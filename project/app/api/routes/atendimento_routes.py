@@ -1,16 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+import os
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response
+from fastapi.responses import ORJSONResponse
 from typing import List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from ...database.database import get_db
 from ...core.hierarchy import require_role, RoleEnum
+from ...core.reference_data import reference_data
 from ...database import models
+from ...database.schemas import PacienteOut, AtendimentoCadastroOut, AtendimentoResumoOut, TermoConsentimentoCadastroOut, InformacoesCompletasOut, LesaoCadastroOut, LesaoOut
 from ...database.schemas import PacienteCreateSchema, TermoConsentimentoCreateSchema, SaudeGeralCreateSchema, AvaliacaoFototipoCreateSchema, RegistroLesoesCreateSchema, RegistroLesoesCreateSchema, LocalLesaoSchema, HistoricoCancerPeleCreateSchema, FatoresRiscoProtecaoCreateSchema, InvestigacaoLesoesSuspeitasCreateSchema, InformacoesCompletasCreateSchema
-from ...utils.minio import upload_to_minio
+from ...utils.minio import TIPOS_TERMO_PERMITIDOS
+from ...utils.storage import storage, armazenar_upload
+from ...utils.cache import invalidate
+from ...crud.objetos import registrar_referencias, remover_objetos_sem_referencia
+from ...utils.imagens import enfileirar_processamento, upload_imagem_normalizada, nova_imagem_lesao
 
-router = APIRouter()
+# Respostas tipadas (response_model) são serializadas pelo pydantic-core e renderizadas com orjson
+router = APIRouter(default_response_class=ORJSONResponse)
 
-@router.post("/cadastrar-paciente", status_code=201)
+# Quantas imagens de uma mesma lesão são enviadas ao armazenamento em paralelo
+LESAO_UPLOAD_CONCORRENCIA = int(os.getenv("LESAO_UPLOAD_CONCORRENCIA", 4))
+
+@router.post("/cadastrar-paciente", status_code=201, response_model=PacienteOut)
 async def cadastrar_paciente(
     paciente_data: PacienteCreateSchema,
     db: AsyncSession = Depends(get_db),
@@ -43,21 +56,9 @@ async def cadastrar_paciente(
     await db.commit()
     await db.refresh(new_paciente)
     
-    return {
-        "id": new_paciente.id,
-        "nome_paciente": new_paciente.nome_paciente,
-        "data_nascimento": new_paciente.data_nascimento,
-        "sexo": new_paciente.sexo,
-        "sexo_outro": new_paciente.sexo_outro,
-        "cpf_paciente": new_paciente.cpf_paciente,
-        "num_cartao_sus": new_paciente.num_cartao_sus,
-        "endereco_paciente": new_paciente.endereco_paciente,
-        "telefone_paciente": new_paciente.telefone_paciente,
-        "email_paciente": new_paciente.email_paciente,
-        "autoriza_pesquisa": new_paciente.autoriza_pesquisa
-    }
+    return new_paciente
 
-@router.post("/cadastrar-atendimento", status_code=201)
+@router.post("/cadastrar-atendimento", status_code=201, response_model=AtendimentoCadastroOut)
 async def cadastrar_atendimento(
     paciente_id: int,
     db: AsyncSession = Depends(get_db),
@@ -89,6 +90,7 @@ async def cadastrar_atendimento(
     db.add(new_atendimento)
     await db.commit()
     await db.refresh(new_atendimento)
+    await invalidate("atendimento")
 
     return {
         "id": new_atendimento.id,
@@ -101,7 +103,7 @@ async def cadastrar_atendimento(
     }
 
 
-@router.get("/cadastrar-atendimento")
+@router.get("/cadastrar-atendimento", response_model=PacienteOut)
 async def get_paciente_by_cpf(
     cpf_paciente: str = Query(..., description="CPF do paciente"),
     db: AsyncSession = Depends(get_db),
@@ -114,23 +116,11 @@ async def get_paciente_by_cpf(
     if not paciente:
         raise HTTPException(status_code=404, detail="Paciente não encontrado")
 
-    return {
-        "id": paciente.id,
-        "nome_paciente": paciente.nome_paciente,
-        "cpf_paciente": paciente.cpf_paciente,
-        "data_nascimento": paciente.data_nascimento,
-        "sexo": paciente.sexo,
-        "sexo_outro": paciente.sexo_outro,
-        "num_cartao_sus": paciente.num_cartao_sus,
-        "endereco_paciente": paciente.endereco_paciente,
-        "telefone_paciente": paciente.telefone_paciente,
-        "email_paciente": paciente.email_paciente,
-        "autoriza_pesquisa": paciente.autoriza_pesquisa
-    }
+    return paciente
 
 
 
-@router.post("/cadastrar-termo-consentimento") 
+@router.post("/cadastrar-termo-consentimento", response_model=TermoConsentimentoCadastroOut)
 async def cadastrar_termo_consentimento( 
     atendimento_id: int,
     file: UploadFile = File(...),
@@ -149,13 +139,15 @@ async def cadastrar_termo_consentimento(
     if atendimento.termo_consentimento_id:
         raise HTTPException(status_code=400, detail="Atendimento já possui um termo de consentimento")
 
-    arquivo_metadata = await upload_to_minio(file, folder_name="termos-consentimento")
+    arquivo_metadata = await armazenar_upload(file, folder_name="termos-consentimento", allowed_types=TIPOS_TERMO_PERMITIDOS)
 
     new_termo = models.TermoConsentimento(
         arquivo_path=arquivo_metadata["url"],
+        content_hash=arquivo_metadata["sha256"],
     )
 
     db.add(new_termo)
+    await registrar_referencias(db, [arquivo_metadata])
     await db.commit()
     await db.refresh(new_termo)
 
@@ -172,7 +164,7 @@ async def cadastrar_termo_consentimento(
         }
     }
 
-@router.post("/cadastrar-informacoes-completas")
+@router.post("/cadastrar-informacoes-completas", response_model=InformacoesCompletasOut)
 async def cadastrar_informacoes_completas(
     dados: InformacoesCompletasCreateSchema,
     atendimento_id: int,
@@ -353,7 +345,7 @@ async def cadastrar_informacoes_completas(
 
 
 
-@router.get("/listar-atendimentos-usuario-logado")
+@router.get("/listar-atendimentos-usuario-logado", response_model=List[AtendimentoResumoOut])
 async def listar_atendimentos_usuario_logado(
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
@@ -387,8 +379,9 @@ async def listar_atendimentos_usuario_logado(
 
     return atendimentos_list
 
-@router.post("/cadastrar-lesao")
+@router.post("/cadastrar-lesao", response_model=LesaoCadastroOut)
 async def cadastrar_lesao(
+    response: Response,
     atendimento_id: int = Form(...),
     local_lesao_id: int = Form(...),
     descricao_lesao: str = Form(...),
@@ -405,9 +398,7 @@ async def cadastrar_lesao(
         raise HTTPException(status_code=404, detail="Atendimento não encontrado")
     
     # Verify local_lesao_id exists
-    stmt_local = select(models.LocalLesao).filter(models.LocalLesao.id == local_lesao_id)
-    result_local = await db.execute(stmt_local)
-    local_lesao = result_local.scalar_one_or_none()
+    local_lesao = reference_data.get_local_lesao(local_lesao_id)
     
     if not local_lesao:
         raise HTTPException(status_code=404, detail="Local de lesão não encontrado")
@@ -422,40 +413,89 @@ async def cadastrar_lesao(
     await db.commit()
     await db.refresh(new_lesao)
 
-    imagens_urls = []
-    if files:      
-        for file in files:
+    # Capturado antes dos uploads: um rollback do lote de imagens expira as instâncias da sessão
+    lesao_dict = {
+        "id": new_lesao.id,
+        "local_lesao_id": new_lesao.local_lesao_id,
+        "local_lesao_nome": local_lesao.nome,
+        "descricao_lesao": new_lesao.descricao_lesao,
+    }
+
+    arquivos = [None] * len(files or [])
+    if files:
+        limite = asyncio.Semaphore(LESAO_UPLOAD_CONCORRENCIA)
+
+        async def enviar(file):
+            async with limite:
+                return await upload_imagem_normalizada(file, folder_name="imagens-lesoes")
+
+        # Validação/normalização (pool de processos) e upload das imagens para o armazenamento em paralelo
+        resultados = await asyncio.gather(*(enviar(file) for file in files), return_exceptions=True)
+
+        enviados = []
+        for i, (file, resultado) in enumerate(zip(files, resultados)):
+            if isinstance(resultado, Exception):
+                erro = resultado.detail if isinstance(resultado, HTTPException) else str(resultado)
+                print(f"Erro ao fazer upload da imagem {file.filename}: {erro}")
+                arquivos[i] = {"arquivo": file.filename, "sucesso": False, "erro": erro}
+            else:
+                enviados.append((i, file, resultado))
+
+        if enviados:
+            # Cria os registros das imagens no banco em um único lote
+            novas_imagens = [
+                nova_imagem_lesao(lesao_dict["id"], arquivo_metadata)
+                for _, _, arquivo_metadata in enviados
+            ]
+            db.add_all(novas_imagens)
             try:
-                # Upload da imagem para o MinIO
-                arquivo_metadata = await upload_to_minio(file, folder_name="imagens-lesoes")
-                imagens_urls.append(arquivo_metadata["url"])
-
-                # Cria o registro da imagem no banco
-                new_imagem = models.RegistroLesoesImagens(
-                    arquivo_path=arquivo_metadata["url"],  # Just use the URL string, not the entire dict
-                    registro_lesoes_id=new_lesao.id
-                )
-                db.add(new_imagem)
+                await registrar_referencias(db, [arquivo_metadata for _, _, arquivo_metadata in enviados])
+                await db.flush()
+                # Miniaturas e prévias são geradas pelo worker, fora do processo da API
+                enfileirar_processamento(db, [imagem.id for imagem in novas_imagens])
+                await db.commit()
             except Exception as e:
-                # Log the error but continue with other files
-                print(f"Erro ao fazer upload da imagem {file.filename}: {str(e)}")
-                continue
-                
-        await db.commit()
+                await db.rollback()
+                print(f"Erro ao registrar imagens da lesão {lesao_dict['id']}: {str(e)}")
+                # Remove do armazenamento os objetos enviados agora que ficaram sem nenhuma referência no banco
+                await remover_objetos_sem_referencia([arquivo_metadata for _, _, arquivo_metadata in enviados])
+                for i, file, _ in enviados:
+                    arquivos[i] = {"arquivo": file.filename, "sucesso": False, "erro": "Erro ao registrar imagem no banco"}
+                enviados = []
+
+        for i, file, arquivo_metadata in enviados:
+            arquivos[i] = {
+                "arquivo": file.filename,
+                "sucesso": True,
+                "arquivo_path": arquivo_metadata["url"],
+                "tamanho_original": arquivo_metadata["tamanho_original"],
+                "tamanho_normalizado": arquivo_metadata["tamanho"],
+                "largura": arquivo_metadata["largura"],
+                "altura": arquivo_metadata["altura"],
+                # Devolvida já na resposta para o pesquisador refazer a foto se necessário
+                "qualidade": arquivo_metadata["qualidade"]
+            }
+
+    imagens_urls = [arquivo["arquivo_path"] for arquivo in arquivos if arquivo["sucesso"]]
+
+    message = "Lesão e imagens cadastradas com sucesso!"
+    if len(imagens_urls) < len(arquivos):
+        # A lesão foi criada, mas parte (ou todas) as imagens não: 207 para o cliente conferir `arquivos`
+        response.status_code = 207
+        if imagens_urls:
+            message = f"Lesão cadastrada; {len(imagens_urls)} de {len(arquivos)} imagens armazenadas"
+        else:
+            message = "Lesão cadastrada, mas nenhuma imagem foi armazenada"
 
     return {
-        "message": "Lesão e imagens cadastradas com sucesso!",
-        "lesao": {
-            "id": new_lesao.id,
-            "local_lesao_id": new_lesao.local_lesao_id,
-            "local_lesao_nome": local_lesao.nome,
-            "descricao_lesao": new_lesao.descricao_lesao,
-        },
-        "imagens": imagens_urls
+        "message": message,
+        "lesao": lesao_dict,
+        "imagens": imagens_urls,
+        "arquivos": arquivos
     }
 
 
-@router.get("/listar-lesoes/{atendimento_id}")
+@router.get("/listar-lesoes/{atendimento_id}", response_model=List[LesaoOut])
 async def listar_lesoes(
     atendimento_id: int,
     db: AsyncSession = Depends(get_db),
@@ -471,23 +511,35 @@ async def listar_lesoes(
     if not lesoes:
         raise HTTPException(status_code=404, detail="Nenhuma lesão encontrada para este atendimento.")
 
+    # Obtendo as imagens de todas as lesões em uma única consulta
+    stmt_imagens = (
+        select(models.RegistroLesoesImagens)
+        .filter(models.RegistroLesoesImagens.registro_lesoes_id.in_([lesao.id for lesao in lesoes]))
+        .order_by(models.RegistroLesoesImagens.id)
+    )
+    result_imagens = await db.execute(stmt_imagens)
+    imagens_por_lesao = {}
+    for imagem in result_imagens.scalars().all():
+        imagens_por_lesao.setdefault(imagem.registro_lesoes_id, []).append(imagem)
+
+    # URLs de download pré-assinadas, geradas localmente em lote (e reaproveitadas até perto de expirar)
+    urls = await storage.urls_download([
+        path
+        for imagens in imagens_por_lesao.values()
+        for imagem in imagens
+        for path in (imagem.arquivo_path, imagem.thumbnail_path, imagem.preview_path)
+        if path
+    ])
+
     lesoes_list = []
 
     for lesao in lesoes:
-        # Obtendo imagens associadas à lesão
-        stmt_imagens = (
-            select(models.RegistroLesoesImagens)
-            .filter(models.RegistroLesoesImagens.registro_lesoes_id == lesao.id)
-        )
-        result_imagens = await db.execute(stmt_imagens)
-        imagens = result_imagens.scalars().all()
+        imagens = imagens_por_lesao.get(lesao.id, [])
         
         # Get local lesao name if available
         local_lesao_name = None
         if lesao.local_lesao_id:
-            stmt_local = select(models.LocalLesao).filter(models.LocalLesao.id == lesao.local_lesao_id)
-            result_local = await db.execute(stmt_local)
-            local_obj = result_local.scalar_one_or_none()
+            local_obj = reference_data.get_local_lesao(lesao.local_lesao_id)
             if local_obj:
                 local_lesao_name = local_obj.nome
 
@@ -496,14 +548,31 @@ async def listar_lesoes(
             "local_lesao_id": lesao.local_lesao_id,
             "local_lesao_nome": local_lesao_name,
             "descricao_lesao": lesao.descricao_lesao,
-            "imagens": [imagem.arquivo_path for imagem in imagens]
+            "imagens": [imagem.arquivo_path for imagem in imagens],
+            "imagens_detalhes": [
+                {
+                    "id": imagem.id,
+                    "arquivo_path": imagem.arquivo_path,
+                    "url": urls.get(imagem.arquivo_path),
+                    "largura": imagem.largura,
+                    "altura": imagem.altura,
+                    "thumbnail_path": imagem.thumbnail_path,
+                    "thumbnail_url": urls.get(imagem.thumbnail_path),
+                    "thumbnail_largura": imagem.thumbnail_largura,
+                    "thumbnail_altura": imagem.thumbnail_altura,
+                    "preview_path": imagem.preview_path,
+                    "preview_url": urls.get(imagem.preview_path),
+                    "preview_largura": imagem.preview_largura,
+                    "preview_altura": imagem.preview_altura,
+                    "qualidade_aprovada": imagem.qualidade_aprovada,
+                    "qualidade_alertas": imagem.qualidade_alertas or [],
+                }
+                for imagem in imagens
+            ]
         })
 
     return lesoes_list
 
 @router.get("/locais-lesao", response_model=List[LocalLesaoSchema])
-async def get_locais_lesao(db: AsyncSession = Depends(get_db)):
-    stmt = select(models.LocalLesao)
-    result = await db.execute(stmt)
-    locais = result.scalars().all()
-    return locais
+async def get_locais_lesao():
+    return reference_data.list_locais_lesao()
@@ -0,0 +1,147 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func
+from sqlalchemy.future import select
+from ...database.database import get_db
+from ...core.hierarchy import require_role, RoleEnum
+from ...core.reference_data import reference_data
+from ...database import models
+from ...database.schemas import DuplicatasOut, ImagensSimilaresOut, AtendimentoAbcdOut
+from ...utils.phash import indice_phash, PHASH_RAIO_MAX, PHASH_RAIO_PADRAO
+from ...utils.similaridade import indice_similaridade
+from ...utils.storage import storage
+
+# Consultas sobre o conjunto de imagens de lesão como dataset (exportação para ML)
+router = APIRouter(default_response_class=ORJSONResponse)
+
+
+@router.get("/imagens-lesao/duplicatas", response_model=DuplicatasOut)
+async def listar_duplicatas(
+    atendimento_id: Optional[int] = Query(None, description="Restringe a busca a um atendimento; sem ele, o dataset inteiro"),
+    raio: int = Query(PHASH_RAIO_PADRAO, ge=0, le=PHASH_RAIO_MAX, description="Distância de Hamming máxima entre os dHash"),
+    limite: int = Query(100, ge=1, le=1000),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    clusters = await indice_phash.clusters(raio, atendimento_id)
+    return {
+        "raio": raio,
+        "atendimento_id": atendimento_id,
+        "total_clusters": len(clusters),
+        "clusters": [
+            {"tamanho": len(cluster["imagem_ids"]), **cluster}
+            for cluster in clusters[:limite]
+        ],
+    }
+
+
+@router.get("/imagens-lesao/{imagem_id}/similares", response_model=ImagensSimilaresOut)
+async def listar_imagens_similares(
+    imagem_id: int,
+    k: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.SUPERVISOR))
+):
+    imagem = await db.get(models.RegistroLesoesImagens, imagem_id)
+    if not imagem:
+        raise HTTPException(status_code=404, detail="Imagem não encontrada")
+    if imagem.descritor is None:
+        raise HTTPException(status_code=409, detail="Descritor da imagem ainda não foi calculado")
+
+    # Outras fotos da mesma lesão não são "casos similares"
+    stmt = select(models.RegistroLesoesImagens.id).filter(
+        models.RegistroLesoesImagens.registro_lesoes_id == imagem.registro_lesoes_id
+    )
+    mesma_lesao = (await db.execute(stmt)).scalars().all()
+
+    similares = await indice_similaridade.buscar(imagem.descritor, k, excluir=mesma_lesao)
+    if not similares:
+        return {"imagem_id": imagem_id, "aproximado": indice_similaridade.aproximado, "resultados": []}
+
+    stmt = (
+        select(
+            models.RegistroLesoesImagens.id,
+            models.RegistroLesoesImagens.arquivo_path,
+            models.RegistroLesoesImagens.thumbnail_path,
+            models.RegistroLesoesImagens.registro_lesoes_id,
+            models.RegistroLesoes.atendimento_id,
+            models.RegistroLesoes.local_lesao_id,
+        )
+        .join(models.RegistroLesoes, models.RegistroLesoes.id == models.RegistroLesoesImagens.registro_lesoes_id)
+        .filter(models.RegistroLesoesImagens.id.in_([similar_id for similar_id, _ in similares]))
+    )
+    detalhes = {row.id: row for row in (await db.execute(stmt)).all()}
+    urls = await storage.urls_download([row.thumbnail_path for row in detalhes.values() if row.thumbnail_path])
+
+    resultados = []
+    for similar_id, score in similares:
+        row = detalhes.get(similar_id)
+        if row is None:
+            continue
+        local_lesao = reference_data.get_local_lesao(row.local_lesao_id) if row.local_lesao_id else None
+        resultados.append({
+            "imagem_id": similar_id,
+            "score": score,
+            "registro_lesoes_id": row.registro_lesoes_id,
+            "atendimento_id": row.atendimento_id,
+            "local_lesao_id": row.local_lesao_id,
+            "local_lesao_nome": local_lesao.nome if local_lesao else None,
+            "arquivo_path": row.arquivo_path,
+            "thumbnail_url": urls.get(row.thumbnail_path),
+        })
+
+    return {"imagem_id": imagem_id, "aproximado": indice_similaridade.aproximado, "resultados": resultados}
+
+
+@router.get("/atendimentos/caracteristicas-abcd", response_model=List[AtendimentoAbcdOut])
+async def filtrar_atendimentos_abcd(
+    assimetria_min: Optional[float] = Query(None, ge=0, le=1),
+    assimetria_max: Optional[float] = Query(None, ge=0, le=1),
+    irregularidade_borda_min: Optional[float] = Query(None, ge=0),
+    irregularidade_borda_max: Optional[float] = Query(None, ge=0),
+    cores_min: Optional[int] = Query(None, ge=0, le=6),
+    cores_max: Optional[int] = Query(None, ge=0, le=6),
+    variegacao_min: Optional[float] = Query(None, ge=0),
+    variegacao_max: Optional[float] = Query(None, ge=0),
+    diametro_px_min: Optional[float] = Query(None, ge=0),
+    diametro_px_max: Optional[float] = Query(None, ge=0),
+    apos_id: int = Query(0, ge=0, description="Paginação: último atendimento_id da página anterior"),
+    limite: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    """Atendimentos com pelo menos uma imagem de lesão cujas características ABCD caem nas faixas pedidas."""
+    abcd = models.CaracteristicasAbcd
+    faixas = [
+        (abcd.assimetria, assimetria_min, assimetria_max),
+        (abcd.irregularidade_borda, irregularidade_borda_min, irregularidade_borda_max),
+        (abcd.cores, cores_min, cores_max),
+        (abcd.variegacao, variegacao_min, variegacao_max),
+        (abcd.diametro_px, diametro_px_min, diametro_px_max),
+    ]
+    filtros = [abcd.segmentacao_ok.is_(True), abcd.atendimento_id > apos_id]
+    for coluna, minimo, maximo in faixas:
+        if minimo is not None:
+            filtros.append(coluna >= minimo)
+        if maximo is not None:
+            filtros.append(coluna <= maximo)
+
+    stmt = (
+        select(
+            abcd.atendimento_id,
+            func.count(func.distinct(abcd.registro_lesoes_id)).label("lesoes"),
+            func.count(abcd.imagem_id).label("imagens"),
+            func.max(abcd.assimetria).label("assimetria_max"),
+            func.max(abcd.irregularidade_borda).label("irregularidade_borda_max"),
+            func.max(abcd.cores).label("cores_max"),
+            func.max(abcd.variegacao).label("variegacao_max"),
+            func.max(abcd.diametro_px).label("diametro_px_max"),
+        )
+        .filter(*filtros)
+        .group_by(abcd.atendimento_id)
+        .order_by(abcd.atendimento_id)
+        .limit(limite)
+    )
+    result = await db.execute(stmt)
+    return [dict(row._mapping) for row in result.all()]
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+from ...core.hierarchy import require_role, RoleEnum
+from ...core import metrics
+from ...database import models
+
+router = APIRouter()
+
+@router.get("/admin/metricas")
+async def listar_metricas(
+    current_user: models.User = Depends(require_role(RoleEnum.ADMIN))
+):
+    return metrics.snapshot()
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from ...database.database import get_db
+from ...core.hierarchy import require_role, RoleEnum
+from ...database import models
+from ...utils.piramide import garantir_piramide, obter_tile, descritor_dzi
+
+# Visualização com zoom (Deep Zoom / OpenSeadragon): o cliente busca só os tiles da região visível.
+# Os tiles de um objeto endereçado por conteúdo nunca mudam: cache de longa duração no navegador.
+router = APIRouter()
+
+CACHE_IMUTAVEL = "private, max-age=31536000, immutable"
+
+
+async def _imagem(db: AsyncSession, imagem_id: int) -> models.RegistroLesoesImagens:
+    imagem = await db.get(models.RegistroLesoesImagens, imagem_id)
+    if not imagem:
+        raise HTTPException(status_code=404, detail="Imagem não encontrada")
+    return imagem
+
+
+@router.get("/imagens-lesao/{imagem_id}/piramide.dzi")
+async def obter_descritor_piramide(
+    imagem_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    imagem = await _imagem(db, imagem_id)
+    await garantir_piramide(imagem)
+    return Response(
+        content=descritor_dzi(imagem.largura, imagem.altura),
+        media_type="application/xml",
+        headers={"Cache-Control": CACHE_IMUTAVEL},
+    )
+
+
+@router.get("/imagens-lesao/{imagem_id}/piramide_files/{nivel}/{coluna}_{linha}.jpg")
+async def obter_tile_piramide(
+    imagem_id: int,
+    nivel: int,
+    coluna: int,
+    linha: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    imagem = await _imagem(db, imagem_id)
+    etag = f'"{imagem.content_hash or imagem.arquivo_path}-{nivel}-{coluna}-{linha}"'
+    headers = {"Cache-Control": CACHE_IMUTAVEL, "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    tile = await obter_tile(imagem, nivel, coluna, linha)
+    if tile is None:
+        raise HTTPException(status_code=404, detail="Tile não encontrado")
+    return Response(content=tile, media_type="image/jpeg", headers=headers)
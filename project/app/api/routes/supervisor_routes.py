@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
 from typing import List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -9,9 +9,11 @@ from ...core.security import get_password_hash
 from ...database import models
 from ...crud.token import get_user_by_cpf, get_user, get_current_user
 from ...core.hierarchy import require_role, RoleEnum
+from ...core.reference_data import reference_data
 
 from ...core.security import generate_invite_token
-from ...utils.send_email import send_invite_email
+from ...utils.email_outbox import enfileirar_convite
+from ...utils.cache import invalidate
 
 router = APIRouter()
 
@@ -81,7 +83,6 @@ router = APIRouter()
 @router.post("/supervisor/convidar-usuario", response_model=UserInviteSchema)
 async def cadastrar_usuario_supervisor(
     user_data: UserCreateSupervisorSchema, 
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(require_role(RoleEnum.SUPERVISOR))
 ):
@@ -100,9 +101,7 @@ async def cadastrar_usuario_supervisor(
     unidade = current_user.unidadeSaude[0]
 
     # Verifica se a Permissão (role) existe
-    stmt = select(models.Role).filter(models.Role.id == user_data.role_id)
-    result = await db.execute(stmt)
-    role = result.scalars().first()
+    role = await reference_data.role_instance(db, user_data.role_id)
     
     if not role:
         raise HTTPException(status_code=404, detail="Permissão não encontrada")
@@ -128,9 +127,10 @@ async def cadastrar_usuario_supervisor(
                 
                 # Enviar novo e-mail de convite
                 invite_link = f"dermalert://register?token={invite_token}"
-                background_tasks.add_task(send_invite_email, existing_user.email, invite_token)
+                enfileirar_convite(db, existing_user.email, invite_token)
                 
                 await db.commit()
+                await invalidate("usuario")
                 return {"message": "Novo convite enviado com sucesso para usuário com cadastro pendente!"}
             else:
                 invite_token = generate_invite_token(existing_user.email)
@@ -139,9 +139,10 @@ async def cadastrar_usuario_supervisor(
                 existing_user.id_usuario_atualizacao = current_user.id
 
                 invite_link = f"dermalert://register?token={invite_token}"
-                background_tasks.add_task(send_invite_email, existing_user.email, invite_token)
+                enfileirar_convite(db, existing_user.email, invite_token)
                 
                 await db.commit()
+                await invalidate("usuario")
                 return {"message": "Convite reenviado com sucesso para usuário com cadastro pendente!"}
         else:
             # Usuário já completou o cadastro
@@ -165,12 +166,11 @@ async def cadastrar_usuario_supervisor(
     new_user.email_invite_token_used = False
     
     db.add(new_user)
+    # E-mail de convite na mesma transação do token
+    enfileirar_convite(db, new_user.email, invite_token)
     await db.commit()
     await db.refresh(new_user)
-    
-    # Enviar e-mail de convite
-    invite_link = f"dermalert://register?token={invite_token}"
-    background_tasks.add_task(send_invite_email, new_user.email, invite_token)
+    await invalidate("usuario")
     
     return {"message": "Convite enviado com sucesso!"}
 
@@ -210,9 +210,7 @@ async def editar_usuario_supervisor(
             detail="Você não tem permissão para editar esse usuário, pois ele não pertence à sua Unidade de Saúde"
         )
     
-    stmt = select(models.Role).filter(models.Role.id == user_data.role_id)
-    result = await db.execute(stmt)
-    role = result.scalars().first()
+    role = await reference_data.role_instance(db, user_data.role_id)
 
     if not role:
         raise HTTPException(status_code=404, detail="Permissão não encontrada")
@@ -229,5 +227,6 @@ async def editar_usuario_supervisor(
 
     await db.commit()
     await db.refresh(user)
+    await invalidate("usuario")
 
     return user
\ No newline at end of file
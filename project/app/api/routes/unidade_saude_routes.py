@@ -8,6 +8,8 @@ from ...database.database import get_db
 from ...core.hierarchy import require_role, RoleEnum
 from ...database import models
 from ...database.schemas import UnidadeSaudeCreateSchema, UnidadeSaudeUpdateSchema, UserResponseSchema
+from ...utils.cache import cached, invalidate
+from ...utils.single_flight import single_flight
 
 
 router = APIRouter()
@@ -38,10 +40,12 @@ async def cadastrar_unidade_saude(
     db.add(new_unidade)
     await db.commit()
     await db.refresh(new_unidade)
+    await invalidate("unidade")
     
     return new_unidade
 
 @router.get("/listar-unidades-saude")
+@cached(tags=("unidade",))
 async def listar_unidades_saude(db: AsyncSession = Depends(get_db)):
     stmt = select(models.UnidadeSaude)
     result = await db.execute(stmt)
@@ -50,6 +54,8 @@ async def listar_unidades_saude(db: AsyncSession = Depends(get_db)):
     return unidades
 
 @router.get("/listar-unidade-saude/{unidade_id}")
+@cached(tags=("unidade", "atendimento", "usuario"), ttl=60)
+@single_flight()
 async def listar_unidade_saude(unidade_id: int, db: AsyncSession = Depends(get_db)):
     stmt = select(models.UnidadeSaude).filter(models.UnidadeSaude.id == unidade_id)
     result = await db.execute(stmt)
@@ -115,10 +121,12 @@ async def editar_unidade_saude(
     
     await db.commit()
     await db.refresh(unidade)
+    await invalidate("unidade")
     
     return unidade
 
 @router.get("/listar-usuarios-unidade-saude/{unidade_id}", response_model=List[UserResponseSchema])
+@single_flight()
 async def listar_usuarios_unidade_saude(
     unidade_id: int, 
     db: AsyncSession = Depends(get_db),
@@ -0,0 +1,550 @@
+import os
+import uuid
+import asyncio
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from ...database.database import get_db
+from ...core.hierarchy import require_role, RoleEnum
+from ...core.security import generate_upload_token, verify_upload_token
+from ...database import models
+from ...database.schemas import (
+    ImagensLesaoUploadUrlSchema, TermoConsentimentoUploadUrlSchema, ConfirmarUploadSchema,
+    UploadUrlsOut, ConfirmarUploadOut, ArquivoUploadSolicitacaoSchema,
+    SessaoUploadImagemLesaoSchema, SessaoUploadTermoSchema, SessaoUploadOut
+)
+from ...utils.storage import storage
+from ...utils.minio import (
+    MINIO_PRESIGNED_PUT_EXPIRA_SEGUNDOS, TAMANHO_MAXIMO_UPLOAD_MB, TIPOS_IMAGEM_PERMITIDOS, TIPOS_TERMO_PERMITIDOS
+)
+from ...utils.storage import armazenar_objeto_por_conteudo, baixar_para_temporario, sha256_objeto
+from ...utils.imagens import (
+    IMAGENS_CONCORRENCIA, enfileirar_processamento, armazenar_imagem_normalizada, nova_imagem_lesao
+)
+from ...utils.sessoes_upload import UPLOAD_CHUNK_BYTES, sessao_out
+from ...crud.objetos import registrar_referencias, remover_objetos_sem_referencia
+
+# Fluxo em duas fases: o cliente pede URLs pré-assinadas, envia os bytes direto ao MinIO (num objeto
+# temporário) e depois confirma; só então o arquivo passa pelo mesmo caminho do upload pela API
+# (normalização e qualidade das imagens, endereçamento por conteúdo, contagem de referências)
+# e os registros são criados no banco.
+router = APIRouter(default_response_class=ORJSONResponse)
+
+
+def _validar_arquivo(arquivo: ArquivoUploadSolicitacaoSchema, allowed_types):
+    if arquivo.content_type not in allowed_types:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tipo de arquivo não permitido. Tipos aceitos: {', '.join(allowed_types)}"
+        )
+    if arquivo.tamanho <= 0 or arquivo.tamanho > TAMANHO_MAXIMO_UPLOAD_MB * 1024 * 1024:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Arquivo muito grande. Tamanho máximo: {TAMANHO_MAXIMO_UPLOAD_MB}MB"
+        )
+
+
+async def _emitir_urls(current_user, destino, arquivos):
+    esperados = []
+    uploads = []
+    for arquivo in arquivos:
+        object_name = f"uploads/{uuid.uuid4().hex}{os.path.splitext(arquivo.nome_arquivo)[1].lower()}"
+        url = await storage.url_upload(object_name)
+        esperados.append({
+            "nome_arquivo": arquivo.nome_arquivo,
+            "object_name": object_name,
+            "content_type": arquivo.content_type,
+            "tamanho": arquivo.tamanho,
+        })
+        uploads.append({
+            "nome_arquivo": arquivo.nome_arquivo,
+            "object_name": object_name,
+            "url": url,
+            "headers": {"Content-Type": arquivo.content_type},
+            "tamanho_maximo": arquivo.tamanho,
+        })
+
+    # O token vale um pouco mais que as URLs para dar tempo de confirmar o último upload
+    validade = timedelta(seconds=MINIO_PRESIGNED_PUT_EXPIRA_SEGUNDOS) + timedelta(minutes=15)
+    return {
+        "upload_token": generate_upload_token(current_user.id, destino, esperados, validade),
+        "expira_em": datetime.now() + timedelta(seconds=MINIO_PRESIGNED_PUT_EXPIRA_SEGUNDOS),
+        "uploads": uploads,
+    }
+
+
+async def _verificar_objeto(esperado: dict):
+    """HEAD no objeto enviado; objetos fora do combinado são removidos."""
+    stat = await storage.stat(esperado["object_name"])
+    if stat is None:
+        return "Arquivo não foi enviado"
+    erro = None
+    if stat.tamanho > esperado["tamanho"]:
+        erro = "Tamanho do arquivo enviado maior que o informado"
+    elif stat.content_type != esperado["content_type"]:
+        erro = "Tipo do arquivo enviado diferente do informado"
+    if erro:
+        await storage.remover(esperado["object_name"])
+    return erro
+
+
+def _payload_upload(token: str, current_user, tipo: str):
+    payload = verify_upload_token(token, current_user.id)
+    if not payload or payload["destino"].get("tipo") != tipo:
+        raise HTTPException(status_code=400, detail="Token de upload inválido ou expirado")
+    return payload
+
+
+@router.post("/imagens-lesao/upload-url", response_model=UploadUrlsOut)
+async def solicitar_upload_imagens_lesao(
+    dados: ImagensLesaoUploadUrlSchema,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    if not dados.arquivos:
+        raise HTTPException(status_code=400, detail="Nenhum arquivo informado")
+
+    lesao = await db.get(models.RegistroLesoes, dados.registro_lesoes_id)
+    if not lesao:
+        raise HTTPException(status_code=404, detail="Lesão não encontrada")
+
+    for arquivo in dados.arquivos:
+        _validar_arquivo(arquivo, TIPOS_IMAGEM_PERMITIDOS)
+
+    destino = {"tipo": "imagens-lesao", "registro_lesoes_id": lesao.id}
+    return await _emitir_urls(current_user, destino, dados.arquivos)
+
+
+def _imagem_out(nome_arquivo, metadata: dict) -> dict:
+    return {
+        "arquivo": nome_arquivo,
+        "sucesso": True,
+        "arquivo_path": metadata["url"],
+        "tamanho_original": metadata["tamanho_original"],
+        "tamanho_normalizado": metadata["tamanho"],
+        "largura": metadata["largura"],
+        "altura": metadata["altura"],
+        "qualidade": metadata["qualidade"],
+    }
+
+
+async def _normalizar_enviado(esperado: dict) -> dict:
+    erro = await _verificar_objeto(esperado)
+    if erro:
+        raise HTTPException(status_code=400, detail=erro)
+    caminho = await baixar_para_temporario(esperado["object_name"], esperado["tamanho"])
+    try:
+        return await armazenar_imagem_normalizada(caminho, "imagens-lesoes")
+    finally:
+        await asyncio.to_thread(os.unlink, caminho)
+
+
+async def _imagens_por_objeto(db, object_names) -> dict:
+    """Imagens já registradas por objeto temporário, como dicionários (sobrevivem a um rollback da sessão)."""
+    modelo = models.RegistroLesoesImagens
+    stmt = select(
+        modelo.objeto_upload, modelo.arquivo_path, modelo.tamanho_original, modelo.tamanho_normalizado,
+        modelo.largura, modelo.altura
+    ).filter(modelo.objeto_upload.in_(object_names))
+    return {row.objeto_upload: dict(row._mapping) for row in (await db.execute(stmt)).all()}
+
+
+@router.post("/imagens-lesao/confirmar-upload", response_model=ConfirmarUploadOut)
+async def confirmar_upload_imagens_lesao(
+    dados: ConfirmarUploadSchema,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    payload = _payload_upload(dados.upload_token, current_user, "imagens-lesao")
+    registro_lesoes_id = payload["destino"]["registro_lesoes_id"]
+    esperados = payload["arquivos"]
+
+    # Confirmação idempotente: objetos já registrados não geram uma segunda linha
+    ja_registrados = await _imagens_por_objeto(db, [e["object_name"] for e in esperados])
+    pendentes = [e for e in esperados if e["object_name"] not in ja_registrados]
+
+    limite = asyncio.Semaphore(IMAGENS_CONCORRENCIA)
+
+    async def normalizar(esperado):
+        async with limite:
+            return await _normalizar_enviado(esperado)
+
+    # Normalização (pool de processos) e gravação endereçada por conteúdo, em paralelo
+    resultados = await asyncio.gather(*(normalizar(e) for e in pendentes), return_exceptions=True)
+    resultados = {e["object_name"]: resultado for e, resultado in zip(pendentes, resultados)}
+
+    novos = []
+    for object_name, metadata in resultados.items():
+        if not isinstance(metadata, Exception):
+            imagem = nova_imagem_lesao(registro_lesoes_id, metadata)
+            imagem.objeto_upload = object_name
+            novos.append((imagem, metadata))
+
+    if novos:
+        # Lock na lesão até o commit: uma confirmação simultânea do mesmo token (retentativa do cliente)
+        # espera esta e, ao conferir de novo, encontra as imagens já registradas
+        stmt = select(models.RegistroLesoes.id).filter(models.RegistroLesoes.id == registro_lesoes_id).with_for_update()
+        await db.execute(stmt)
+        ja_registrados.update(await _imagens_por_objeto(db, [imagem.objeto_upload for imagem, _ in novos]))
+        novos = [(imagem, metadata) for imagem, metadata in novos if imagem.objeto_upload not in ja_registrados]
+
+    if novos:
+        db.add_all([imagem for imagem, _ in novos])
+        try:
+            await registrar_referencias(db, [metadata for _, metadata in novos])
+            await db.flush()
+            # Miniaturas e prévias ficam com o worker; a tarefa só existe se as imagens forem gravadas
+            enfileirar_processamento(db, [imagem.id for imagem, _ in novos])
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            print(f"Erro ao registrar imagens da lesão {registro_lesoes_id}: {str(e)}")
+            await remover_objetos_sem_referencia([metadata for _, metadata in novos])
+            # Os objetos temporários ficam: o cliente pode confirmar de novo
+            for object_name in resultados:
+                if not isinstance(resultados[object_name], Exception):
+                    resultados[object_name] = Exception("Erro ao registrar imagem no banco")
+
+    arquivos = []
+    concluidos = []
+    for esperado in esperados:
+        object_name = esperado["object_name"]
+        if object_name in ja_registrados:
+            imagem = ja_registrados[object_name]
+            arquivos.append({
+                "arquivo": esperado["nome_arquivo"],
+                "sucesso": True,
+                "arquivo_path": imagem["arquivo_path"],
+                "tamanho_original": imagem["tamanho_original"],
+                "tamanho_normalizado": imagem["tamanho_normalizado"],
+                "largura": imagem["largura"],
+                "altura": imagem["altura"],
+            })
+            continue
+        resultado = resultados[object_name]
+        if isinstance(resultado, HTTPException):
+            # Erro do próprio arquivo (ausente, fora do combinado, imagem inválida): o temporário, se existir, é descartado
+            concluidos.append(object_name)
+            arquivos.append({"arquivo": esperado["nome_arquivo"], "sucesso": False, "erro": resultado.detail})
+        elif isinstance(resultado, Exception):
+            arquivos.append({"arquivo": esperado["nome_arquivo"], "sucesso": False, "erro": str(resultado)})
+        else:
+            concluidos.append(object_name)
+            arquivos.append(_imagem_out(esperado["nome_arquivo"], resultado))
+
+    # O conteúdo normalizado já está na chave por conteúdo; os objetos temporários não são mais necessários
+    await asyncio.gather(*(storage.remover(object_name) for object_name in concluidos), return_exceptions=True)
+    return {"message": "Upload de imagens confirmado", "arquivos": arquivos}
+
+
+@router.post("/termo-consentimento/upload-url", response_model=UploadUrlsOut)
+async def solicitar_upload_termo_consentimento(
+    dados: TermoConsentimentoUploadUrlSchema,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    atendimento = await db.get(models.Atendimento, dados.atendimento_id)
+    if not atendimento:
+        raise HTTPException(status_code=404, detail="Atendimento não encontrado")
+
+    if atendimento.termo_consentimento_id:
+        raise HTTPException(status_code=400, detail="Atendimento já possui um termo de consentimento")
+
+    _validar_arquivo(dados.arquivo, TIPOS_TERMO_PERMITIDOS)
+
+    destino = {"tipo": "termo-consentimento", "atendimento_id": atendimento.id}
+    return await _emitir_urls(current_user, destino, [dados.arquivo])
+
+
+@router.post("/termo-consentimento/confirmar-upload", response_model=ConfirmarUploadOut)
+async def confirmar_upload_termo_consentimento(
+    dados: ConfirmarUploadSchema,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    payload = _payload_upload(dados.upload_token, current_user, "termo-consentimento")
+    esperado = payload["arquivos"][0]
+
+    # Lock no atendimento até o commit: duas confirmações simultâneas não criam dois termos
+    stmt = (
+        select(models.Atendimento)
+        .filter(models.Atendimento.id == payload["destino"]["atendimento_id"])
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    atendimento = (await db.execute(stmt)).scalars().first()
+    if not atendimento:
+        raise HTTPException(status_code=404, detail="Atendimento não encontrado")
+
+    if atendimento.termo_consentimento_id:
+        raise HTTPException(status_code=400, detail="Atendimento já possui um termo de consentimento")
+
+    erro = await _verificar_objeto(esperado)
+    if erro:
+        return {
+            "message": "Upload do termo de consentimento não confirmado",
+            "arquivos": [{"arquivo": esperado["nome_arquivo"], "sucesso": False, "erro": erro}]
+        }
+
+    # Endereçamento por conteúdo: o objeto temporário é lido uma vez para o hash e copiado no servidor
+    sha256, tamanho = await sha256_objeto(esperado["object_name"], esperado["tamanho"])
+    extensao = os.path.splitext(esperado["object_name"])[1]
+    metadata = await armazenar_objeto_por_conteudo(
+        esperado["object_name"], sha256, tamanho, "termos-consentimento", extensao, esperado["content_type"]
+    )
+    new_termo = models.TermoConsentimento(arquivo_path=metadata["url"], content_hash=sha256)
+    db.add(new_termo)
+    try:
+        await registrar_referencias(db, [metadata])
+        await db.flush()
+        atendimento.termo_consentimento_id = new_termo.id
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        await remover_objetos_sem_referencia([metadata])
+        raise
+
+    await storage.remover(esperado["object_name"])
+    return {
+        "message": "Termo de Consentimento cadastrado com sucesso!",
+        "arquivos": [{"arquivo": esperado["nome_arquivo"], "sucesso": True, "arquivo_path": metadata["url"]}]
+    }
+
+
+# Upload retomável (conexões instáveis dos postos de saúde): o arquivo vai em blocos de tamanho fixo,
+# cada um uma parte de um multipart upload. Após uma queda o cliente consulta o offset e reenvia
+# no máximo o bloco interrompido, em vez de recomeçar do byte zero.
+
+async def _criar_sessao(db, current_user, destino, arquivo: ArquivoUploadSolicitacaoSchema):
+    sessao_id = uuid.uuid4().hex
+    object_name = f"uploads/{sessao_id}{os.path.splitext(arquivo.nome_arquivo)[1].lower()}"
+    upload_id = await storage.iniciar_multipart(object_name, arquivo.content_type)
+    sessao = models.SessaoUpload(
+        id=sessao_id,
+        user_id=current_user.id,
+        destino=destino,
+        nome_arquivo=arquivo.nome_arquivo,
+        content_type=arquivo.content_type,
+        tamanho=arquivo.tamanho,
+        tamanho_chunk=UPLOAD_CHUNK_BYTES,
+        bytes_recebidos=0,
+        object_name=object_name,
+        upload_id=upload_id,
+        partes=[],
+        resultado=None,
+        atualizado_em=datetime.now(),
+    )
+    db.add(sessao)
+    await db.commit()
+    return sessao_out(sessao)
+
+
+async def _sessao(db, sessao_id: str, current_user, bloquear=False) -> models.SessaoUpload:
+    stmt = select(models.SessaoUpload).filter(models.SessaoUpload.id == sessao_id)
+    if bloquear:
+        # Serializa blocos repetidos (retentativas em paralelo) e a finalização da mesma sessão
+        stmt = stmt.with_for_update().execution_options(populate_existing=True)
+    sessao = (await db.execute(stmt)).scalars().first()
+    if not sessao or sessao.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Sessão de upload não encontrada")
+    return sessao
+
+
+async def _ler_bloco(request: Request, limite: int) -> bytes:
+    partes = []
+    recebidos = 0
+    async for pedaco in request.stream():
+        recebidos += len(pedaco)
+        if recebidos > limite:
+            raise HTTPException(status_code=413, detail=f"Bloco maior que o esperado ({limite} bytes)")
+        partes.append(pedaco)
+    return b"".join(partes)
+
+
+@router.post("/imagens-lesao/upload-sessao", status_code=201, response_model=SessaoUploadOut)
+async def criar_sessao_upload_imagem_lesao(
+    dados: SessaoUploadImagemLesaoSchema,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    lesao = await db.get(models.RegistroLesoes, dados.registro_lesoes_id)
+    if not lesao:
+        raise HTTPException(status_code=404, detail="Lesão não encontrada")
+    _validar_arquivo(dados.arquivo, TIPOS_IMAGEM_PERMITIDOS)
+
+    destino = {"tipo": "imagens-lesao", "registro_lesoes_id": lesao.id}
+    return await _criar_sessao(db, current_user, destino, dados.arquivo)
+
+
+@router.post("/termo-consentimento/upload-sessao", status_code=201, response_model=SessaoUploadOut)
+async def criar_sessao_upload_termo_consentimento(
+    dados: SessaoUploadTermoSchema,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    atendimento = await db.get(models.Atendimento, dados.atendimento_id)
+    if not atendimento:
+        raise HTTPException(status_code=404, detail="Atendimento não encontrado")
+    if atendimento.termo_consentimento_id:
+        raise HTTPException(status_code=400, detail="Atendimento já possui um termo de consentimento")
+    _validar_arquivo(dados.arquivo, TIPOS_TERMO_PERMITIDOS)
+
+    destino = {"tipo": "termo-consentimento", "atendimento_id": atendimento.id}
+    return await _criar_sessao(db, current_user, destino, dados.arquivo)
+
+
+@router.get("/upload-sessoes/{sessao_id}", response_model=SessaoUploadOut)
+async def consultar_sessao_upload(
+    sessao_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    """Offset a partir do qual o cliente deve continuar depois de uma queda."""
+    return sessao_out(await _sessao(db, sessao_id, current_user))
+
+
+@router.put("/upload-sessoes/{sessao_id}", response_model=SessaoUploadOut)
+async def enviar_bloco_upload(
+    sessao_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Posição do bloco no arquivo (múltiplo de tamanho_chunk)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    sessao = await _sessao(db, sessao_id, current_user)
+    if sessao.resultado is not None:
+        raise HTTPException(status_code=409, detail="Upload já finalizado")
+    if offset != sessao.bytes_recebidos:
+        raise HTTPException(status_code=409, detail=f"Offset esperado: {sessao.bytes_recebidos}")
+    esperado = min(sessao.tamanho_chunk, sessao.tamanho - offset)
+    if esperado <= 0:
+        raise HTTPException(status_code=409, detail="Todos os bytes já foram recebidos")
+
+    # O corpo é lido sem transação aberta (a conexão com o banco volta ao pool durante um envio lento)
+    # e antes de travar a sessão: conexão que cai no meio do bloco não altera nada
+    await db.rollback()
+    dados = await _ler_bloco(request, esperado)
+    if len(dados) != esperado:
+        raise HTTPException(status_code=400, detail=f"O bloco deve ter exatamente {esperado} bytes")
+
+    sessao = await _sessao(db, sessao_id, current_user, bloquear=True)
+    if offset != sessao.bytes_recebidos:
+        # Retentativa de um bloco que já tinha sido gravado
+        raise HTTPException(status_code=409, detail=f"Offset esperado: {sessao.bytes_recebidos}")
+    numero = offset // sessao.tamanho_chunk + 1
+    etag = await storage.enviar_parte(sessao.object_name, sessao.upload_id, numero, dados)
+    sessao.partes = sessao.partes + [[numero, etag]]
+    sessao.bytes_recebidos = offset + len(dados)
+    sessao.atualizado_em = datetime.now()
+    await db.commit()
+    return sessao_out(sessao)
+
+
+async def _registrar_imagem_lesao(db, sessao, metadados):
+    registro_lesoes_id = sessao.destino["registro_lesoes_id"]
+    if not await db.get(models.RegistroLesoes, registro_lesoes_id):
+        raise HTTPException(status_code=404, detail="Lesão não encontrada")
+    # A normalização decodifica a imagem inteira: o pool de processos lê de um arquivo local, não da memória
+    caminho = await baixar_para_temporario(sessao.object_name, sessao.tamanho)
+    try:
+        metadata = await armazenar_imagem_normalizada(caminho, "imagens-lesoes")
+    except HTTPException as e:
+        return {
+            "message": "Upload de imagem não confirmado",
+            "arquivos": [{"arquivo": sessao.nome_arquivo, "sucesso": False, "erro": e.detail}]
+        }
+    finally:
+        await asyncio.to_thread(os.unlink, caminho)
+    metadados.append(metadata)
+
+    imagem = nova_imagem_lesao(registro_lesoes_id, metadata)
+    db.add(imagem)
+    await registrar_referencias(db, [metadata])
+    await db.flush()
+    enfileirar_processamento(db, [imagem.id])
+    return {"message": "Upload de imagem confirmado", "arquivos": [_imagem_out(sessao.nome_arquivo, metadata)]}
+
+
+async def _registrar_termo_consentimento(db, sessao, metadados):
+    stmt = (
+        select(models.Atendimento)
+        .filter(models.Atendimento.id == sessao.destino["atendimento_id"])
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    atendimento = (await db.execute(stmt)).scalars().first()
+    if not atendimento:
+        raise HTTPException(status_code=404, detail="Atendimento não encontrado")
+    if atendimento.termo_consentimento_id:
+        raise HTTPException(status_code=400, detail="Atendimento já possui um termo de consentimento")
+
+    # Mesmo caminho da confirmação pré-assinada: o objeto montado é lido em blocos para o SHA-256
+    # do arquivo e copiado no servidor para a chave por conteúdo
+    sha256, tamanho = await sha256_objeto(sessao.object_name, sessao.tamanho)
+    extensao = os.path.splitext(sessao.object_name)[1]
+    metadata = await armazenar_objeto_por_conteudo(
+        sessao.object_name, sha256, tamanho, "termos-consentimento", extensao, sessao.content_type
+    )
+    metadados.append(metadata)
+    termo = models.TermoConsentimento(arquivo_path=metadata["url"], content_hash=sha256)
+    db.add(termo)
+    await registrar_referencias(db, [metadata])
+    await db.flush()
+    atendimento.termo_consentimento_id = termo.id
+    return {
+        "message": "Termo de Consentimento cadastrado com sucesso!",
+        "arquivos": [{"arquivo": sessao.nome_arquivo, "sucesso": True, "arquivo_path": metadata["url"]}]
+    }
+
+
+@router.post("/upload-sessoes/{sessao_id}/finalizar", response_model=ConfirmarUploadOut)
+async def finalizar_sessao_upload(
+    sessao_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    sessao = await _sessao(db, sessao_id, current_user, bloquear=True)
+    # Finalização idempotente: a resposta de uma finalização anterior (perdida na rede) é repetida
+    if sessao.resultado is not None:
+        return sessao.resultado
+    if sessao.bytes_recebidos != sessao.tamanho:
+        raise HTTPException(status_code=409, detail=f"Upload incompleto: {sessao.bytes_recebidos} de {sessao.tamanho} bytes")
+
+    # Numa retentativa o multipart pode já ter sido concluído (objeto temporário montado)
+    if await storage.stat(sessao.object_name) is None:
+        await storage.concluir_multipart(sessao.object_name, sessao.upload_id, sessao.partes)
+
+    registrar = _registrar_imagem_lesao if sessao.destino["tipo"] == "imagens-lesao" else _registrar_termo_consentimento
+    # Preenchida pelo registro assim que o conteúdo é gravado na chave por conteúdo
+    metadados = []
+    try:
+        resultado = await registrar(db, sessao, metadados)
+        sessao.resultado = resultado
+        sessao.atualizado_em = datetime.now()
+        await db.commit()
+    except Exception:
+        # Objeto copiado para a chave por conteúdo sem referência registrada não pode ficar órfão
+        await db.rollback()
+        await remover_objetos_sem_referencia(metadados)
+        raise
+
+    # O conteúdo já foi gravado com chave endereçada por conteúdo; o objeto temporário não é mais necessário
+    await storage.remover(sessao.object_name)
+    return resultado
+
+
+@router.delete("/upload-sessoes/{sessao_id}", status_code=204)
+async def cancelar_sessao_upload(
+    sessao_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(require_role(RoleEnum.PESQUISADOR))
+):
+    sessao = await _sessao(db, sessao_id, current_user, bloquear=True)
+    if sessao.resultado is None:
+        await storage.abortar_multipart(sessao.object_name, sessao.upload_id)
+    await storage.remover(sessao.object_name)
+    await db.delete(sessao)
+    await db.commit()
+    return Response(status_code=204)
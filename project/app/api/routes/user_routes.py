@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
 from typing import List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -13,7 +13,8 @@ from ...core.hierarchy import require_role, RoleEnum
 
 
 from ...core.security import generate_invite_token, verify_invite_token, verify_user_invite_token
-from ...utils.send_email import send_reset_password_email
+from ...utils.email_outbox import enfileirar_redefinicao_senha
+from ...utils.cache import invalidate
 from ...core.security import verify_reset_token, generate_reset_token, verify_password
 
 router = APIRouter()
@@ -52,6 +53,7 @@ async def completar_cadastro(user_data: CompleteUserSchema, db: AsyncSession = D
 
     await db.commit()
     await db.refresh(user)
+    await invalidate("usuario")
 
     return {"message": "Cadastro completado com sucesso! Você já pode fazer login."}
 
@@ -99,7 +101,6 @@ async def dados_resetar_senha(token: str):
 
 @router.post("/esqueci-minha-senha")
 async def forgot_password(email: str, 
-                          background_tasks: BackgroundTasks,
                           db: AsyncSession = Depends(get_db)):
     stmt = select(models.User).filter(models.User.email == email)
     result = await db.execute(stmt)
@@ -114,7 +115,7 @@ async def forgot_password(email: str,
     user.password_reset_token_used = False
 
     reset_link = f"sdermalert://register?token={reset_token}"
-    background_tasks.add_task(send_reset_password_email, email, reset_token)
+    enfileirar_redefinicao_senha(db, email, reset_token)
 
     await db.commit()
     await db.refresh(user)
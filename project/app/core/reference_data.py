@@ -0,0 +1,126 @@
+import os
+import asyncio
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import make_transient_to_detached
+
+from ..database import models
+from ..database.database import SessionLocal
+
+# Intervalo entre recargas periódicas: alterações feitas direto no banco (scripts, manutenção) chegam a
+# todos os workers sem reinício
+REFERENCE_DATA_REFRESH_SECONDS = float(os.getenv("REFERENCE_DATA_REFRESH_SECONDS", 300))
+
+@dataclass(frozen=True, slots=True)
+class RoleRef:
+    id: int
+    name: str
+    nivel_acesso: int
+
+
+@dataclass(frozen=True, slots=True)
+class LocalLesaoRef:
+    id: int
+    nome: str
+
+
+@dataclass(frozen=True, slots=True)
+class _Snapshot:
+    version: int
+    roles: Mapping[int, RoleRef]
+    locais_lesao: Mapping[int, LocalLesaoRef]
+    locais_lesao_ordenados: Tuple[LocalLesaoRef, ...]
+
+
+class ReferenceRegistry:
+    """
+    Cópia somente-leitura, em memória, das tabelas de referência (roles e locais_lesao).
+
+    As tabelas não são alteradas pela API, então são carregadas no startup e as rotas consultam o
+    registro sem ir ao banco; `refresh_loop` as relê a cada REFERENCE_DATA_REFRESH_SECONDS. Um `load`
+    que encontra dados diferentes gera um novo snapshot imutável com a versão incrementada; a troca é
+    atômica, então leitores nunca veem um estado parcial.
+    """
+
+    def __init__(self):
+        self._snapshot = _Snapshot(
+            version=0,
+            roles=MappingProxyType({}),
+            locais_lesao=MappingProxyType({}),
+            locais_lesao_ordenados=(),
+        )
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot.version > 0
+
+    async def load(self, db: Optional[AsyncSession] = None) -> int:
+        if db is None:
+            async with SessionLocal() as session:
+                return await self.load(session)
+
+        result = await db.execute(select(models.Role.id, models.Role.name, models.Role.nivel_acesso))
+        roles = {row.id: RoleRef(row.id, row.name, row.nivel_acesso) for row in result.all()}
+
+        result = await db.execute(select(models.LocalLesao.id, models.LocalLesao.nome).order_by(models.LocalLesao.id))
+        locais = tuple(LocalLesaoRef(row.id, row.nome) for row in result.all())
+
+        atual = self._snapshot
+        if self.loaded and roles == dict(atual.roles) and locais == atual.locais_lesao_ordenados:
+            return atual.version
+
+        self._snapshot = _Snapshot(
+            version=self._snapshot.version + 1,
+            roles=MappingProxyType(roles),
+            locais_lesao=MappingProxyType({local.id: local for local in locais}),
+            locais_lesao_ordenados=locais,
+        )
+        print(f"Dados de referência carregados (versão {self._snapshot.version}): "
+              f"{len(roles)} roles, {len(locais)} locais de lesão")
+        return self._snapshot.version
+
+    async def refresh_loop(self, stop: asyncio.Event):
+        """Recarga periódica, iniciada no lifespan de cada worker da API; termina com `stop` sinalizado."""
+        while True:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=REFERENCE_DATA_REFRESH_SECONDS)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.load()
+            except Exception as e:
+                # Mantém o snapshot atual; tenta de novo no próximo intervalo
+                print(f"Erro ao recarregar os dados de referência: {str(e)}")
+
+    def get_role(self, role_id: int) -> Optional[RoleRef]:
+        return self._snapshot.roles.get(role_id)
+
+    def get_local_lesao(self, local_lesao_id: int) -> Optional[LocalLesaoRef]:
+        return self._snapshot.locais_lesao.get(local_lesao_id)
+
+    def list_locais_lesao(self) -> Tuple[LocalLesaoRef, ...]:
+        return self._snapshot.locais_lesao_ordenados
+
+    async def role_instance(self, db: AsyncSession, role_id: int) -> Optional[models.Role]:
+        """
+        Retorna um models.Role associado à sessão sem emitir SELECT.
+        Usa a instância do identity map quando ela já existe (ex.: roles do usuário logado).
+        """
+        ref = self.get_role(role_id)
+        if ref is None:
+            return None
+        role = models.Role(id=ref.id, name=ref.name, nivel_acesso=ref.nivel_acesso)
+        make_transient_to_detached(role)
+        return await db.merge(role, load=False)
+
+
+reference_data = ReferenceRegistry()
@@ -59,3 +59,19 @@ def verify_reset_token(token: str):
         return None
     except jwt.InvalidTokenError:
         return None
+
+
+def generate_upload_token(user_id: int, destino: dict, arquivos: list, expires_in: timedelta):
+    # Token de upload direto: fixa quem enviou, onde o registro será criado e quais objetos são esperados
+    expire = datetime.now() + expires_in
+    payload = {"sub": str(user_id), "exp": expire, "type": "upload", "destino": destino, "arquivos": arquivos}
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+
+def verify_upload_token(token: str, user_id: int):
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("type") != "upload" or payload.get("sub") != str(user_id):
+        return None
+    return payload
@@ -0,0 +1,88 @@
+import asyncio
+from collections import Counter
+from typing import Iterable, List
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..database.models import ObjetoArmazenado
+from ..database.database import SessionLocal
+from ..utils.storage import storage
+
+
+async def _bloquear_hashes(db: AsyncSession, hashes: Iterable[str]):
+    """
+    Advisory lock por sha256 até o fim da transação: serializa o registro de referências e a limpeza
+    de objetos órfãos do mesmo conteúdo. Ordem fixa para duas transações não se travarem.
+    """
+    for sha256 in sorted(set(hashes)):
+        await db.execute(select(func.pg_advisory_xact_lock(func.hashtextextended(sha256, 0))))
+
+
+async def _referenciados(db: AsyncSession, hashes: Iterable[str]) -> set:
+    stmt = select(ObjetoArmazenado.sha256).filter(ObjetoArmazenado.sha256.in_(list(hashes)))
+    return set((await db.execute(stmt)).scalars().all())
+
+
+async def registrar_referencias(db: AsyncSession, metadados: Iterable[dict]):
+    """
+    Soma uma referência por upload ao objeto endereçado por conteúdo (cria a linha se for novo).
+    Deve rodar na mesma transação que grava os registros que apontam para os objetos.
+
+    Objeto ainda sem linha pode ter sido apagado pela limpeza de outro upload que falhou entre o envio
+    (ou a deduplicação) e este ponto; objeto com linha em outro caminho pode ter sido movido para a
+    camada fria (e o original apagado) pelo tiering. Com o lock tomado, a existência é conferida de novo.
+    """
+    metadados = [m for m in metadados if m.get("sha256")]
+    if not metadados:
+        return
+    contagem = Counter(m["sha256"] for m in metadados)
+    por_hash = {m["sha256"]: m for m in metadados}
+
+    await _bloquear_hashes(db, contagem)
+    stmt = select(ObjetoArmazenado.sha256, ObjetoArmazenado.object_name).filter(ObjetoArmazenado.sha256.in_(list(contagem)))
+    caminhos = dict((await db.execute(stmt)).all())
+    a_conferir = [sha256 for sha256 in contagem if caminhos.get(sha256) != por_hash[sha256]["url"]]
+    stats = await asyncio.gather(*(storage.stat(por_hash[sha256]["url"]) for sha256 in a_conferir))
+    if any(stat is None for stat in stats):
+        raise HTTPException(status_code=409, detail="Arquivo removido durante o envio; envie novamente")
+
+    stmt = insert(ObjetoArmazenado).values([
+        {
+            "sha256": sha256,
+            "object_name": por_hash[sha256]["url"],
+            "tamanho": por_hash[sha256]["tamanho"],
+            "content_type": por_hash[sha256].get("content_type"),
+            "ref_count": quantidade,
+        }
+        for sha256, quantidade in contagem.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ObjetoArmazenado.sha256],
+        set_={"ref_count": ObjetoArmazenado.ref_count + stmt.excluded.ref_count},
+    )
+    await db.execute(stmt)
+
+
+async def remover_objetos_sem_referencia(metadados: Iterable[dict]) -> List[str]:
+    """
+    Dentre uploads recém-enviados (não reaproveitados), remove do armazenamento os objetos que nenhum
+    registro referencia. Usado quando a transação que os registraria falhou.
+
+    Roda na própria transação, com o lock de cada sha256: um upload concorrente do mesmo conteúdo
+    ou já registrou a referência (e o objeto fica) ou vai encontrar o objeto ausente ao registrar.
+    """
+    novos = {m["sha256"]: m["url"] for m in metadados if m.get("sha256") and not m.get("reutilizado")}
+    if not novos:
+        return []
+    async with SessionLocal() as db:
+        await _bloquear_hashes(db, novos)
+        referenciados = await _referenciados(db, novos)
+        orfaos = [object_name for sha256, object_name in novos.items() if sha256 not in referenciados]
+        # Removidos com o lock ainda tomado
+        await asyncio.gather(*(storage.remover(object_name) for object_name in orfaos), return_exceptions=True)
+        await db.commit()
+    return orfaos
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Table, JSON, TIMESTAMP, Boolean, Enum, DATE, CheckConstraint
+from sqlalchemy import Column, Integer, BigInteger, Float, LargeBinary, String, Text, ForeignKey, Table, JSON, TIMESTAMP, Boolean, Enum, DATE, CheckConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -96,6 +96,35 @@ class RegistroLesoesImagens(Base):
     arquivo_path = Column(String(300), nullable=False)
     registro_lesoes_id = Column(Integer, ForeignKey('registroLesoes.id'))
     registro_lesoes = relationship('RegistroLesoes')
+    content_hash = Column(String(64), index=True, nullable=True)
+    # Objeto temporário do upload direto (URL pré-assinada) que originou a imagem: confirmação idempotente
+    objeto_upload = Column(String(300), nullable=True, unique=True)
+    # Bytes recebidos do cliente e bytes gravados após a normalização (reencode sem metadados)
+    tamanho_original = Column(Integer, nullable=True)
+    tamanho_normalizado = Column(Integer, nullable=True)
+    # Qualidade da foto calculada no upload (nitidez = variância do Laplaciano; exposição = fração de pixels estourados)
+    nitidez = Column(Float, nullable=True)
+    subexposicao = Column(Float, nullable=True)
+    sobreexposicao = Column(Float, nullable=True)
+    brilho_medio = Column(Float, nullable=True)
+    qualidade_aprovada = Column(Boolean, nullable=True, index=True)
+    qualidade_alertas = Column(JSON, nullable=True)
+    # dHash de 64 bits (com sinal) para detectar quase-duplicatas
+    phash = Column(BigInteger, nullable=True)
+    # Descritor visual (float32, ver utils/descritores.py) usado na busca de lesões similares
+    descritor = Column(LargeBinary, nullable=True)
+    # Nível máximo da pirâmide de tiles (Deep Zoom) já gerada no MinIO; nulo = ainda não gerada
+    piramide_nivel_max = Column(Integer, nullable=True)
+
+    # Derivados gerados em background (miniatura e prévia), armazenados ao lado do original
+    largura = Column(Integer, nullable=True)
+    altura = Column(Integer, nullable=True)
+    thumbnail_path = Column(String(300), nullable=True)
+    thumbnail_largura = Column(Integer, nullable=True)
+    thumbnail_altura = Column(Integer, nullable=True)
+    preview_path = Column(String(300), nullable=True)
+    preview_largura = Column(Integer, nullable=True)
+    preview_altura = Column(Integer, nullable=True)
 
 class LocalLesao(Base):
     __tablename__ = 'locais_lesao'
@@ -122,6 +151,123 @@ class TermoConsentimento(Base):
     id = Column(Integer, primary_key=True, index=True)
     arquivo_path = Column(String(300), nullable=False)
     data_acordo = Column(TIMESTAMP, server_default=func.now())
+    content_hash = Column(String(64), index=True, nullable=True)
+
+
+class ObjetoArmazenado(Base):
+    """Objeto endereçado por conteúdo no MinIO e quantos registros o referenciam."""
+    __tablename__ = 'objetos_armazenados'
+    sha256 = Column(String(64), primary_key=True)
+    object_name = Column(String(300), unique=True, nullable=False)
+    tamanho = Column(BigInteger, nullable=False)
+    content_type = Column(String(100), nullable=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+    data_criacao = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+
+class CaracteristicasAbcd(Base):
+    """Características ABCD calculadas a partir da imagem da lesão (ver utils/abcd.py)."""
+    __tablename__ = 'caracteristicas_abcd'
+    id = Column(Integer, primary_key=True, index=True)
+    imagem_id = Column(Integer, ForeignKey('registroLesoesImagens.id'), unique=True, nullable=False)
+    # Desnormalizados para filtrar atendimentos/lesões sem joins
+    registro_lesoes_id = Column(Integer, ForeignKey('registroLesoes.id'), index=True, nullable=False)
+    atendimento_id = Column(Integer, ForeignKey('atendimentos.id'), index=True, nullable=False)
+    versao = Column(Integer, nullable=False)
+    segmentacao_ok = Column(Boolean, nullable=False)
+    fracao_imagem = Column(Float, nullable=True)
+    # Colunas com índice: consultas por faixa (>=, <=, BETWEEN)
+    assimetria = Column(Float, index=True, nullable=True)
+    assimetria_eixo_maior = Column(Float, nullable=True)
+    assimetria_eixo_menor = Column(Float, nullable=True)
+    irregularidade_borda = Column(Float, index=True, nullable=True)
+    cores = Column(Integer, index=True, nullable=True)
+    variegacao = Column(Float, index=True, nullable=True)
+    diametro_px = Column(Float, index=True, nullable=True)
+    area_px = Column(Integer, nullable=True)
+    data_calculo = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+class ProgressoJob(Base):
+    """Ponto de retomada de jobs em lote (último id processado e totais acumulados)."""
+    __tablename__ = 'progresso_jobs'
+    nome = Column(String(100), primary_key=True)
+    ultimo_id = Column(Integer, nullable=False, default=0)
+    totais = Column(JSON, nullable=True)
+    atualizado_em = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+class SessaoUpload(Base):
+    """
+    Upload retomável: o cliente envia o arquivo em blocos (partes de um multipart upload) e, após uma queda,
+    consulta `bytes_recebidos` e continua dali. `resultado` guarda a resposta da finalização (idempotente).
+    """
+    __tablename__ = 'sessoes_upload'
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    destino = Column(JSON, nullable=False)
+    nome_arquivo = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=False)
+    tamanho = Column(BigInteger, nullable=False)
+    tamanho_chunk = Column(Integer, nullable=False)
+    bytes_recebidos = Column(BigInteger, nullable=False, default=0)
+    object_name = Column(String(300), nullable=False)
+    upload_id = Column(String(300), nullable=False)
+    partes = Column(JSON, nullable=False, default=list)
+    resultado = Column(JSON, nullable=True)
+    data_criacao = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    atualizado_em = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False, index=True)
+
+class EmailOutbox(Base):
+    """
+    E-mail a enviar, gravado na mesma transação que o gerou (ex.: token de convite): se o commit
+    acontece o e-mail sai, mesmo que o processo reinicie; se não acontece, nada é enviado.
+    """
+    __tablename__ = 'email_outbox'
+    id = Column(Integer, primary_key=True, index=True)
+    destinatario = Column(String(255), nullable=False)
+    assunto = Column(String(255), nullable=False)
+    # Apagado depois do envio: os links carregam tokens de convite/redefinição
+    corpo = Column(Text, nullable=True)
+    html = Column(Boolean, nullable=False, default=True)
+    status = Column(String(20), nullable=False, default="pendente", server_default="pendente")
+    tentativas = Column(Integer, nullable=False, default=0)
+    proxima_tentativa = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    ultimo_erro = Column(String(500), nullable=True)
+    data_criacao = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    data_envio = Column(TIMESTAMP, nullable=True)
+
+    __table_args__ = (
+        # Índice parcial: o dispatcher só olha as pendentes, em ordem de próxima tentativa
+        Index('ix_email_outbox_pendentes', 'proxima_tentativa', postgresql_where=(status == 'pendente')),
+    )
+
+class Tarefa(Base):
+    """
+    Tarefa da fila executada pelo worker (`python -m app.worker`). Reivindicada com SKIP LOCKED:
+    `disponivel_em` passa para agora + `visibilidade_segundos` e, se o worker morrer sem concluir,
+    a tarefa volta a ser reivindicável quando esse prazo vence.
+    """
+    __tablename__ = 'tarefas'
+    id = Column(BigInteger, primary_key=True, index=True)
+    tipo = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    # Maior primeiro
+    prioridade = Column(Integer, nullable=False, default=0, server_default="0")
+    status = Column(String(20), nullable=False, default="pendente", server_default="pendente")
+    tentativas = Column(Integer, nullable=False, default=0)
+    max_tentativas = Column(Integer, nullable=False)
+    visibilidade_segundos = Column(Integer, nullable=False)
+    disponivel_em = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    worker = Column(String(100), nullable=True)
+    ultimo_erro = Column(String(500), nullable=True)
+    data_criacao = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    data_conclusao = Column(TIMESTAMP, nullable=True)
+
+    __table_args__ = (
+        # Índice parcial com as reivindicáveis (pendentes e em execução com prazo vencido) na ordem da fila
+        Index(
+            'ix_tarefas_fila', prioridade.desc(), 'disponivel_em',
+            postgresql_where=status.in_(("pendente", "executando")),
+        ),
+    )
 
 class SaudeGeral(Base):
     __tablename__ = 'saudeGeral'
@@ -4,13 +4,12 @@ import requests
 import asyncio
 import aiohttp
 import json
-import tempfile
 from datetime import date, datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy.future import select
 from app.database.database import SessionLocal 
 from ..core.security import get_password_hash
-from ..utils.minio import upload_to_minio, get_minio_client, upload_file_to_minio
+from ..utils.storage import storage
 from faker import Faker
 from typing import List, Dict
 
@@ -43,6 +42,41 @@ def safe_truncate(value, max_length):
 # Lista de possíveis locais para as lesões
 LESOES_LOCAIS = ["Face", "Braço", "Perna", "Tronco", "Mão", "Pé"]
 
+# Nomes dos locais de lesão (tabela de referência locais_lesao)
+LOCAIS_LESAO_NOMES = [
+    "Cabeça",
+    "Face",
+    "Pescoço",
+    "Ombro direito",
+    "Ombro esquerdo",
+    "Braço direito",
+    "Braço esquerdo",
+    "Cotovelo direito",
+    "Cotovelo esquerdo",
+    "Antebraço direito",
+    "Antebraço esquerdo",
+    "Punho direito",
+    "Punho esquerdo",
+    "Mão direita",
+    "Mão esquerda",
+    "Tórax",
+    "Abdômen",
+    "Lombar",
+    "Pélvis",
+    "Quadril direito",
+    "Quadril esquerdo",
+    "Coxa direita",
+    "Coxa esquerda",
+    "Joelho direito",
+    "Joelho esquerdo",
+    "Perna direita",
+    "Perna esquerda",
+    "Tornozelo direito",
+    "Tornozelo esquerdo",
+    "Pé direito",
+    "Pé esquerdo",
+]
+
 # URLs de imagens fake para termos de consentimento (documentos fictícios)
 FAKE_DOCUMENT_URLS = [
     "https://picsum.photos/800/600?random=1",
@@ -76,24 +110,13 @@ async def fetch_isic_images(session_http: aiohttp.ClientSession, limit: int = 50
         return []
 
 async def download_and_upload_image(session_http: aiohttp.ClientSession, image_url: str, object_name: str) -> str:
-    """Baixa uma imagem e faz upload para o MinIO."""
+    """Baixa uma imagem e grava no armazenamento."""
     try:
         async with session_http.get(image_url) as response:
             if response.status == 200:
                 image_data = await response.read()
-                
-                # Cria arquivo temporário
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                    temp_file.write(image_data)
-                    temp_file_path = temp_file.name
-                
-                try:
-                    # Upload para MinIO usando a função síncrona
-                    upload_result = upload_file_to_minio(temp_file_path, object_name, "image/jpeg")
-                    return upload_result
-                finally:
-                    # Remove arquivo temporário
-                    os.unlink(temp_file_path)
+                await storage.enviar(object_name, image_data, "image/jpeg")
+                return object_name
             else:
                 print(f"Erro ao baixar imagem: {response.status}")
                 return None
@@ -239,39 +262,7 @@ async def populate_db():
             usuarios = [usuario1, usuario2, usuario3, usuario4, usuario5]
 
             # 3. Criação dos locais de lesão
-            novos_locais = [
-                LocalLesao(nome="Cabeça"),
-                LocalLesao(nome="Face"),
-                LocalLesao(nome="Pescoço"),
-                LocalLesao(nome="Ombro direito"),
-                LocalLesao(nome="Ombro esquerdo"),
-                LocalLesao(nome="Braço direito"),
-                LocalLesao(nome="Braço esquerdo"),
-                LocalLesao(nome="Cotovelo direito"),
-                LocalLesao(nome="Cotovelo esquerdo"),
-                LocalLesao(nome="Antebraço direito"),
-                LocalLesao(nome="Antebraço esquerdo"),
-                LocalLesao(nome="Punho direito"),
-                LocalLesao(nome="Punho esquerdo"),
-                LocalLesao(nome="Mão direita"),
-                LocalLesao(nome="Mão esquerda"),
-                LocalLesao(nome="Tórax"),
-                LocalLesao(nome="Abdômen"),
-                LocalLesao(nome="Lombar"),
-                LocalLesao(nome="Pélvis"),
-                LocalLesao(nome="Quadril direito"),
-                LocalLesao(nome="Quadril esquerdo"),
-                LocalLesao(nome="Coxa direita"),
-                LocalLesao(nome="Coxa esquerda"),
-                LocalLesao(nome="Joelho direito"),
-                LocalLesao(nome="Joelho esquerdo"),
-                LocalLesao(nome="Perna direita"),
-                LocalLesao(nome="Perna esquerda"),
-                LocalLesao(nome="Tornozelo direito"),
-                LocalLesao(nome="Tornozelo esquerdo"),
-                LocalLesao(nome="Pé direito"),
-                LocalLesao(nome="Pé esquerdo")
-            ]
+            novos_locais = [LocalLesao(nome=nome) for nome in LOCAIS_LESAO_NOMES]
 
             session.add_all(novos_locais)
             await session.commit()  # Insere os locais na tabela
@@ -1,7 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr
 from fastapi import Form
 from typing import List, Optional
-from datetime import date
+from datetime import date, datetime
 
 from enum import Enum
 
@@ -293,4 +293,224 @@ class UserResponseSchema(BaseModel):
     nivel_acesso: Optional[int] = None 
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+# Modelos de resposta das rotas de atendimento (pydantic v2, validados a partir dos atributos ORM)
+
+class PacienteOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    nome_paciente: str
+    data_nascimento: date
+    sexo: Optional[str] = None
+    sexo_outro: Optional[str] = None
+    cpf_paciente: str
+    num_cartao_sus: str
+    endereco_paciente: str
+    telefone_paciente: str
+    email_paciente: str
+    autoriza_pesquisa: bool
+
+class AtendimentoCadastroOut(BaseModel):
+    id: int
+    paciente_id: int
+    nome_paciente: str
+    cpf_paciente: str
+    data_atendimento: Optional[datetime] = None
+    unidade_saude_id: int
+    unidade_saude_nome: str
+
+class AtendimentoResumoOut(BaseModel):
+    id: int
+    data_atendimento: Optional[datetime] = None
+    paciente_id: int
+    nome_paciente: str
+    cpf_paciente: str
+    termo_consentimento_id: Optional[int] = None
+    saude_geral_id: Optional[int] = None
+    avaliacao_fototipo_id: Optional[int] = None
+
+class TermoConsentimentoOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    arquivo_path: str
+
+class TermoConsentimentoCadastroOut(BaseModel):
+    message: str
+    termo_consentimento: TermoConsentimentoOut
+
+class SaudeGeralOut(SaudeGeralCreateSchema):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+
+class AvaliacaoFototipoOut(AvaliacaoFototipoCreateSchema):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+
+class HistoricoCancerPeleOut(HistoricoCancerPeleCreateSchema):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+
+class FatoresRiscoProtecaoOut(FatoresRiscoProtecaoCreateSchema):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+
+class InvestigacaoLesoesSuspeitasOut(InvestigacaoLesoesSuspeitasCreateSchema):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+
+class InformacoesCompletasOut(BaseModel):
+    message: str
+    saude_geral: Optional[SaudeGeralOut] = None
+    avaliacao_fototipo: Optional[AvaliacaoFototipoOut] = None
+    historico_cancer_pele: Optional[HistoricoCancerPeleOut] = None
+    fatores_risco_protecao: Optional[FatoresRiscoProtecaoOut] = None
+    investigacao_lesoes_suspeitas: Optional[InvestigacaoLesoesSuspeitasOut] = None
+
+class LesaoResumoOut(BaseModel):
+    id: int
+    local_lesao_id: int
+    local_lesao_nome: Optional[str] = None
+    descricao_lesao: str
+
+class QualidadeImagemOut(BaseModel):
+    nitidez: float
+    subexposicao: float
+    sobreexposicao: float
+    brilho_medio: float
+    aprovada: bool
+    alertas: List[str] = []
+
+class ArquivoUploadOut(BaseModel):
+    arquivo: Optional[str] = None
+    sucesso: bool
+    arquivo_path: Optional[str] = None
+    erro: Optional[str] = None
+    tamanho_original: Optional[int] = None
+    tamanho_normalizado: Optional[int] = None
+    largura: Optional[int] = None
+    altura: Optional[int] = None
+    qualidade: Optional[QualidadeImagemOut] = None
+
+class LesaoCadastroOut(BaseModel):
+    message: str
+    lesao: LesaoResumoOut
+    imagens: List[str] = []
+    arquivos: List[ArquivoUploadOut] = []
+
+class ImagemLesaoOut(BaseModel):
+    id: int
+    arquivo_path: str
+    url: Optional[str] = None
+    largura: Optional[int] = None
+    altura: Optional[int] = None
+    thumbnail_path: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    thumbnail_largura: Optional[int] = None
+    thumbnail_altura: Optional[int] = None
+    preview_path: Optional[str] = None
+    preview_url: Optional[str] = None
+    preview_largura: Optional[int] = None
+    preview_altura: Optional[int] = None
+    qualidade_aprovada: Optional[bool] = None
+    qualidade_alertas: List[str] = []
+
+class LesaoOut(LesaoResumoOut):
+    imagens: List[str] = []
+    imagens_detalhes: List[ImagemLesaoOut] = []
+
+
+# Upload direto ao armazenamento (URLs pré-assinadas)
+
+class ArquivoUploadSolicitacaoSchema(BaseModel):
+    nome_arquivo: str
+    content_type: str
+    tamanho: int
+
+class ImagensLesaoUploadUrlSchema(BaseModel):
+    registro_lesoes_id: int
+    arquivos: List[ArquivoUploadSolicitacaoSchema]
+
+class TermoConsentimentoUploadUrlSchema(BaseModel):
+    atendimento_id: int
+    arquivo: ArquivoUploadSolicitacaoSchema
+
+class UrlUploadOut(BaseModel):
+    nome_arquivo: str
+    object_name: str
+    url: str
+    metodo: str = "PUT"
+    headers: dict
+    tamanho_maximo: int
+
+class UploadUrlsOut(BaseModel):
+    upload_token: str
+    expira_em: datetime
+    uploads: List[UrlUploadOut]
+
+class ConfirmarUploadSchema(BaseModel):
+    upload_token: str
+
+class ConfirmarUploadOut(BaseModel):
+    message: str
+    arquivos: List[ArquivoUploadOut]
+
+class SessaoUploadImagemLesaoSchema(BaseModel):
+    registro_lesoes_id: int
+    arquivo: ArquivoUploadSolicitacaoSchema
+
+class SessaoUploadTermoSchema(BaseModel):
+    atendimento_id: int
+    arquivo: ArquivoUploadSolicitacaoSchema
+
+class SessaoUploadOut(BaseModel):
+    sessao_id: str
+    tamanho: int
+    tamanho_chunk: int
+    offset: int
+    concluida: bool
+    expira_em: datetime
+
+class ClusterDuplicatasOut(BaseModel):
+    tamanho: int
+    imagem_ids: List[int]
+    atendimento_ids: List[int]
+
+class DuplicatasOut(BaseModel):
+    raio: int
+    atendimento_id: Optional[int] = None
+    total_clusters: int
+    clusters: List[ClusterDuplicatasOut] = []
+
+class ImagemSimilarOut(BaseModel):
+    imagem_id: int
+    score: float
+    registro_lesoes_id: int
+    atendimento_id: int
+    local_lesao_id: Optional[int] = None
+    local_lesao_nome: Optional[str] = None
+    arquivo_path: str
+    thumbnail_url: Optional[str] = None
+
+class ImagensSimilaresOut(BaseModel):
+    imagem_id: int
+    aproximado: bool
+    resultados: List[ImagemSimilarOut] = []
+
+class AtendimentoAbcdOut(BaseModel):
+    atendimento_id: int
+    lesoes: int
+    imagens: int
+    assimetria_max: Optional[float] = None
+    irregularidade_borda_max: Optional[float] = None
+    cores_max: Optional[int] = None
+    variegacao_max: Optional[float] = None
+    diametro_px_max: Optional[float] = None
@@ -1,7 +1,13 @@
+import asyncio
 from fastapi import FastAPI
-from app.api.routes import token_routes, user_routes, admin_routes, supervisor_routes, unidade_saude_routes, atendimento_routes, redirect_routes
+from app.api.routes import token_routes, user_routes, admin_routes, supervisor_routes, unidade_saude_routes, atendimento_routes, redirect_routes, metrics_routes, upload_routes, dataset_routes, piramide_routes, arquivo_routes
 from app.database import models, database
 from app.database.seed import seed_data, populate_data
+from app.core.reference_data import reference_data
+from app.utils.storage import storage
+from app.utils.imagens import shutdown_process_pool
+from app.utils.send_email import despachante_email
+from app.utils.email_outbox import executar_dispatcher
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -23,7 +29,27 @@ async def lifespan(app: FastAPI):
 
     print("Seed data inserted successfully")
 
+    await reference_data.load()
+
+    try:
+        await storage.preparar()
+    except Exception as e:
+        # Sem o armazenamento no startup a verificação é refeita no primeiro upload
+        print(f"Não foi possível preparar o armazenamento ({storage.nome}): {e}")
+
+    # Dispatcher da outbox de e-mails: cada worker roda o seu (as linhas são reivindicadas com SKIP LOCKED);
+    # a recarga dos dados de referência também é por worker (cada um tem a sua cópia em memória)
+    parar_lacos = asyncio.Event()
+    dispatcher = asyncio.create_task(executar_dispatcher(parar_lacos))
+    recarga_referencia = asyncio.create_task(reference_data.refresh_loop(parar_lacos))
+
     yield
+    parar_lacos.set()
+    await dispatcher
+    await recarga_referencia
+    shutdown_process_pool()
+    # E-mails ainda na fila são enviados antes de sair
+    await asyncio.to_thread(despachante_email.encerrar)
     print("Application is shutting down")
 
 app = FastAPI(lifespan=lifespan)
@@ -48,6 +74,11 @@ app.include_router(supervisor_routes.router, tags=["supervisor"])
 app.include_router(unidade_saude_routes.router, tags=["unidade_saude"])
 app.include_router(atendimento_routes.router, tags=["atendimento"])
 app.include_router(redirect_routes.router, tags=["redirect"])
+app.include_router(metrics_routes.router, tags=["metricas"])
+app.include_router(upload_routes.router, tags=["upload"])
+app.include_router(dataset_routes.router, tags=["dataset"])
+app.include_router(piramide_routes.router, tags=["piramide"])
+app.include_router(arquivo_routes.router, tags=["arquivos"])
 
 
 
@@ -0,0 +1,37 @@
+"""
+Job em lote das características ABCD das imagens de lesão (assimetria, borda, cores, diâmetro).
+Processa as imagens sem características ou calculadas por uma versão anterior de ABCD_VERSAO.
+
+Uso (a partir de project/):
+    python -m app.scripts.extrair_abcd [--lote 500]
+"""
+import argparse
+import asyncio
+
+from app.utils.abcd import imagens_sem_abcd, extrair_abcd_lote, salvar_abcd
+from app.utils.imagens import shutdown_process_pool
+
+
+async def main(lote: int):
+    ultimo_id = 0
+    total = 0
+    while True:
+        imagens = await imagens_sem_abcd(lote, apos_id=ultimo_id)
+        if not imagens:
+            break
+        linhas = await extrair_abcd_lote(imagens)
+        await salvar_abcd(linhas)
+        ultimo_id = imagens[-1].id
+        total += len(linhas)
+        print(f"{total} imagens analisadas (último id {ultimo_id}, {len(imagens) - len(linhas)} falhas no lote)")
+    print(f"Extração ABCD concluída: {total} imagens")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extrai as características ABCD das imagens de lesão")
+    parser.add_argument("--lote", type=int, default=500)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.lote))
+    finally:
+        shutdown_process_pool()
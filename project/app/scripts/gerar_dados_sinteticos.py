@@ -0,0 +1,414 @@
+"""
+Gera dados sintéticos em volume para testes de carga: unidades, usuários, pacientes, atendimentos com
+todos os questionários, termos, lesões e imagens. Offline (sem ISIC nem armazenamento) e determinístico:
+a mesma `--semente` e a mesma escala produzem exatamente as mesmas linhas.
+
+As linhas são geradas em blocos no pool de processos e gravadas com COPY (asyncpg), vários blocos em
+paralelo, com ids explícitos a partir do maior id de cada tabela (os dados existentes são preservados);
+no fim as sequências são ajustadas com setval.
+
+Escala 1: 10 unidades, 50 usuários, 1.000 pacientes, 5.000 atendimentos (~7.500 lesões, ~11.000 imagens).
+Escala 1000: 10 mil unidades, 1 milhão de pacientes, 5 milhões de atendimentos.
+
+O startup da API recria as tabelas (drop_all): gere os dados com a API já no ar.
+Os caminhos das imagens e termos não existem no armazenamento (downloads respondem 404).
+Todos os usuários gerados têm a senha SENHA_USUARIOS.
+
+Uso (a partir de project/):
+    python -m app.scripts.gerar_dados_sinteticos [--escala 1] [--semente 42] [--processos N] [--conexoes 4]
+"""
+import os
+import math
+import time
+import random
+import argparse
+import asyncio
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import func, text
+from sqlalchemy.future import select
+
+from app.core.security import get_password_hash
+from app.database import models
+from app.database.database import engine, SessionLocal
+from app.database.seed import FIXED_ROLES, ROLE_LEVELS
+from app.database.populate_db import LOCAIS_LESAO_NOMES
+
+# Linhas por bloco (unidade de geração e de COPY); fixo para que o resultado só dependa da semente e da escala
+BLOCO = 10_000
+SENHA_USUARIOS = "sintetico123"
+
+USUARIOS_POR_UNIDADE = 5
+LESOES_POR_ATENDIMENTO = 1.5
+IMAGENS_POR_LESAO = 1.5
+
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Eduarda", "Felipe", "Gabriela", "Heitor", "Isabela", "João",
+         "Larissa", "Marcos", "Natália", "Otávio", "Paula", "Rafael", "Sofia", "Tiago", "Vitória", "Yuri"]
+SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima",
+              "Gomes", "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes", "Soares", "Fernandes"]
+CIDADES = ["São Paulo", "Rio de Janeiro", "Belo Horizonte", "Brasília", "Salvador", "Fortaleza", "Recife",
+           "Porto Alegre", "Curitiba", "Manaus", "Belém", "Goiânia", "Florianópolis", "Natal", "Teresina"]
+RUAS = ["Rua das Flores", "Avenida Brasil", "Rua XV de Novembro", "Travessa das Acácias", "Rua da Paz",
+        "Avenida Getúlio Vargas", "Rua São José", "Alameda dos Ipês"]
+
+INICIO_ATENDIMENTOS = datetime(2022, 1, 1)
+PERIODO_ATENDIMENTOS = int(timedelta(days=3 * 365).total_seconds())
+
+
+@dataclass
+class Parametros:
+    """Quantidades a gerar e ids já existentes em cada tabela (os gerados começam depois deles)."""
+    semente: int
+    unidades: int
+    pacientes: int
+    atendimentos: int
+    lesoes: int
+    imagens: int
+    offsets: dict
+    role_supervisor: int
+    role_pesquisador: int
+    locais_lesao: list
+    senha_hash: str
+
+    @property
+    def usuarios(self) -> int:
+        return self.unidades * USUARIOS_POR_UNIDADE
+
+
+def _id(p: Parametros, tabela: str, indice: int) -> int:
+    return p.offsets[tabela] + indice + 1
+
+
+def _data(rng, inicio: datetime = INICIO_ATENDIMENTOS, periodo: int = PERIODO_ATENDIMENTOS) -> datetime:
+    return inicio + timedelta(seconds=rng.randrange(periodo))
+
+
+def _talvez(rng, valor, probabilidade=0.5):
+    return valor if rng.random() < probabilidade else None
+
+
+def _unidades(rng, p, indices):
+    for i in indices:
+        criado = _data(rng)
+        yield (
+            _id(p, "unidadeSaude", i),
+            f"Unidade de Saúde {_id(p, 'unidadeSaude', i)}",
+            f"{rng.choice(RUAS)}, {rng.randint(1, 3000)}",
+            f"SINT{_id(p, 'unidadeSaude', i):08d}",
+            rng.choice(CIDADES),
+            True, criado, criado,
+        )
+
+
+def _usuarios(rng, p, indices):
+    for i in indices:
+        user_id = _id(p, "users", i)
+        criado = _data(rng)
+        yield (
+            user_id, f"usuario_{user_id}", f"usuario{user_id}@sintetico.dermalert", f"8{user_id:010d}",
+            p.senha_hash, True, True, False, criado, criado,
+        )
+
+
+def _user_roles(rng, p, indices):
+    # O primeiro usuário de cada unidade é supervisor, os demais pesquisadores
+    for i in indices:
+        role = p.role_supervisor if i % USUARIOS_POR_UNIDADE == 0 else p.role_pesquisador
+        yield (_id(p, "users", i), role)
+
+
+def _user_unidades(rng, p, indices):
+    for i in indices:
+        yield (_id(p, "users", i), _id(p, "unidadeSaude", i // USUARIOS_POR_UNIDADE))
+
+
+def _pacientes(rng, p, indices):
+    for i in indices:
+        paciente_id = _id(p, "pacientes", i)
+        nome = f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}"
+        criado = _data(rng)
+        yield (
+            paciente_id, nome,
+            date(1940, 1, 1) + timedelta(days=rng.randrange(70 * 365)),
+            rng.choices(("M", "F", "NB", "NR", "O"), weights=(47, 49, 2, 1, 1))[0], None,
+            f"7{paciente_id:010d}", f"7{paciente_id:014d}",
+            f"{rng.choice(RUAS)}, {rng.randint(1, 3000)} - {rng.choice(CIDADES)}",
+            f"{rng.randint(11, 99)}9{rng.randrange(10 ** 8):08d}",
+            f"paciente{paciente_id}@sintetico.dermalert",
+            rng.random() < 0.8, True, criado, criado,
+        )
+
+
+def _termos(rng, p, indices):
+    for i in indices:
+        termo_id = _id(p, "termoConsentimento", i)
+        yield (termo_id, f"sintetico/termos/{termo_id}.pdf", _data(rng))
+
+
+def _saude_geral(rng, p, indices):
+    for i in indices:
+        cronicas, cancer, medicamentos, alergia, cirurgias, atividade = (rng.random() < 0.3 for _ in range(6))
+        yield (
+            _id(p, "saudeGeral", i), cronicas, cronicas and rng.random() < 0.5, cronicas and rng.random() < 0.3,
+            cronicas and rng.random() < 0.2, _talvez(rng, "Hipotireoidismo", 0.1) if cronicas else None,
+            cancer, "Carcinoma basocelular" if cancer else None,
+            medicamentos, "Losartana 50mg" if medicamentos else None,
+            alergia, "Pólen" if alergia else None,
+            cirurgias, "Peeling químico" if cirurgias else None,
+            atividade, rng.choice(("Diária", "Frequente", "Moderada", "Ocasional")) if atividade else None,
+        )
+
+
+def _fototipo(rng, p, indices):
+    for i in indices:
+        yield (
+            _id(p, "avaliacao_fototipo", i),
+            rng.choice((0, 2, 4, 8, 12, 16, 20)), rng.choice((0, 1, 2, 3, 4)), rng.choice((0, 1, 2, 3, 4)),
+            rng.choice((0, 1, 2, 3)), rng.choice((0, 2, 4, 6, 8)), rng.choice((0, 2, 4, 6)), rng.choice((0, 1, 2, 3, 4)),
+        )
+
+
+def _historico(rng, p, indices):
+    tipos = ("Melanoma", "Carcinoma Basocelular", "Carcinoma Espinocelular", "Outro")
+    for i in indices:
+        familiar, pessoal, precancerigenas = rng.random() < 0.3, rng.random() < 0.1, rng.random() < 0.2
+        tratamento = precancerigenas and rng.random() < 0.6
+        yield (
+            _id(p, "historicoCancerPele", i),
+            familiar,
+            rng.choice(("Pai", "Mãe", "Avô/Avó", "Irmão/Irmã", "Outro")) if familiar else None,
+            rng.choice(tipos) if familiar else None, None,
+            pessoal, rng.choice(tipos) if pessoal else None, None,
+            precancerigenas, tratamento,
+            rng.choice(("Cirurgia", "Crioterapia", "Radioterapia", "Outro")) if tratamento else None, None,
+        )
+
+
+def _fatores(rng, p, indices):
+    for i in indices:
+        exposicao, queimaduras, protetor, checkups = (rng.random() < 0.5 for _ in range(4))
+        yield (
+            _id(p, "fatoresRiscoProtecao", i),
+            exposicao, rng.choice(("Diariamente", "Algumas vezes por semana", "Ocasionalmente")) if exposicao else None,
+            queimaduras, rng.choice(("1-2", "3-5", "Mais de 5")) if queimaduras else None,
+            protetor, rng.choice(("15", "30", "50", "70", "100 ou mais")) if protetor else None,
+            rng.random() < 0.4, rng.random() < 0.05,
+            checkups, rng.choice(("Anualmente", "A cada 6 meses")) if checkups else None, None,
+            rng.random() < 0.2,
+        )
+
+
+def _investigacao(rng, p, indices):
+    for i in indices:
+        mudanca = rng.random() < 0.3
+        yield (
+            _id(p, "investigacaoLesoesSuspeitas", i),
+            mudanca, rng.random() < 0.2,
+            rng.choice(("Menos de 1 mês", "1-3 meses", "3-6 meses", "Mais de 6 meses")) if mudanca else None,
+            rng.random() < 0.3, rng.random() < 0.4,
+            _talvez(rng, "Lesão benigna, apenas monitoramento recomendado", 0.2),
+        )
+
+
+def _atendimentos(rng, p, indices):
+    # Questionários e termo são 1:1 com o atendimento: o i-ésimo de cada tabela pertence ao i-ésimo atendimento
+    for i in indices:
+        usuario = rng.randrange(p.usuarios)
+        user_id = _id(p, "users", usuario)
+        quando = _data(rng)
+        yield (
+            _id(p, "atendimentos", i), quando,
+            _id(p, "pacientes", rng.randrange(p.pacientes)), user_id,
+            _id(p, "termoConsentimento", i), _id(p, "saudeGeral", i), _id(p, "avaliacao_fototipo", i),
+            _id(p, "historicoCancerPele", i), _id(p, "fatoresRiscoProtecao", i), _id(p, "investigacaoLesoesSuspeitas", i),
+            _id(p, "unidadeSaude", usuario // USUARIOS_POR_UNIDADE),
+            True, quando, quando, user_id,
+        )
+
+
+def _lesoes(rng, p, indices):
+    # Cada lesão cai num atendimento sorteado: há atendimentos sem lesão e outros com várias
+    for i in indices:
+        local_id, local_nome = rng.choice(p.locais_lesao)
+        yield (
+            _id(p, "registroLesoes", i), local_id,
+            f"Lesão observada na região {local_nome}, {rng.randint(2, 25)} mm",
+            _id(p, "atendimentos", rng.randrange(p.atendimentos)),
+        )
+
+
+def _imagens(rng, p, indices):
+    for i in indices:
+        imagem_id = _id(p, "registroLesoesImagens", i)
+        largura, altura = rng.choice(((4032, 3024), (3024, 4032), (1920, 1080), (1024, 1024)))
+        original = rng.randint(800_000, 6_000_000)
+        nitidez = round(rng.lognormvariate(5, 0.8), 2)
+        yield (
+            imagem_id, f"sintetico/imagens/{imagem_id}.jpg",
+            _id(p, "registroLesoes", rng.randrange(p.lesoes)),
+            f"{rng.getrandbits(256):064x}", original, int(original * rng.uniform(0.4, 0.9)),
+            largura, altura, nitidez, nitidez >= 60,
+        )
+
+
+# Ordem de inserção respeita as chaves estrangeiras. (tabela, colunas, gerador, total, tabela dos ids)
+TABELAS = [
+    ("unidadeSaude", ["id", "nome_unidade_saude", "nome_localizacao", "codigo_unidade_saude", "cidade_unidade_saude",
+                      "fl_ativo", "data_criacao", "data_atualizacao"],
+     _unidades, lambda p: p.unidades),
+    ("users", ["id", "nome_usuario", "email", "cpf", "senha_hash", "fl_ativo", "email_invite_token_used",
+               "password_reset_token_used", "data_criacao", "data_atualizacao"],
+     _usuarios, lambda p: p.usuarios),
+    ("user_roles", ["user_id", "role_id"], _user_roles, lambda p: p.usuarios),
+    ("user_unidadeSaude", ["user_id", "unidadeSaude_id"], _user_unidades, lambda p: p.usuarios),
+    ("pacientes", ["id", "nome_paciente", "data_nascimento", "sexo", "sexo_outro", "cpf_paciente", "num_cartao_sus",
+                   "endereco_paciente", "telefone_paciente", "email_paciente", "autoriza_pesquisa", "fl_ativo",
+                   "data_criacao", "data_atualizacao"],
+     _pacientes, lambda p: p.pacientes),
+    ("termoConsentimento", ["id", "arquivo_path", "data_acordo"], _termos, lambda p: p.atendimentos),
+    ("saudeGeral", ["id", "doencas_cronicas", "hipertenso", "diabetes", "cardiopatia", "outras_doencas",
+                    "diagnostico_cancer", "tipo_cancer", "uso_medicamentos", "medicamentos", "possui_alergia",
+                    "alergias", "ciruturgias_dermatologicas", "tipo_procedimento", "pratica_atividade_fisica",
+                    "frequencia_atividade_fisica"],
+     _saude_geral, lambda p: p.atendimentos),
+    ("avaliacao_fototipo", ["id", "cor_pele", "cor_olhos", "cor_cabelo", "quantidade_sardas", "reacao_sol",
+                            "bronzeamento", "sensibilidade_solar"],
+     _fototipo, lambda p: p.atendimentos),
+    ("historicoCancerPele", ["id", "historico_familiar", "grau_parentesco", "tipo_cancer_familiar",
+                             "tipo_cancer_familiar_outro", "diagnostico_pessoal", "tipo_cancer_pessoal",
+                             "tipo_cancer_pessoal_outro", "lesoes_precancerigenas", "tratamento_lesoes",
+                             "tipo_tratamento", "tipo_tratamento_outro"],
+     _historico, lambda p: p.atendimentos),
+    ("fatoresRiscoProtecao", ["id", "exposicao_solar_prolongada", "frequencia_exposicao_solar", "queimaduras_graves",
+                              "quantidade_queimaduras", "uso_protetor_solar", "fator_protecao_solar",
+                              "uso_chapeu_roupa_protecao", "bronzeamento_artificial", "checkups_dermatologicos",
+                              "frequencia_checkups", "frequencia_checkups_outro", "participacao_campanhas_prevencao"],
+     _fatores, lambda p: p.atendimentos),
+    ("investigacaoLesoesSuspeitas", ["id", "mudanca_pintas_manchas", "sintomas_lesoes", "tempo_alteracoes",
+                                     "caracteristicas_lesoes", "consulta_medica", "diagnostico_lesoes"],
+     _investigacao, lambda p: p.atendimentos),
+    ("atendimentos", ["id", "data_atendimento", "paciente_id", "user_id", "termo_consentimento_id", "saude_geral_id",
+                      "avaliacao_fototipo_id", "historico_cancer_pele_id", "fatores_risco_protecao_id",
+                      "investigacao_lesoes_suspeitas_id", "unidade_saude_id", "fl_ativo", "data_criacao",
+                      "data_atualizacao", "id_usuario_criacao"],
+     _atendimentos, lambda p: p.atendimentos),
+    ("registroLesoes", ["id", "local_lesao_id", "descricao_lesao", "atendimento_id"], _lesoes, lambda p: p.lesoes),
+    ("registroLesoesImagens", ["id", "arquivo_path", "registro_lesoes_id", "content_hash", "tamanho_original",
+                               "tamanho_normalizado", "largura", "altura", "nitidez", "qualidade_aprovada"],
+     _imagens, lambda p: p.imagens),
+]
+GERADORES = {tabela: gerador for tabela, _, gerador, _ in TABELAS}
+TABELAS_COM_ID = [tabela for tabela, colunas, _, _ in TABELAS if colunas[0] == "id"]
+
+
+def gerar_bloco(tabela: str, bloco: int, total: int, p: Parametros) -> list:
+    """Executado no pool de processos. O gerador de cada bloco tem semente própria: blocos independentes e reprodutíveis."""
+    rng = random.Random(f"{p.semente}:{tabela}:{bloco}")
+    indices = range(bloco * BLOCO, min((bloco + 1) * BLOCO, total))
+    return list(GERADORES[tabela](rng, p, indices))
+
+
+async def _preparar(semente: int, unidades: int, pacientes: int, atendimentos: int) -> Parametros:
+    """Cria o que faltar do schema e das tabelas de referência e lê o maior id de cada tabela."""
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+
+    async with SessionLocal() as db:
+        roles = {role.name: role.id for role in (await db.execute(select(models.Role))).scalars()}
+        for nome in FIXED_ROLES:
+            if nome not in roles:
+                role = models.Role(name=nome, nivel_acesso=ROLE_LEVELS[nome])
+                db.add(role)
+                await db.flush()
+                roles[nome] = role.id
+        locais = (await db.execute(select(models.LocalLesao.id, models.LocalLesao.nome).order_by(models.LocalLesao.id))).all()
+        if not locais:
+            db.add_all([models.LocalLesao(nome=nome) for nome in LOCAIS_LESAO_NOMES])
+            await db.flush()
+            locais = (await db.execute(select(models.LocalLesao.id, models.LocalLesao.nome).order_by(models.LocalLesao.id))).all()
+        await db.commit()
+
+        offsets = {}
+        for tabela in TABELAS_COM_ID:
+            coluna = models.Base.metadata.tables[tabela].c.id
+            offsets[tabela] = (await db.execute(select(func.coalesce(func.max(coluna), 0)))).scalar()
+
+    lesoes = round(atendimentos * LESOES_POR_ATENDIMENTO)
+    return Parametros(
+        semente=semente,
+        unidades=unidades,
+        pacientes=pacientes,
+        atendimentos=atendimentos,
+        lesoes=lesoes,
+        imagens=round(lesoes * IMAGENS_POR_LESAO),
+        offsets=offsets,
+        role_supervisor=roles["Supervisor"],
+        role_pesquisador=roles["Pesquisador"],
+        locais_lesao=[(local.id, local.nome) for local in locais],
+        # Um único hash (bcrypt é lento de propósito): todos os usuários gerados têm a mesma senha
+        senha_hash=get_password_hash(SENHA_USUARIOS),
+    )
+
+
+async def _copiar_tabela(pool, processos: int, conexoes: int, tabela: str, colunas, total: int, p: Parametros):
+    loop = asyncio.get_running_loop()
+    blocos = math.ceil(total / BLOCO)
+    # Blocos em andamento limitados (memória): geração no pool de processos e COPY se sobrepõem
+    em_andamento = asyncio.Semaphore(processos + conexoes)
+    limite_copy = asyncio.Semaphore(conexoes)
+    inicio = time.perf_counter()
+
+    async def copiar(bloco):
+        async with em_andamento:
+            linhas = await loop.run_in_executor(pool, gerar_bloco, tabela, bloco, total, p)
+            async with limite_copy:
+                async with engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    await raw.driver_connection.copy_records_to_table(tabela, records=linhas, columns=colunas)
+
+    await asyncio.gather(*(copiar(bloco) for bloco in range(blocos)))
+    duracao = time.perf_counter() - inicio
+    print(f"{tabela}: {total} linhas em {duracao:.1f} s ({total / max(duracao, 1e-9):.0f} linhas/s)")
+
+
+async def _ajustar_sequencias():
+    async with engine.begin() as conn:
+        for tabela in TABELAS_COM_ID:
+            await conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{tabela}\"', 'id'), (SELECT max(id) FROM \"{tabela}\"))"
+            ))
+
+
+async def main(escala: float, semente: int, processos: int, conexoes: int, unidades, pacientes, atendimentos):
+    p = await _preparar(
+        semente,
+        unidades or max(round(10 * escala), 1),
+        pacientes or max(round(1000 * escala), 1),
+        atendimentos or max(round(5000 * escala), 1),
+    )
+    print(f"Gerando {p.unidades} unidades, {p.usuarios} usuários, {p.pacientes} pacientes, "
+          f"{p.atendimentos} atendimentos, {p.lesoes} lesões e {p.imagens} imagens (semente {semente})")
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        for tabela, colunas, _, total in TABELAS:
+            await _copiar_tabela(pool, processos, conexoes, tabela, colunas, total(p), p)
+    await _ajustar_sequencias()
+    await engine.dispose()
+    print(f"Concluído em {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escala", type=float, default=1)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--conexoes", type=int, default=4, help="COPYs simultâneos")
+    parser.add_argument("--unidades", type=int, help="Sobrepõe a quantidade derivada da escala")
+    parser.add_argument("--pacientes", type=int, help="Sobrepõe a quantidade derivada da escala")
+    parser.add_argument("--atendimentos", type=int, help="Sobrepõe a quantidade derivada da escala")
+    args = parser.parse_args()
+    asyncio.run(main(args.escala, args.semente, args.processos, args.conexoes,
+                     args.unidades, args.pacientes, args.atendimentos))
@@ -0,0 +1,34 @@
+"""
+Backfill das miniaturas/prévias e do dHash das imagens de lesão já existentes.
+
+Uso (a partir de project/):
+    python -m app.scripts.gerar_miniaturas [--lote 200]
+"""
+import argparse
+import asyncio
+
+from app.utils.imagens import imagens_sem_miniatura, processar_imagens_lesao, shutdown_process_pool
+
+
+async def main(lote: int):
+    ultimo_id = 0
+    total = 0
+    while True:
+        ids = await imagens_sem_miniatura(lote, apos_id=ultimo_id)
+        if not ids:
+            break
+        await processar_imagens_lesao(ids)
+        ultimo_id = ids[-1]
+        total += len(ids)
+        print(f"{total} imagens processadas (último id {ultimo_id})")
+    print(f"Backfill concluído: {total} imagens")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera miniaturas, prévias e dHash das imagens de lesão existentes")
+    parser.add_argument("--lote", type=int, default=200)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.lote))
+    finally:
+        shutdown_process_pool()
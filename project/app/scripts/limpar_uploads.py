@@ -0,0 +1,26 @@
+"""
+Coleta de lixo dos uploads retomáveis: aborta os multipart uploads de sessões sem atividade há mais de
+UPLOAD_SESSAO_TTL_HORAS (descartando as partes já enviadas) e apaga as sessões antigas.
+
+Uso (a partir de project/), por exemplo a cada hora via cron:
+    python -m app.scripts.limpar_uploads [--lote 500]
+"""
+import argparse
+import asyncio
+
+from app.utils.sessoes_upload import remover_sessoes_abandonadas
+
+
+async def main(lote: int):
+    totais = await remover_sessoes_abandonadas(lote)
+    print(
+        f"{totais['abandonadas']} sessões abandonadas descartadas ({totais['bytes_descartados']} bytes), "
+        f"{totais['finalizadas']} sessões finalizadas removidas"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove sessões de upload abandonadas")
+    parser.add_argument("--lote", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.lote))
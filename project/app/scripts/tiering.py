@@ -0,0 +1,39 @@
+"""
+Job de ciclo de vida do armazenamento: move originais de lesão e termos de consentimento mais
+antigos que TIERING_IDADE_DIAS para a camada fria (prefixo TIERING_PREFIXO no mesmo bucket),
+recomprimindo sem perda os PNG. Retomável: cada lote confirmado grava o ponto de retomada.
+
+Uso (a partir de project/):
+    python -m app.scripts.tiering [--lote 500] [--idade-dias 365] [--reiniciar]
+"""
+import argparse
+import asyncio
+
+from app.utils.tiering import executar_tiering, TIERING_IDADE_DIAS
+from app.utils.imagens import shutdown_process_pool
+
+
+def _mb(n: int) -> str:
+    return f"{n / (1024 * 1024):.1f} MB"
+
+
+async def main(lote: int, idade_dias: int, reiniciar: bool):
+    totais = await executar_tiering(lote, idade_dias, reiniciar)
+    for nome, t in totais.items():
+        print(
+            f"{nome}: {t['objetos_movidos']} objetos movidos ({t['objetos_recomprimidos']} recomprimidos), "
+            f"{_mb(t['bytes_movidos'])} liberados da camada quente, "
+            f"{_mb(t['bytes_economizados'])} economizados na recompressão"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move objetos antigos para a camada fria do armazenamento")
+    parser.add_argument("--lote", type=int, default=500)
+    parser.add_argument("--idade-dias", type=int, default=TIERING_IDADE_DIAS)
+    parser.add_argument("--reiniciar", action="store_true", help="Ignora o ponto de retomada da execução anterior")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.lote, args.idade_dias, args.reiniciar))
+    finally:
+        shutdown_process_pool()
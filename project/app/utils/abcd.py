@@ -0,0 +1,259 @@
+import os
+import io
+import asyncio
+from typing import List
+
+import numpy as np
+from PIL import Image
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+
+from ..database import models
+from ..database.database import SessionLocal
+from ..core import metrics
+from .storage import storage
+from .imagens import executar_no_pool
+
+# Características ABCD (assimetria, borda, cor, diâmetro) extraídas das imagens de lesão.
+# Mudou o cálculo? Incremente ABCD_VERSAO: o job recalcula as linhas de versão anterior.
+ABCD_VERSAO = 1
+ABCD_TAMANHO_ANALISE = int(os.getenv("ABCD_TAMANHO_ANALISE", 512))
+ABCD_CONCORRENCIA = int(os.getenv("ABCD_CONCORRENCIA", 8))
+# Fração mínima dos pixels da lesão para uma cor de referência contar como presente
+ABCD_COR_MIN_FRACAO = float(os.getenv("ABCD_COR_MIN_FRACAO", 0.05))
+
+# Cores de referência da dermatoscopia (RGB)
+CORES_REFERENCIA = np.array([
+    (255, 255, 255),  # branco
+    (204, 51, 51),    # vermelho
+    (153, 102, 51),   # marrom claro
+    (51, 0, 0),       # marrom escuro
+    (51, 153, 153),   # cinza-azulado
+    (0, 0, 0),        # preto
+], dtype=np.float32)
+
+latencia_extracao = metrics.LatencyStats()
+metrics.register("abcd", lambda: {"extracao": latencia_extracao.snapshot()})
+
+
+def _suavizar(cinza: np.ndarray, raio: int) -> np.ndarray:
+    # Média móvel (2r+1)x(2r+1) pela imagem integral
+    k = 2 * raio + 1
+    integral = np.pad(np.pad(cinza, raio, mode="edge").cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    return (integral[k:, k:] - integral[:-k, k:] - integral[k:, :-k] + integral[:-k, :-k]) / (k * k)
+
+
+def _limiar_otsu(cinza: np.ndarray) -> int:
+    histograma = np.bincount(cinza.astype(np.uint8).ravel(), minlength=256).astype(np.float64)
+    p = histograma / histograma.sum()
+    omega = np.cumsum(p)
+    mu = np.cumsum(p * np.arange(256))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variancia_entre = (mu[-1] * omega - mu) ** 2 / (omega * (1 - omega))
+    return int(np.argmax(np.nan_to_num(variancia_entre)))
+
+
+def _dilatar(mascara: np.ndarray) -> np.ndarray:
+    d = mascara.copy()
+    d[1:] |= mascara[:-1]
+    d[:-1] |= mascara[1:]
+    d[:, 1:] |= mascara[:, :-1]
+    d[:, :-1] |= mascara[:, 1:]
+    return d
+
+
+def _reconstruir(semente: np.ndarray, mascara: np.ndarray) -> np.ndarray:
+    """Reconstrução morfológica: a região de `mascara` conectada (4-vizinhança) à semente."""
+    atual = semente & mascara
+    while True:
+        proximo = _dilatar(atual) & mascara
+        if np.array_equal(proximo, atual):
+            return atual
+        atual = proximo
+
+
+def segmentar(rgb: np.ndarray) -> np.ndarray:
+    """
+    Máscara da lesão: limiar de Otsu sobre o cinza suavizado (lesão mais escura que a pele),
+    mantém a região conectada ao centro da imagem e preenche os buracos.
+    """
+    cinza = _suavizar(rgb.mean(axis=2), raio=2)
+    escura = cinza <= _limiar_otsu(cinza)
+
+    altura, largura = escura.shape
+    semente = np.zeros_like(escura)
+    semente[altura // 3:2 * altura // 3, largura // 3:2 * largura // 3] = True
+    if not (semente & escura).any():
+        ys, xs = np.nonzero(escura)
+        if not ys.size:
+            return escura
+        mais_proximo = np.argmin((ys - altura / 2) ** 2 + (xs - largura / 2) ** 2)
+        semente[:] = False
+        semente[ys[mais_proximo], xs[mais_proximo]] = True
+    lesao = _reconstruir(semente, escura)
+
+    # Buracos = fundo não alcançável a partir da moldura da imagem
+    moldura = np.zeros_like(lesao)
+    moldura[[0, -1], :] = True
+    moldura[:, [0, -1]] = True
+    return ~_reconstruir(moldura, ~lesao)
+
+
+def _assimetria(lesao: np.ndarray) -> tuple:
+    """Fração não sobreposta ao espelhar a lesão em cada eixo principal (0 = simétrica)."""
+    ys, xs = np.nonzero(lesao)
+    coords = np.stack([xs, ys], axis=1).astype(np.float64)
+    centradas = coords - coords.mean(axis=0)
+    _, eixos = np.linalg.eigh(centradas.T @ centradas / len(centradas))
+    pixels = np.rint(centradas @ eixos).astype(np.int64)
+
+    deslocamento = np.abs(pixels).max() + 1
+    base = 2 * deslocamento + 1
+
+    def chaves(p):
+        return np.unique((p[:, 0] + deslocamento) * base + (p[:, 1] + deslocamento))
+
+    originais = chaves(pixels)
+    resultado = []
+    for eixo in (0, 1):
+        espelho = pixels.copy()
+        espelho[:, eixo] *= -1
+        sobreposicao = np.intersect1d(originais, chaves(espelho), assume_unique=True).size
+        resultado.append(1 - sobreposicao / originais.size)
+    return tuple(resultado)
+
+
+def _irregularidade_borda(lesao: np.ndarray) -> float:
+    """Compacidade P²/(4πA): 1 para um círculo, cresce com bordas irregulares."""
+    moldurada = np.pad(lesao, 1)
+    # Arestas 4-conexas superestimam o perímetro em ~4/π
+    arestas = np.count_nonzero(moldurada[:, 1:] != moldurada[:, :-1]) + np.count_nonzero(moldurada[1:] != moldurada[:-1])
+    perimetro = arestas * np.pi / 4
+    return float(perimetro ** 2 / (4 * np.pi * np.count_nonzero(lesao)))
+
+
+def _cores(rgb: np.ndarray, lesao: np.ndarray) -> tuple:
+    pixels = rgb[lesao].astype(np.float32)
+    distancias = ((pixels[:, None, :] - CORES_REFERENCIA[None, :, :]) ** 2).sum(axis=2)
+    fracoes = np.bincount(np.argmin(distancias, axis=1), minlength=len(CORES_REFERENCIA)) / len(pixels)
+    variegacao = float((pixels / 255).std(axis=0).mean())
+    return int(np.count_nonzero(fracoes >= ABCD_COR_MIN_FRACAO)), variegacao
+
+
+def _diametro(lesao: np.ndarray) -> float:
+    """Maior diâmetro de Feret: maior extensão da borda projetada em 36 direções."""
+    moldurada = np.pad(lesao, 1)
+    borda = (moldurada & _dilatar(~moldurada))[1:-1, 1:-1]
+    ys, xs = np.nonzero(borda)
+    angulos = np.linspace(0, np.pi, 36, endpoint=False)
+    projecoes = np.stack([xs, ys], axis=1) @ np.stack([np.cos(angulos), np.sin(angulos)])
+    return float((projecoes.max(axis=0) - projecoes.min(axis=0)).max() + 1)
+
+
+def extrair_abcd(dados: bytes, largura_referencia: int = None) -> dict:
+    """
+    Executado no pool de processos. Analisa uma cópia reduzida (maior lado ABCD_TAMANHO_ANALISE);
+    área e diâmetro são convertidos para pixels da imagem de `largura_referencia` (a original normalizada).
+    """
+    with Image.open(io.BytesIO(dados)) as original:
+        imagem = original.convert("RGB")
+    imagem.thumbnail((ABCD_TAMANHO_ANALISE, ABCD_TAMANHO_ANALISE), Image.Resampling.BILINEAR)
+    rgb = np.asarray(imagem)
+    escala = (largura_referencia or imagem.width) / imagem.width
+
+    lesao = segmentar(rgb)
+    fracao = np.count_nonzero(lesao) / lesao.size
+    # Segmentação que pegou quase nada ou quase tudo não produz medidas confiáveis
+    if fracao < 0.001 or fracao > 0.95:
+        return {"segmentacao_ok": False, "fracao_imagem": round(float(fracao), 4)}
+
+    assimetria_1, assimetria_2 = _assimetria(lesao)
+    cores, variegacao = _cores(rgb, lesao)
+    return {
+        "segmentacao_ok": True,
+        "fracao_imagem": round(float(fracao), 4),
+        "assimetria": round((assimetria_1 + assimetria_2) / 2, 4),
+        "assimetria_eixo_maior": round(assimetria_1, 4),
+        "assimetria_eixo_menor": round(assimetria_2, 4),
+        "irregularidade_borda": round(_irregularidade_borda(lesao), 4),
+        "cores": cores,
+        "variegacao": round(variegacao, 4),
+        "diametro_px": round(_diametro(lesao) * escala, 1),
+        "area_px": int(np.count_nonzero(lesao) * escala ** 2),
+    }
+
+
+async def imagens_sem_abcd(limite: int, apos_id: int = 0):
+    """Imagens sem características ou calculadas por uma versão anterior, em ordem de id."""
+    async with SessionLocal() as db:
+        stmt = (
+            select(
+                models.RegistroLesoesImagens.id,
+                models.RegistroLesoesImagens.arquivo_path,
+                models.RegistroLesoesImagens.preview_path,
+                models.RegistroLesoesImagens.largura,
+                models.RegistroLesoesImagens.registro_lesoes_id,
+                models.RegistroLesoes.atendimento_id,
+            )
+            .join(models.RegistroLesoes, models.RegistroLesoes.id == models.RegistroLesoesImagens.registro_lesoes_id)
+            .outerjoin(models.CaracteristicasAbcd, models.CaracteristicasAbcd.imagem_id == models.RegistroLesoesImagens.id)
+            .filter(
+                models.RegistroLesoesImagens.id > apos_id,
+                (models.CaracteristicasAbcd.id.is_(None)) | (models.CaracteristicasAbcd.versao < ABCD_VERSAO)
+            )
+            .order_by(models.RegistroLesoesImagens.id)
+            .limit(limite)
+        )
+        return (await db.execute(stmt)).all()
+
+
+async def extrair_abcd_lote(imagens) -> List[dict]:
+    """Baixa (a prévia, quando existe: resolução suficiente e bem menor) e analisa no pool de processos."""
+    limite = asyncio.Semaphore(ABCD_CONCORRENCIA)
+
+    async def processar(imagem):
+        async with limite:
+            try:
+                with latencia_extracao.time():
+                    dados = await storage.baixar(imagem.preview_path or imagem.arquivo_path)
+                    resultado = await executar_no_pool(extrair_abcd, dados, imagem.largura)
+            except Exception as e:
+                print(f"Erro ao extrair ABCD da imagem {imagem.id}: {str(e)}")
+                return None
+            return {
+                "imagem_id": imagem.id,
+                "registro_lesoes_id": imagem.registro_lesoes_id,
+                "atendimento_id": imagem.atendimento_id,
+                "versao": ABCD_VERSAO,
+                "segmentacao_ok": resultado["segmentacao_ok"],
+                "fracao_imagem": resultado["fracao_imagem"],
+                "assimetria": resultado.get("assimetria"),
+                "assimetria_eixo_maior": resultado.get("assimetria_eixo_maior"),
+                "assimetria_eixo_menor": resultado.get("assimetria_eixo_menor"),
+                "irregularidade_borda": resultado.get("irregularidade_borda"),
+                "cores": resultado.get("cores"),
+                "variegacao": resultado.get("variegacao"),
+                "diametro_px": resultado.get("diametro_px"),
+                "area_px": resultado.get("area_px"),
+            }
+
+    resultados = await asyncio.gather(*(processar(imagem) for imagem in imagens))
+    return [resultado for resultado in resultados if resultado is not None]
+
+
+async def salvar_abcd(linhas: List[dict]):
+    """Upsert em lote (uma instrução) pela imagem."""
+    if not linhas:
+        return
+    async with SessionLocal() as db:
+        stmt = insert(models.CaracteristicasAbcd).values(linhas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[models.CaracteristicasAbcd.imagem_id],
+            set_={
+                **{coluna: stmt.excluded[coluna] for coluna in linhas[0] if coluna != "imagem_id"},
+                "data_calculo": func.now(),
+            },
+        )
+        await db.execute(stmt)
+        await db.commit()
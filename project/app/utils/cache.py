@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import hashlib
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+from fastapi.encoders import jsonable_encoder
+
+from ..core import metrics
+
+# `memory`: cache do processo, inclusive as gerações das tags. Uma invalidação só vale no processo que a
+# fez; os demais (uvicorn --workers N, várias réplicas) servem a entrada antiga até ela expirar. Nesse modo
+# o TTL é limitado a CACHE_TTL_MEMORIA; com mais de um processo use `redis` (invalidação imediata em todos).
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10_000))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CACHE_TTL_PADRAO = int(os.getenv("CACHE_TTL_PADRAO", 300))
+CACHE_TTL_MEMORIA = int(os.getenv("CACHE_TTL_MEMORIA", 10))
+
+# Parâmetros de handlers que nunca fazem parte da chave (sessão, usuário, tarefas...)
+PARAMETROS_IGNORADOS = ("db", "current_user", "background_tasks")
+
+
+class LRUBackend:
+    """
+    Backend em memória do processo, limitado por número de entradas e por bytes.
+    Também serve de substituto local do backend compartilhado (ex.: em testes).
+    Com `max_ttl`, nenhuma entrada vive mais que isso (nem as gravadas sem TTL).
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES,
+                 max_ttl: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+        self._data: "OrderedDict[str, tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._counters: dict = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.get_sync(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        self.set_sync(key, value, ttl)
+
+    async def delete(self, key: str):
+        with self._lock:
+            self._pop(key)
+
+    async def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    async def get_counters(self, keys: Sequence[str]) -> list:
+        return [self._counters.get(key, 0) for key in keys]
+
+    def get_sync(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._pop(key)
+                self.expirations += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set_sync(self, key: str, value: bytes, ttl: Optional[int] = None):
+        if self.max_ttl:
+            ttl = min(ttl or self.max_ttl, self.max_ttl)
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (value, expires_at)
+            self._bytes += len(key) + len(value)
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._pop(oldest)
+                self.evictions += 1
+
+    def _pop(self, key: str):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= len(key) + len(item[0])
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "max_ttl": self.max_ttl,
+            "entries": len(self._data),
+            "memory_bytes": self._bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class RedisBackend:
+    """Backend compartilhado entre processos/pods. Requer o pacote `redis`."""
+
+    def __init__(self, url: str, prefix: str = "dermalert:cache:"):
+        try:
+            from redis import asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requer o pacote 'redis' instalado") from e
+        self._client = aioredis.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(self._prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        await self._client.set(self._prefix + key, value, ex=ttl)
+
+    async def delete(self, key: str):
+        await self._client.delete(self._prefix + key)
+
+    async def incr(self, key: str) -> int:
+        return await self._client.incr(self._prefix + key)
+
+    async def get_counters(self, keys: Sequence[str]) -> list:
+        if not keys:
+            return []
+        values = await self._client.mget([self._prefix + key for key in keys])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def stats(self) -> dict:
+        # Memória e evicções ficam a cargo do servidor Redis (INFO memory / stats)
+        return {"backend": "redis"}
+
+
+class Cache:
+    """
+    Cache de respostas/consultas com invalidação por tags.
+
+    Cada tag tem um contador de geração; as entradas guardam a geração das suas tags
+    no momento da gravação e são descartadas quando alguma delas foi invalidada depois.
+    Invalidar uma tag é O(1) e funciona igual nos backends local e compartilhado.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = metrics.Counter()
+        self.misses = metrics.Counter()
+        self.stale = metrics.Counter()
+
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"tag:{tag}"
+
+    async def generations(self, tags: Sequence[str]) -> list:
+        if not tags:
+            return []
+        return await self.backend.get_counters([self._tag_key(tag) for tag in tags])
+
+    async def get(self, key: str, generations: Sequence[int] = ()) -> tuple[bool, Any]:
+        raw = await self.backend.get(key)
+        if raw is None:
+            self.misses.inc()
+            return False, None
+        entry = json.loads(raw)
+        if entry["g"] != list(generations):
+            self.stale.inc()
+            self.misses.inc()
+            return False, None
+        self.hits.inc()
+        return True, entry["v"]
+
+    async def set(self, key: str, value: Any, generations: Sequence[int] = (), ttl: Optional[int] = CACHE_TTL_PADRAO):
+        raw = json.dumps({"g": list(generations), "v": value}, separators=(",", ":")).encode()
+        await self.backend.set(key, raw, ttl)
+
+    async def invalidate(self, *tags: str):
+        for tag in tags:
+            await self.backend.incr(self._tag_key(tag))
+
+    def stats(self) -> dict:
+        hits, misses = self.hits.value, self.misses.value
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "stale": self.stale.value,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            **self.backend.stats(),
+        }
+
+
+def _build_backend():
+    if CACHE_BACKEND == "redis":
+        if not CACHE_REDIS_URL:
+            raise RuntimeError("CACHE_BACKEND=redis requer CACHE_REDIS_URL")
+        return RedisBackend(CACHE_REDIS_URL)
+    return LRUBackend(max_ttl=CACHE_TTL_MEMORIA)
+
+
+cache = Cache(_build_backend())
+metrics.register("cache", cache.stats)
+
+
+def make_key(func: Callable, arguments: dict) -> str:
+    payload = json.dumps(arguments, sort_keys=True, default=str, separators=(",", ":"))
+    digest = hashlib.sha1(payload.encode()).hexdigest()
+    return f"{func.__module__}.{func.__qualname__}:{digest}"
+
+
+def call_arguments(signature: inspect.Signature, args, kwargs, ignore: Iterable[str]) -> dict:
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return {name: value for name, value in bound.arguments.items() if name not in ignore}
+
+
+def cached(
+    tags: Sequence[str] = (),
+    ttl: Optional[int] = CACHE_TTL_PADRAO,
+    ignore: Iterable[str] = PARAMETROS_IGNORADOS,
+):
+    """
+    Decorator para handlers de rota e funções CRUD assíncronas.
+
+    A chave é formada pela função e pelos argumentos (exceto os de `ignore`).
+    O valor é armazenado já convertido com jsonable_encoder, portanto o retorno
+    em cache é sempre JSON puro (dicts/listas), nunca objetos ORM.
+    """
+    ignore = tuple(ignore)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = make_key(func, call_arguments(signature, args, kwargs, ignore))
+            # Gerações lidas antes de computar: uma invalidação concorrente torna a entrada obsoleta
+            generations = await cache.generations(tags)
+            hit, value = await cache.get(key, generations)
+            if hit:
+                return value
+            value = jsonable_encoder(await func(*args, **kwargs))
+            await cache.set(key, value, generations, ttl)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+async def invalidate(*tags: str):
+    await cache.invalidate(*tags)
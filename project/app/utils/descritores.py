@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+# Descritor visual da imagem de lesão (CPU, NumPy): histograma de cor HSV + textura (LBP uniforme)
+# + histograma de orientação do gradiente. Vetor float32 com norma L2 = 1: similaridade = produto interno.
+# Mudou o cálculo? Incremente DESCRITOR_VERSAO (o índice de similaridade passa a outro arquivo, reconstruído
+# do banco) e recalcule a coluna `descritor` (anulada, é preenchida de novo por scripts/gerar_miniaturas).
+DESCRITOR_VERSAO = 1
+DESCRITOR_TAMANHO_ANALISE = int(os.getenv("DESCRITOR_TAMANHO_ANALISE", 256))
+
+BINS_H, BINS_S, BINS_V = 8, 4, 4
+BINS_ORIENTACAO = 16
+# Peso de cada bloco na similaridade final
+PESO_COR, PESO_TEXTURA, PESO_GRADIENTE = 0.5, 0.3, 0.2
+
+
+def _tabela_lbp_uniforme() -> np.ndarray:
+    # Padrões com no máximo 2 transições 0/1 no círculo (58 para 8 vizinhos); os demais caem no bin 58
+    tabela = np.full(256, 58, dtype=np.uint8)
+    proximo = 0
+    for codigo in range(256):
+        rotacionado = (codigo >> 1) | ((codigo & 1) << 7)
+        if bin(codigo ^ rotacionado).count("1") <= 2:
+            tabela[codigo] = proximo
+            proximo += 1
+    return tabela
+
+
+_LBP_UNIFORME = _tabela_lbp_uniforme()
+BINS_LBP = 59
+DESCRITOR_DIMENSAO = BINS_H * BINS_S * BINS_V + BINS_LBP + BINS_ORIENTACAO
+
+_VIZINHOS = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+
+
+def _normalizado(histograma: np.ndarray, peso: float) -> np.ndarray:
+    # Raiz do histograma normalizado (kernel de Hellinger) e norma L2 = sqrt(peso)
+    h = np.sqrt(histograma / max(histograma.sum(), 1e-12))
+    return h / max(np.linalg.norm(h), 1e-12) * np.sqrt(peso)
+
+
+def _histograma_cor(rgb: Image.Image) -> np.ndarray:
+    hsv = np.asarray(rgb.convert("HSV"), dtype=np.uint16)
+    h = hsv[..., 0] * BINS_H // 256
+    s = hsv[..., 1] * BINS_S // 256
+    v = hsv[..., 2] * BINS_V // 256
+    indices = (h * BINS_S + s) * BINS_V + v
+    return np.bincount(indices.ravel(), minlength=BINS_H * BINS_S * BINS_V).astype(np.float64)
+
+
+def _histograma_lbp(cinza: np.ndarray) -> np.ndarray:
+    centro = cinza[1:-1, 1:-1]
+    altura, largura = cinza.shape
+    codigos = np.zeros(centro.shape, dtype=np.uint8)
+    for bit, (dy, dx) in enumerate(_VIZINHOS):
+        vizinho = cinza[1 + dy:altura - 1 + dy, 1 + dx:largura - 1 + dx]
+        codigos |= (vizinho >= centro).astype(np.uint8) << bit
+    return np.bincount(_LBP_UNIFORME[codigos].ravel(), minlength=BINS_LBP).astype(np.float64)
+
+
+def _histograma_gradiente(cinza: np.ndarray) -> np.ndarray:
+    gx = cinza[1:-1, 2:] - cinza[1:-1, :-2]
+    gy = cinza[2:, 1:-1] - cinza[:-2, 1:-1]
+    magnitude = np.hypot(gx, gy)
+    # Orientação sem sinal (0..pi): a borda clara->escura e escura->clara contam igual
+    orientacao = np.mod(np.arctan2(gy, gx), np.pi)
+    bins = np.minimum((orientacao / np.pi * BINS_ORIENTACAO).astype(np.int64), BINS_ORIENTACAO - 1)
+    return np.bincount(bins.ravel(), weights=magnitude.ravel(), minlength=BINS_ORIENTACAO)
+
+
+def extrair_descritor(imagem: Image.Image) -> np.ndarray:
+    """Executado no pool de processos, sobre a imagem já decodificada (RGB)."""
+    rgb = imagem.convert("RGB")
+    fator = max(rgb.width, rgb.height) // DESCRITOR_TAMANHO_ANALISE
+    if fator > 1:
+        rgb = rgb.reduce(fator)
+    cinza = np.asarray(rgb.convert("L"), dtype=np.float32)
+
+    vetor = np.concatenate([
+        _normalizado(_histograma_cor(rgb), PESO_COR),
+        _normalizado(_histograma_lbp(cinza), PESO_TEXTURA),
+        _normalizado(_histograma_gradiente(cinza), PESO_GRADIENTE),
+    ])
+    return (vetor / max(np.linalg.norm(vetor), 1e-12)).astype(np.float32)
@@ -0,0 +1,189 @@
+import os
+import time
+import random
+import asyncio
+import smtplib
+from datetime import timedelta
+
+from sqlalchemy import func, delete, extract
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..core import metrics
+from ..database import models
+from ..database.database import SessionLocal
+from .send_email import despachante_email, montar_mensagem, smtp_username, email_convite, email_redefinicao_senha
+
+# Linhas reivindicadas (e enviadas) por transação
+EMAIL_OUTBOX_LOTE = int(os.getenv("EMAIL_OUTBOX_LOTE", 50))
+# Espera entre consultas quando a fila está vazia
+EMAIL_OUTBOX_INTERVALO = float(os.getenv("EMAIL_OUTBOX_INTERVALO", 1))
+# Depois disso a linha fica como "falhou" e não é mais tentada
+EMAIL_OUTBOX_TENTATIVAS = int(os.getenv("EMAIL_OUTBOX_TENTATIVAS", 8))
+# Espera antes da n-ésima nova tentativa: base * 2^(n-1) segundos, limitada ao máximo (com jitter)
+EMAIL_OUTBOX_BACKOFF_BASE = float(os.getenv("EMAIL_OUTBOX_BACKOFF_BASE", 30))
+EMAIL_OUTBOX_BACKOFF_MAX = float(os.getenv("EMAIL_OUTBOX_BACKOFF_MAX", 3600))
+# Tempo máximo esperando o servidor SMTP aceitar o lote; o que não respondeu volta para a fila
+EMAIL_OUTBOX_ENVIO_TIMEOUT = float(os.getenv("EMAIL_OUTBOX_ENVIO_TIMEOUT", 120))
+# Linhas enviadas são apagadas depois disso (as que falharam ficam para inspeção)
+EMAIL_OUTBOX_RETENCAO_DIAS = int(os.getenv("EMAIL_OUTBOX_RETENCAO_DIAS", 30))
+
+# Profundidade e idade da fila são recalculadas a cada tanto, não a cada lote
+_MANUTENCAO_SEGUNDOS = 60
+
+_fila = {"pendentes": 0, "falhas_definitivas": 0, "idade_max_segundos": 0.0}
+enviados = metrics.Counter()
+retentativas = metrics.Counter()
+falhas = metrics.Counter()
+latencia_lote = metrics.LatencyStats()
+
+
+def stats() -> dict:
+    return {
+        **_fila,
+        "enviados": enviados.value,
+        "retentativas": retentativas.value,
+        "falhas": falhas.value,
+        "lote": latencia_lote.snapshot(),
+    }
+
+
+metrics.register("email_outbox", stats)
+
+
+def enfileirar_email(db: AsyncSession, destinatario: str, assunto: str, corpo: str, html: bool = True):
+    """
+    Grava o e-mail na sessão do chamador: ele só existe para o dispatcher depois do commit
+    da mesma transação que gerou o token (e some junto num rollback).
+    """
+    db.add(models.EmailOutbox(destinatario=destinatario, assunto=assunto, corpo=corpo, html=html))
+
+
+def enfileirar_convite(db: AsyncSession, email: str, invite_token: str):
+    assunto, corpo = email_convite(invite_token)
+    enfileirar_email(db, email, assunto, corpo)
+
+
+def enfileirar_redefinicao_senha(db: AsyncSession, email: str, reset_token: str):
+    assunto, corpo = email_redefinicao_senha(reset_token)
+    enfileirar_email(db, email, assunto, corpo)
+
+
+def _definitivo(erro) -> bool:
+    # Destinatário recusado ou 5xx: reenviar não adianta. Falha de autenticação é configuração, não a mensagem
+    if isinstance(erro, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(erro, smtplib.SMTPAuthenticationError):
+        return False
+    return isinstance(erro, smtplib.SMTPResponseException) and erro.smtp_code >= 500
+
+
+def _espera(tentativas: int) -> timedelta:
+    segundos = min(EMAIL_OUTBOX_BACKOFF_BASE * 2 ** (tentativas - 1), EMAIL_OUTBOX_BACKOFF_MAX)
+    # Jitter: linhas que falharam juntas (ex.: servidor fora do ar) não voltam todas no mesmo instante
+    return timedelta(seconds=segundos * random.uniform(0.5, 1.0))
+
+
+async def despachar_lote() -> int:
+    """
+    Reivindica até EMAIL_OUTBOX_LOTE linhas vencidas com FOR UPDATE SKIP LOCKED (vários workers
+    não pegam a mesma linha), envia pelo despachante SMTP e grava o resultado na mesma transação.
+    Retorna quantas linhas foram processadas.
+    """
+    async with SessionLocal() as db:
+        stmt = (
+            select(models.EmailOutbox)
+            .filter(models.EmailOutbox.status == "pendente", models.EmailOutbox.proxima_tentativa <= func.now())
+            .order_by(models.EmailOutbox.proxima_tentativa)
+            .limit(EMAIL_OUTBOX_LOTE)
+            .with_for_update(skip_locked=True)
+        )
+        linhas = (await db.execute(stmt)).scalars().all()
+        if not linhas:
+            return 0
+
+        with latencia_lote.time():
+            futuros = {}
+            for linha in linhas:
+                origem = despachante_email.enviar(
+                    smtp_username,
+                    linha.destinatario,
+                    montar_mensagem(smtp_username, linha.destinatario, linha.assunto, linha.corpo, linha.html),
+                )
+                futuros[asyncio.wrap_future(origem)] = (origem, linha)
+            await asyncio.wait(futuros, timeout=EMAIL_OUTBOX_ENVIO_TIMEOUT)
+
+        for futuro, (origem, linha) in futuros.items():
+            if not futuro.done():
+                # Ainda na fila do despachante: cancela, senão seria enviado mesmo voltando para a fila
+                # (o despachante pula os cancelados). Se já está em envio o cancelamento não tem efeito
+                origem.cancel()
+                futuro.cancel()
+            elif futuro.exception() is None:
+                linha.status = "enviado"
+                linha.data_envio = func.now()
+                linha.corpo = None
+                linha.ultimo_erro = None
+                enviados.inc()
+                continue
+
+            erro = TimeoutError("sem resposta do servidor SMTP") if futuro.cancelled() else futuro.exception()
+            linha.tentativas += 1
+            linha.ultimo_erro = str(erro)[:500]
+            if _definitivo(erro) or linha.tentativas >= EMAIL_OUTBOX_TENTATIVAS:
+                print(f"E-mail {linha.id} para {linha.destinatario} descartado após {linha.tentativas} tentativa(s): {str(erro)}")
+                linha.status = "falhou"
+                falhas.inc()
+            else:
+                linha.proxima_tentativa = func.now() + _espera(linha.tentativas)
+                retentativas.inc()
+
+        await db.commit()
+        return len(linhas)
+
+
+async def _manutencao():
+    """Atualiza profundidade/idade da fila e apaga as linhas enviadas há mais de EMAIL_OUTBOX_RETENCAO_DIAS."""
+    outbox = models.EmailOutbox
+    async with SessionLocal() as db:
+        stmt = select(
+            func.count(),
+            extract("epoch", func.now() - func.min(outbox.data_criacao)),
+        ).filter(outbox.status == "pendente")
+        pendentes, idade = (await db.execute(stmt)).one()
+        stmt = select(func.count()).select_from(outbox).filter(outbox.status == "falhou")
+        falhas_definitivas = (await db.execute(stmt)).scalar()
+
+        await db.execute(delete(outbox).filter(
+            outbox.status == "enviado",
+            outbox.data_envio < func.now() - timedelta(days=EMAIL_OUTBOX_RETENCAO_DIAS),
+        ))
+        await db.commit()
+
+    _fila["pendentes"] = pendentes
+    _fila["falhas_definitivas"] = falhas_definitivas
+    _fila["idade_max_segundos"] = round(float(idade or 0), 1)
+
+
+async def executar_dispatcher(parar: asyncio.Event):
+    """
+    Laço do dispatcher, iniciado no lifespan de cada worker da API (o SKIP LOCKED permite vários).
+    Com `parar` sinalizado termina o lote em andamento antes de sair.
+    """
+    ultima_manutencao = 0.0
+    while not parar.is_set():
+        processados = 0
+        try:
+            processados = await despachar_lote()
+            if time.monotonic() - ultima_manutencao >= _MANUTENCAO_SEGUNDOS:
+                await _manutencao()
+                ultima_manutencao = time.monotonic()
+        except Exception as e:
+            print(f"Erro no dispatcher de e-mails: {str(e)}")
+
+        if processados < EMAIL_OUTBOX_LOTE:
+            # Fila vazia (ou quase): espera o intervalo; lote cheio: provavelmente há mais, segue direto
+            try:
+                await asyncio.wait_for(parar.wait(), timeout=EMAIL_OUTBOX_INTERVALO)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,395 @@
+import os
+import io
+import shutil
+import asyncio
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable
+
+from fastapi import HTTPException
+from PIL import Image, ImageOps
+from sqlalchemy import or_
+from sqlalchemy.future import select
+
+from ..database import models
+from ..database.database import SessionLocal
+from ..core import metrics
+from .qualidade import avaliar_qualidade, QUALIDADE_ALVO_MS
+from .phash import calcular_dhash
+from .descritores import extrair_descritor
+from .similaridade import indice_similaridade
+from .minio import TIPOS_IMAGEM_PERMITIDOS, TAMANHO_MAXIMO_UPLOAD_MB
+from .storage import storage, armazenar_por_conteudo
+from .tarefas import tarefa, enfileirar_tarefa
+
+try:
+    # HEIC/HEIF (fotos de iPhone) só são decodificados com o pillow-heif instalado
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    register_heif_opener = None
+
+# Decodificação/redimensionamento é CPU pesada: roda em processos separados, fora do event loop
+IMAGENS_MAX_WORKERS = int(os.getenv("IMAGENS_MAX_WORKERS", max((os.cpu_count() or 2) - 1, 1)))
+IMAGENS_CONCORRENCIA = int(os.getenv("IMAGENS_CONCORRENCIA", 4))
+
+THUMBNAIL_TAMANHO = int(os.getenv("THUMBNAIL_TAMANHO", 256))
+PREVIEW_TAMANHO = int(os.getenv("PREVIEW_TAMANHO", 1024))
+
+# Normalização no upload: maior lado permitido, qualidade do JPEG gravado e limite contra "decompression bombs"
+NORMALIZACAO_MAX_DIMENSAO = int(os.getenv("NORMALIZACAO_MAX_DIMENSAO", 4096))
+NORMALIZACAO_QUALIDADE = int(os.getenv("NORMALIZACAO_QUALIDADE", 90))
+Image.MAX_IMAGE_PIXELS = int(os.getenv("NORMALIZACAO_MAX_PIXELS", 100_000_000))
+
+# Formatos detectados pelo conteúdo (não pelo content_type informado pelo cliente)
+FORMATOS_ACEITOS = {"JPEG", "MPO", "PNG", "WEBP"}
+if register_heif_opener is not None:
+    FORMATOS_ACEITOS.add("HEIF")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+latencia_processamento = metrics.LatencyStats()
+latencia_normalizacao = metrics.LatencyStats()
+latencia_qualidade = metrics.LatencyStats()
+_normalizacao = {
+    "normalizadas": metrics.Counter(),
+    "invalidas": metrics.Counter(),
+    "bytes_originais": metrics.Counter(),
+    "bytes_normalizados": metrics.Counter(),
+    "qualidade_reprovadas": metrics.Counter(),
+    "qualidade_acima_do_alvo": metrics.Counter(),
+}
+metrics.register("imagens", lambda: {
+    "processamento": latencia_processamento.snapshot(),
+    "normalizacao": {
+        "latencia": latencia_normalizacao.snapshot(),
+        "latencia_qualidade": latencia_qualidade.snapshot(),
+        "qualidade_alvo_ms": QUALIDADE_ALVO_MS,
+        **{nome: contador.value for nome, contador in _normalizacao.items()},
+    },
+})
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=IMAGENS_MAX_WORKERS)
+        return _pool
+
+
+def configurar_process_pool(max_workers: int):
+    """Tamanho do pool de processos; só vale antes do primeiro uso (o worker ajusta pela linha de comando)."""
+    global IMAGENS_MAX_WORKERS
+    IMAGENS_MAX_WORKERS = max_workers
+
+
+def shutdown_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+async def executar_no_pool(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), fn, *args)
+
+
+def _redimensionar(imagem: Image.Image, tamanho: int, formato: str, **opcoes) -> dict:
+    copia = imagem.copy()
+    copia.thumbnail((tamanho, tamanho), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    copia.save(buffer, format=formato, **opcoes)
+    return {"dados": buffer.getvalue(), "largura": copia.width, "altura": copia.height}
+
+
+class ImagemInvalidaError(Exception):
+    pass
+
+
+def _para_rgb(imagem: Image.Image) -> Image.Image:
+    # Transparência vira fundo branco (JPEG não tem canal alfa)
+    if imagem.mode in ("RGBA", "LA") or (imagem.mode == "P" and "transparency" in imagem.info):
+        imagem = imagem.convert("RGBA")
+        fundo = Image.new("RGB", imagem.size, (255, 255, 255))
+        fundo.paste(imagem, mask=imagem.getchannel("A"))
+        return fundo
+    return imagem.convert("RGB")
+
+
+def normalizar_imagem(origem) -> dict:
+    """
+    Executado no pool de processos, com os bytes da imagem ou o caminho de um arquivo temporário
+    (uploads grandes não são copiados para o processo filho). Decodifica a imagem por completo (arquivos corrompidos ou
+    truncados falham aqui), aplica a orientação do EXIF, limita o maior lado a NORMALIZACAO_MAX_DIMENSAO
+    e regrava como JPEG sem metadados (EXIF/GPS), mantendo apenas o perfil de cor.
+    As métricas de qualidade são calculadas na mesma passada, sobre a imagem já decodificada.
+    """
+    try:
+        with Image.open(io.BytesIO(origem) if isinstance(origem, bytes) else origem) as original:
+            formato = original.format
+            if formato not in FORMATOS_ACEITOS:
+                raise ImagemInvalidaError(f"formato {formato or 'desconhecido'} não suportado")
+            if formato in ("JPEG", "MPO") and max(original.size) > NORMALIZACAO_MAX_DIMENSAO:
+                # Decodifica o JPEG já reduzido (1/2, 1/4, 1/8): bem mais rápido para fotos de câmera
+                original.draft("RGB", (NORMALIZACAO_MAX_DIMENSAO, NORMALIZACAO_MAX_DIMENSAO))
+            original.load()
+            icc_profile = original.info.get("icc_profile") if original.mode == "RGB" else None
+            imagem = _para_rgb(ImageOps.exif_transpose(original))
+    except ImagemInvalidaError:
+        raise
+    except (Image.DecompressionBombError, OSError, SyntaxError, ValueError) as e:
+        raise ImagemInvalidaError(str(e) or "arquivo corrompido")
+
+    qualidade = avaliar_qualidade(imagem)
+    phash = calcular_dhash(imagem)
+
+    if max(imagem.size) > NORMALIZACAO_MAX_DIMENSAO:
+        imagem.thumbnail((NORMALIZACAO_MAX_DIMENSAO, NORMALIZACAO_MAX_DIMENSAO), Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    opcoes = {"quality": NORMALIZACAO_QUALIDADE, "optimize": True}
+    if icc_profile:
+        opcoes["icc_profile"] = icc_profile
+    imagem.save(buffer, format="JPEG", **opcoes)
+    return {
+        "dados": buffer.getvalue(),
+        "largura": imagem.width,
+        "altura": imagem.height,
+        "formato_original": formato,
+        "qualidade": qualidade,
+        "phash": phash,
+    }
+
+
+async def upload_imagem_normalizada(file, folder_name, max_size_mb=TAMANHO_MAXIMO_UPLOAD_MB):
+    """
+    Valida e normaliza a imagem enviada (no pool de processos) e grava o resultado no armazenamento.
+    Retorna os metadados de `armazenar_por_conteudo` mais tamanho original e dimensões finais.
+    """
+    if file.content_type not in TIPOS_IMAGEM_PERMITIDOS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tipo de arquivo não permitido. Tipos aceitos: {', '.join(TIPOS_IMAGEM_PERMITIDOS)}"
+        )
+
+    max_size_bytes = max_size_mb * 1024 * 1024
+    erro_tamanho = HTTPException(status_code=400, detail=f"Arquivo muito grande. Tamanho máximo: {max_size_mb}MB")
+    if file.size is not None and file.size > max_size_bytes:
+        raise erro_tamanho
+    await file.seek(0)
+    caminho = await asyncio.to_thread(_copiar_para_temporario, file.file, max_size_bytes)
+    try:
+        if caminho is None:
+            raise erro_tamanho
+        return await armazenar_imagem_normalizada(caminho, folder_name)
+    finally:
+        if caminho is not None:
+            os.unlink(caminho)
+
+
+def _copiar_para_temporario(origem, max_size_bytes: int):
+    """
+    Copia o upload (SpooledTemporaryFile, em memória ou sem nome no disco) para um arquivo
+    temporário nomeado, que o processo filho abre pelo caminho. Retorna None se passar do limite.
+    """
+    with tempfile.NamedTemporaryFile(prefix="upload-", delete=False) as destino:
+        shutil.copyfileobj(origem, destino, 1024 * 1024)
+        tamanho = destino.tell()
+    if tamanho > max_size_bytes:
+        os.unlink(destino.name)
+        return None
+    return destino.name
+
+
+async def armazenar_imagem_normalizada(origem, folder_name):
+    """
+    Normaliza (no pool de processos) uma imagem já recebida, em bytes ou no caminho de um arquivo
+    local, e grava o resultado endereçado por conteúdo.
+    """
+    tamanho_original = len(origem) if isinstance(origem, bytes) else os.path.getsize(origem)
+    try:
+        with latencia_normalizacao.time():
+            normalizada = await executar_no_pool(normalizar_imagem, origem)
+    except ImagemInvalidaError as e:
+        _normalizacao["invalidas"].inc()
+        raise HTTPException(status_code=400, detail=f"Imagem inválida: {str(e)}")
+
+    _normalizacao["normalizadas"].inc()
+    _normalizacao["bytes_originais"].inc(tamanho_original)
+    _normalizacao["bytes_normalizados"].inc(len(normalizada["dados"]))
+    qualidade = normalizada["qualidade"]
+    latencia_qualidade.record(qualidade["tempo_ms"] / 1000)
+    if qualidade["tempo_ms"] > QUALIDADE_ALVO_MS:
+        _normalizacao["qualidade_acima_do_alvo"].inc()
+    if not qualidade["aprovada"]:
+        _normalizacao["qualidade_reprovadas"].inc()
+
+    metadata = await armazenar_por_conteudo(normalizada["dados"], folder_name, ".jpg", "image/jpeg")
+    return {
+        **metadata,
+        "tamanho_original": tamanho_original,
+        "largura": normalizada["largura"],
+        "altura": normalizada["altura"],
+        "qualidade": qualidade,
+        "phash": normalizada["phash"],
+    }
+
+
+def nova_imagem_lesao(registro_lesoes_id: int, arquivo_metadata: dict) -> models.RegistroLesoesImagens:
+    """Linha de RegistroLesoesImagens a partir do retorno de `armazenar_imagem_normalizada`."""
+    qualidade = arquivo_metadata["qualidade"]
+    return models.RegistroLesoesImagens(
+        arquivo_path=arquivo_metadata["url"],
+        content_hash=arquivo_metadata["sha256"],
+        tamanho_original=arquivo_metadata["tamanho_original"],
+        tamanho_normalizado=arquivo_metadata["tamanho"],
+        largura=arquivo_metadata["largura"],
+        altura=arquivo_metadata["altura"],
+        nitidez=qualidade["nitidez"],
+        subexposicao=qualidade["subexposicao"],
+        sobreexposicao=qualidade["sobreexposicao"],
+        brilho_medio=qualidade["brilho_medio"],
+        qualidade_aprovada=qualidade["aprovada"],
+        qualidade_alertas=qualidade["alertas"],
+        phash=arquivo_metadata["phash"],
+        registro_lesoes_id=registro_lesoes_id
+    )
+
+
+def gerar_derivados(dados: bytes) -> dict:
+    """
+    Executado no pool de processos. Gera a miniatura (WebP) e a prévia (JPEG)
+    com tamanho máximo fixo, preservando a proporção da imagem original.
+    """
+    with Image.open(io.BytesIO(dados)) as original:
+        imagem = ImageOps.exif_transpose(original).convert("RGB")
+    return {
+        "largura": imagem.width,
+        "altura": imagem.height,
+        "phash": calcular_dhash(imagem),
+        "descritor": extrair_descritor(imagem).tobytes(),
+        "thumbnail": _redimensionar(imagem, THUMBNAIL_TAMANHO, "WEBP", quality=80, method=4),
+        "preview": _redimensionar(imagem, PREVIEW_TAMANHO, "JPEG", quality=85, optimize=True, progressive=True),
+    }
+
+
+CAMPOS_DERIVADOS = (
+    "largura", "altura",
+    "thumbnail_path", "thumbnail_largura", "thumbnail_altura",
+    "preview_path", "preview_largura", "preview_altura",
+)
+# Dependem só do conteúdo: iguais em todas as linhas que apontam para o mesmo objeto
+CAMPOS_CONTEUDO = ("phash", "descritor")
+
+
+def caminho_derivado(arquivo_path: str, sufixo: str, extensao: str) -> str:
+    base, _ = os.path.splitext(arquivo_path)
+    return f"{base}_{sufixo}.{extensao}"
+
+
+async def processar_imagem_lesao(imagem_id: int):
+    async with SessionLocal() as db:
+        imagem = await db.get(models.RegistroLesoesImagens, imagem_id)
+        if imagem is None:
+            return
+
+        # Conteúdo deduplicado: os derivados do mesmo objeto já podem existir
+        stmt = select(models.RegistroLesoesImagens).filter(
+            models.RegistroLesoesImagens.arquivo_path == imagem.arquivo_path,
+            models.RegistroLesoesImagens.thumbnail_path.is_not(None)
+        ).limit(1)
+        existente = (await db.execute(stmt)).scalars().first()
+        if existente is not None:
+            for campo in CAMPOS_DERIVADOS:
+                setattr(imagem, campo, getattr(existente, campo))
+            for campo in CAMPOS_CONTEUDO:
+                if getattr(imagem, campo) is None:
+                    setattr(imagem, campo, getattr(existente, campo))
+            if all(getattr(imagem, campo) is not None for campo in CAMPOS_CONTEUDO):
+                await db.commit()
+                await _anexar_ao_indice(imagem_id)
+                return
+
+        with latencia_processamento.time():
+            dados = await storage.baixar(imagem.arquivo_path)
+            derivados = await executar_no_pool(gerar_derivados, dados)
+
+            thumbnail_path = caminho_derivado(imagem.arquivo_path, "thumb", "webp")
+            preview_path = caminho_derivado(imagem.arquivo_path, "preview", "jpg")
+            await asyncio.gather(
+                storage.enviar(thumbnail_path, derivados["thumbnail"]["dados"], "image/webp"),
+                storage.enviar(preview_path, derivados["preview"]["dados"], "image/jpeg"),
+            )
+
+        imagem.largura = derivados["largura"]
+        imagem.altura = derivados["altura"]
+        imagem.thumbnail_path = thumbnail_path
+        imagem.thumbnail_largura = derivados["thumbnail"]["largura"]
+        imagem.thumbnail_altura = derivados["thumbnail"]["altura"]
+        imagem.preview_path = preview_path
+        imagem.preview_largura = derivados["preview"]["largura"]
+        imagem.preview_altura = derivados["preview"]["altura"]
+        for campo in CAMPOS_CONTEUDO:
+            if getattr(imagem, campo) is None:
+                setattr(imagem, campo, derivados[campo])
+        await db.commit()
+    await _anexar_ao_indice(imagem_id)
+
+
+async def _anexar_ao_indice(imagem_id: int):
+    # Descritor já gravado: todos os processos enxergam a imagem na próxima busca. Falhar aqui só atrasa
+    # a imagem até a próxima sincronização ou reconstrução do índice (a coluna é a fonte da verdade)
+    try:
+        await indice_similaridade.sincronizar([imagem_id])
+    except Exception as e:
+        print(f"Erro ao anexar a imagem {imagem_id} ao índice de similaridade: {str(e)}")
+
+
+@tarefa("imagens.processar")
+async def _tarefa_processar_imagem(imagem_id: int):
+    # Sem capturar exceções: a falha volta para a fila e a imagem é reprocessada com backoff
+    await processar_imagem_lesao(imagem_id)
+
+
+def enfileirar_processamento(db, imagem_ids: Iterable[int]):
+    """Uma tarefa por imagem (novas tentativas independentes), na transação que cria as imagens."""
+    for imagem_id in imagem_ids:
+        enfileirar_tarefa(db, "imagens.processar", {"imagem_id": imagem_id})
+
+
+async def processar_imagens_lesao(imagem_ids: Iterable[int]):
+    """Processa várias imagens com concorrência limitada; falhas são registradas e não interrompem as demais."""
+    limite = asyncio.Semaphore(IMAGENS_CONCORRENCIA)
+
+    async def processar(imagem_id):
+        async with limite:
+            try:
+                await processar_imagem_lesao(imagem_id)
+            except Exception as e:
+                print(f"Erro ao gerar miniaturas da imagem {imagem_id}: {str(e)}")
+
+    await asyncio.gather(*(processar(imagem_id) for imagem_id in imagem_ids))
+
+
+async def imagens_sem_miniatura(limite: int, apos_id: int = 0):
+    async with SessionLocal() as db:
+        stmt = (
+            select(models.RegistroLesoesImagens.id)
+            .filter(
+                or_(
+                    models.RegistroLesoesImagens.thumbnail_path.is_(None),
+                    models.RegistroLesoesImagens.phash.is_(None),
+                    models.RegistroLesoesImagens.descritor.is_(None)
+                ),
+                models.RegistroLesoesImagens.id > apos_id
+            )
+            .order_by(models.RegistroLesoesImagens.id)
+            .limit(limite)
+        )
+        result = await db.execute(stmt)
+        return result.scalars().all()
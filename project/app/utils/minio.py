@@ -1,85 +1,452 @@
 import os
 import io
-import uuid
-from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import socket
+import functools
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
 from fastapi import HTTPException
+import certifi
+import urllib3
+from urllib3.connection import HTTPConnection
 import minio
 from minio import Minio
+from minio.commonconfig import CopySource, REPLACE
+from minio.datatypes import Part
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
+from ..core import metrics
+from .cache import LRUBackend
+
+MINIO_POOL_MAXSIZE = int(os.getenv("MINIO_POOL_MAXSIZE", 32))
+MINIO_CONNECT_TIMEOUT = float(os.getenv("MINIO_CONNECT_TIMEOUT", 5))
+MINIO_READ_TIMEOUT = float(os.getenv("MINIO_READ_TIMEOUT", 60))
+MINIO_REGION = os.getenv("MINIO_REGION") or None
+# Validade das URLs pré-assinadas de upload (PUT direto no MinIO)
+MINIO_PRESIGNED_PUT_EXPIRA_SEGUNDOS = int(os.getenv("MINIO_PRESIGNED_PUT_EXPIRA_SEGUNDOS", 15 * 60))
+# URLs pré-assinadas de download: validade e margem antes da expiração em que deixam de ser reaproveitadas
+MINIO_PRESIGNED_GET_EXPIRA_SEGUNDOS = int(os.getenv("MINIO_PRESIGNED_GET_EXPIRA_SEGUNDOS", 60 * 60))
+MINIO_PRESIGNED_GET_MARGEM_SEGUNDOS = int(os.getenv("MINIO_PRESIGNED_GET_MARGEM_SEGUNDOS", 5 * 60))
+# Tamanho de cada parte do multipart upload (mínimo do S3: 5 MiB). Limita a memória por upload.
+MINIO_PART_SIZE = max(int(os.getenv("MINIO_PART_SIZE", 8 * 1024 * 1024)), 5 * 1024 * 1024)
+
+# O SDK do MinIO é síncrono: toda chamada de rede roda neste pool dedicado, fora do event loop
+MINIO_MAX_WORKERS = int(os.getenv("MINIO_MAX_WORKERS", 16))
+MINIO_TIMEOUT_OPERACAO = float(os.getenv("MINIO_TIMEOUT_OPERACAO", 120))
+
+_executor = ThreadPoolExecutor(max_workers=MINIO_MAX_WORKERS, thread_name_prefix="minio")
+
+_client = None
+_client_lock = threading.Lock()
+_buckets_verificados = set()
+
+_urls_download = LRUBackend(max_entries=50_000, max_bytes=32 * 1024 * 1024)
+metrics.register("minio_urls_download", _urls_download.stats)
+
+# Latência por operação do MinIO (put_object, bucket_exists, ...)
+latencias = defaultdict(metrics.LatencyStats)
+metrics.register("minio", lambda: {op: stats.snapshot() for op, stats in latencias.items()})
+
+
+@contextmanager
+def medir(operacao: str):
+    with latencias[operacao].time():
+        yield
+
+
+def _build_http_client():
+    # Pool único por processo com keep-alive TCP; as conexões são reutilizadas entre uploads
+    socket_options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    return urllib3.PoolManager(
+        num_pools=4,
+        maxsize=MINIO_POOL_MAXSIZE,
+        block=False,
+        timeout=urllib3.Timeout(connect=MINIO_CONNECT_TIMEOUT, read=MINIO_READ_TIMEOUT),
+        retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+        socket_options=socket_options,
+    )
 
 def get_minio_client():
+    """Retorna o cliente MinIO do processo (criado uma única vez)."""
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is not None:
+            return _client
+        try:
+            endpoint = os.getenv("MINIO_ENDPOINT")
+            access_key = os.getenv("MINIO_ACCESS_KEY")
+            secret_key = os.getenv("MINIO_SECRET_KEY")
+            minio_secure = os.getenv("MINIO_SECURE") == 'True'
+
+            _client = Minio(
+                endpoint=endpoint,
+                access_key=access_key,
+                secret_key=secret_key,
+                secure=minio_secure,
+                region=MINIO_REGION,
+                http_client=_build_http_client()
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erro ao conectar ao MinIO: {str(e)}")
+        return _client
+
+async def executar(fn, *args, timeout=None, **kwargs):
+    """
+    Executa uma chamada síncrona do MinIO no pool dedicado, com timeout por operação.
+    O timeout libera o handler; a thread termina sozinha pelos timeouts de conexão/leitura do urllib3.
+    """
+    loop = asyncio.get_running_loop()
+    chamada = functools.partial(fn, *args, **kwargs)
     try:
-        endpoint = os.getenv("MINIO_ENDPOINT")
-        access_key = os.getenv("MINIO_ACCESS_KEY")
-        secret_key = os.getenv("MINIO_SECRET_KEY")
-        minio_secure = os.getenv("MINIO_SECURE") == 'True'
-            
-        return Minio(
-            endpoint=endpoint,
-            access_key=access_key,
-            secret_key=secret_key,
-            secure=minio_secure
+        return await asyncio.wait_for(
+            loop.run_in_executor(_executor, chamada),
+            timeout=timeout or MINIO_TIMEOUT_OPERACAO
         )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao conectar ao MinIO: {str(e)}")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Tempo esgotado aguardando o MinIO")
 
-async def upload_to_minio(file, folder_name, allowed_types=None, max_size_mb=50):
-    try:
-        minio_bucket = os.getenv("MINIO_BUCKET")
+def ensure_bucket(bucket_name=None):
+    """
+    Garante que o bucket existe. A verificação acontece uma vez por processo
+    (no startup) e o resultado fica em cache; chamadas seguintes não vão à rede.
+    """
+    bucket_name = bucket_name or os.getenv("MINIO_BUCKET")
+    if bucket_name in _buckets_verificados:
+        return
+    client = get_minio_client()
+    with medir("bucket_exists"):
+        exists = client.bucket_exists(bucket_name)
+    if not exists:
+        with medir("make_bucket"):
+            client.make_bucket(bucket_name)
+            # Configurar políticas do bucket se necessário
+    _buckets_verificados.add(bucket_name)
+
+TAMANHO_MAXIMO_UPLOAD_MB = 50
+TIPOS_IMAGEM_PERMITIDOS = ["image/jpeg", "image/png", "image/webp"]
+# HEIC/HEIF só é aceito com o pillow-heif instalado (extra "heif"): sem ele a normalização não decodifica
+if importlib.util.find_spec("pillow_heif") is not None:
+    TIPOS_IMAGEM_PERMITIDOS += ["image/heic", "image/heif"]
+TIPOS_TERMO_PERMITIDOS = TIPOS_IMAGEM_PERMITIDOS + ["application/pdf"]
+
+async def gerar_url_upload(object_name, expira_segundos=MINIO_PRESIGNED_PUT_EXPIRA_SEGUNDOS):
+    """URL pré-assinada para o cliente enviar o objeto direto ao MinIO com um PUT."""
+    minio_bucket = os.getenv("MINIO_BUCKET")
+    client = get_minio_client()
+    return await executar(
+        client.presigned_put_object, minio_bucket, object_name, expires=timedelta(seconds=expira_segundos)
+    )
+
+async def gerar_urls_download(object_names, bucket_name=None):
+    """
+    URLs pré-assinadas de GET para vários objetos de uma vez.
+    A assinatura é calculada localmente (sem ida ao MinIO por URL, com MINIO_REGION definido);
+    cada URL fica em cache até MINIO_PRESIGNED_GET_MARGEM_SEGUNDOS antes de expirar.
+    """
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    urls = {}
+    faltando = []
+    for object_name in dict.fromkeys(object_names):
+        url = _urls_download.get_sync(f"{minio_bucket}/{object_name}")
+        if url is not None:
+            urls[object_name] = url.decode()
+        else:
+            faltando.append(object_name)
+
+    if faltando:
         client = get_minio_client()
-        
-        # Validação de tipo de arquivo
-        if allowed_types and file.content_type not in allowed_types:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Tipo de arquivo não permitido. Tipos aceitos: {', '.join(allowed_types)}"
+        expira = timedelta(seconds=MINIO_PRESIGNED_GET_EXPIRA_SEGUNDOS)
+
+        def assinar():
+            with medir("presigned_get_object"):
+                return {
+                    object_name: client.presigned_get_object(minio_bucket, object_name, expires=expira)
+                    for object_name in faltando
+                }
+
+        # Uma única passagem pelo pool para o lote inteiro
+        novas = await executar(assinar)
+        ttl = max(MINIO_PRESIGNED_GET_EXPIRA_SEGUNDOS - MINIO_PRESIGNED_GET_MARGEM_SEGUNDOS, 1)
+        for object_name, url in novas.items():
+            _urls_download.set_sync(f"{minio_bucket}/{object_name}", url.encode(), ttl)
+        urls.update(novas)
+
+    return urls
+
+async def stat_objeto(object_name, bucket_name=None):
+    """HEAD no objeto; retorna None quando ele não existe."""
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    client = get_minio_client()
+
+    def stat():
+        with medir("stat_object"):
+            try:
+                return client.stat_object(minio_bucket, object_name)
+            except S3Error as e:
+                if e.code in ("NoSuchKey", "NoSuchObject", "NotFound"):
+                    return None
+                raise
+
+    return await executar(stat)
+
+def nome_objeto_por_conteudo(folder_name, sha256, filename):
+    # Chave endereçada pelo conteúdo: o mesmo arquivo sempre cai no mesmo objeto
+    file_extension = os.path.splitext(filename or "")[1].lower()
+    return f"{folder_name}/{sha256[:2]}/{sha256}{file_extension}"
+
+class ArquivoMuitoGrandeError(Exception):
+    pass
+
+def calcular_sha256(fonte, max_bytes, chunk_size=1024 * 1024):
+    """Lê `fonte` em blocos (sem carregar o arquivo inteiro) e retorna (sha256, tamanho)."""
+    leitor = LeitorLimitado(fonte, max_bytes)
+    while leitor.read(chunk_size):
+        pass
+    return leitor.sha256, leitor.tamanho
+
+class LeitorLimitado:
+    """
+    Objeto file-like que repassa os blocos lidos de `fonte` ao SDK do MinIO,
+    contando os bytes (abortando ao passar de `max_bytes`) e calculando o SHA-256 no caminho.
+    """
+
+    def __init__(self, fonte, max_bytes):
+        self._fonte = fonte
+        self._hash = hashlib.sha256()
+        self.max_bytes = max_bytes
+        self.tamanho = 0
+
+    def read(self, size=-1):
+        chunk = self._fonte.read(size)
+        self.tamanho += len(chunk)
+        if self.tamanho > self.max_bytes:
+            raise ArquivoMuitoGrandeError()
+        self._hash.update(chunk)
+        return chunk
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+async def garantir_bucket(bucket_name=None):
+    # Verificado no startup; aqui só cai na rede se o startup não conseguiu verificar
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    if minio_bucket not in _buckets_verificados:
+        await executar(ensure_bucket, minio_bucket)
+
+async def enviar_stream(object_name, leitor, content_type="application/octet-stream", bucket_name=None):
+    """
+    Upload em streaming de um objeto file-like de tamanho desconhecido: o SDK lê uma parte por vez
+    (multipart quando passa de MINIO_PART_SIZE), então a memória fica limitada ao tamanho da parte.
+    Exceções do leitor (ex.: ArquivoMuitoGrandeError) abortam o multipart upload e são repassadas.
+    """
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    client = get_minio_client()
+
+    def put():
+        with medir("put_object"):
+            client.put_object(
+                bucket_name=minio_bucket,
+                object_name=object_name,
+                data=leitor,
+                length=-1,
+                part_size=MINIO_PART_SIZE,
+                content_type=content_type
             )
-        
-        # Lendo os dados do arquivo
-        file_data = await file.read()
-        file_size = len(file_data)
-        
-        # Validação de tamanho
-        max_size_bytes = max_size_mb * 1024 * 1024
-        if file_size > max_size_bytes:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Arquivo muito grande. Tamanho máximo: {max_size_mb}MB"
+
+    await executar(put)
+
+async def ler_intervalo(object_name, inicio, tamanho, chunk_size, bucket_name=None):
+    """
+    Gera os bytes [inicio, inicio + tamanho) do objeto em blocos de `chunk_size`, um GET com Range
+    só; cada bloco é lido no pool, então a memória por download é a de um bloco.
+    """
+    if tamanho <= 0:
+        return
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    client = get_minio_client()
+
+    def abrir():
+        with medir("get_object"):
+            return client.get_object(minio_bucket, object_name, offset=inicio, length=tamanho)
+
+    response = await executar(abrir)
+    try:
+        blocos = response.stream(chunk_size)
+        while True:
+            chunk = await executar(next, blocos, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        response.close()
+        response.release_conn()
+
+async def baixar_objeto(object_name, bucket_name=None):
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    client = get_minio_client()
+
+    def get():
+        with medir("get_object"):
+            response = client.get_object(minio_bucket, object_name)
+            try:
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
+
+    return await executar(get)
+
+async def enviar_bytes(object_name, dados, content_type="application/octet-stream", bucket_name=None, metadata=None):
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    client = get_minio_client()
+
+    def put():
+        with medir("put_object"):
+            client.put_object(
+                bucket_name=minio_bucket,
+                object_name=object_name,
+                data=io.BytesIO(dados),
+                length=len(dados),
+                content_type=content_type,
+                metadata=metadata
             )
-        
-        # Verifica se o bucket existe, caso contrário cria
-        if not client.bucket_exists(minio_bucket):
-            client.make_bucket(minio_bucket)
-            # Configurar políticas do bucket se necessário
-        
-        # Gera um nome único para o objeto usando UUID
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        unique_id = uuid.uuid4().hex[:8]
-        file_extension = os.path.splitext(file.filename)[1]
-        object_name = f"{folder_name}/{folder_name}_{timestamp}_{unique_id}{file_extension}"
-        
-        # Upload para o MinIO
-        client.put_object(
-            bucket_name=minio_bucket,
-            object_name=object_name,
-            data=io.BytesIO(file_data),
-            length=file_size,
-            content_type=file.content_type
+
+    await executar(put)
+    return object_name
+
+async def remover_objeto(object_name, bucket_name=None):
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    client = get_minio_client()
+
+    def remove():
+        with medir("remove_object"):
+            client.remove_object(minio_bucket, object_name)
+
+    await executar(remove)
+
+async def copiar_objeto(origem, destino, content_type=None, metadata=None, bucket_name=None):
+    """Cópia no próprio MinIO (server-side, os bytes não passam pela API)."""
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    client = get_minio_client()
+
+    def copy():
+        with medir("copy_object"):
+            if metadata:
+                # Substituir metadados exige repetir o Content-Type
+                client.copy_object(
+                    minio_bucket, destino, CopySource(minio_bucket, origem),
+                    metadata={"Content-Type": content_type or "application/octet-stream", **metadata},
+                    metadata_directive=REPLACE
+                )
+            else:
+                client.copy_object(minio_bucket, destino, CopySource(minio_bucket, origem))
+
+    await executar(copy)
+    return destino
+
+async def remover_prefixo(prefixo, bucket_name=None):
+    """Remove todos os objetos sob `prefixo` (em lotes de até 1000 por requisição). Retorna quantos removeu."""
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    client = get_minio_client()
+
+    def remove():
+        with medir("remove_objects"):
+            objetos = [DeleteObject(obj.object_name) for obj in client.list_objects(minio_bucket, prefix=prefixo, recursive=True)]
+            for erro in client.remove_objects(minio_bucket, objetos):
+                print(f"Erro ao remover {erro.name}: {erro.message}")
+            return len(objetos)
+
+    return await executar(remove)
+
+# Multipart upload controlado pela aplicação (uploads retomáveis): cada parte é enviada numa requisição
+# separada e o MinIO só monta o objeto na conclusão. Partes (exceto a última) têm no mínimo 5 MiB.
+class _MultipartSdk:
+    """
+    O SDK só expõe multipart dentro do put_object: as chamadas avulsas usam métodos privados do
+    cliente, isolados neste adaptador e conferidos contra a série fixada no pyproject.toml.
+    """
+
+    SERIE_SUPORTADA = "7.2."
+
+    def __init__(self, client: Minio):
+        if not minio.__version__.startswith(self.SERIE_SUPORTADA):
+            raise RuntimeError(
+                f"minio {minio.__version__} não suportado pelo upload retomável (esperado {self.SERIE_SUPORTADA}x)"
+            )
+        self._client = client
+
+    def criar(self, bucket_name, object_name, content_type) -> str:
+        return self._client._create_multipart_upload(bucket_name, object_name, {"Content-Type": content_type})
+
+    def enviar_parte(self, bucket_name, object_name, upload_id, numero, dados) -> str:
+        return self._client._upload_part(bucket_name, object_name, dados, None, upload_id, numero)
+
+    def concluir(self, bucket_name, object_name, upload_id, partes):
+        self._client._complete_multipart_upload(
+            bucket_name, object_name, upload_id, [Part(numero, etag) for numero, etag in partes]
         )
-        
-        # Reposiciona o ponteiro do arquivo para o início (caso precise usar novamente)
-        await file.seek(0)
-            
-        return {
-            "url": object_name
-        }
-    
-    except S3Error as e:
-        raise HTTPException(status_code=500, detail=f"Erro no MinIO: {str(e)}")
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao fazer upload: {str(e)}")
+
+    def abortar(self, bucket_name, object_name, upload_id):
+        self._client._abort_multipart_upload(bucket_name, object_name, upload_id)
+
+
+def _multipart() -> _MultipartSdk:
+    return _MultipartSdk(get_minio_client())
+
+async def iniciar_multipart(object_name, content_type, bucket_name=None):
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    multipart = _multipart()
+
+    def criar():
+        with medir("create_multipart_upload"):
+            return multipart.criar(minio_bucket, object_name, content_type)
+
+    return await executar(criar)
+
+async def enviar_parte(object_name, upload_id, numero, dados, bucket_name=None):
+    """Envia (ou reenvia: a parte de mesmo número é substituída) uma parte; retorna o ETag."""
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    multipart = _multipart()
+
+    def upload():
+        with medir("upload_part"):
+            return multipart.enviar_parte(minio_bucket, object_name, upload_id, numero, dados)
+
+    return await executar(upload)
+
+async def concluir_multipart(object_name, upload_id, partes, bucket_name=None):
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    multipart = _multipart()
+
+    def concluir():
+        with medir("complete_multipart_upload"):
+            multipart.concluir(minio_bucket, object_name, upload_id, partes)
+
+    await executar(concluir)
+
+async def abortar_multipart(object_name, upload_id, bucket_name=None):
+    minio_bucket = bucket_name or os.getenv("MINIO_BUCKET")
+    multipart = _multipart()
+
+    def abortar():
+        with medir("abort_multipart_upload"):
+            try:
+                multipart.abortar(minio_bucket, object_name, upload_id)
+            except S3Error as e:
+                if e.code != "NoSuchUpload":
+                    raise
+
+    await executar(abortar)
 
 def upload_file_to_minio(file_path, object_name, content_type="application/octet-stream"):
     """
@@ -97,17 +464,16 @@ def upload_file_to_minio(file_path, object_name, content_type="application/octet
         minio_bucket = os.getenv("MINIO_BUCKET")
         client = get_minio_client()
         
-        # Verifica se o bucket existe, caso contrário cria
-        if not client.bucket_exists(minio_bucket):
-            client.make_bucket(minio_bucket)
+        ensure_bucket(minio_bucket)
         
         # Upload do arquivo
-        client.fput_object(
-            bucket_name=minio_bucket,
-            object_name=object_name,
-            file_path=file_path,
-            content_type=content_type
-        )
+        with medir("fput_object"):
+            client.fput_object(
+                bucket_name=minio_bucket,
+                object_name=object_name,
+                file_path=file_path,
+                content_type=content_type
+            )
         
         return object_name
         
@@ -0,0 +1,283 @@
+import os
+import time
+import asyncio
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image
+from sqlalchemy.future import select
+
+from ..database import models
+from ..database.database import SessionLocal
+from ..core import metrics
+
+# Índice multi-hash: o hash de 64 bits é dividido em 4 blocos de 16 bits. Pelo princípio da casa
+# dos pombos, dois hashes a distância de Hamming <= 3 coincidem em pelo menos um bloco inteiro,
+# então basta comparar os hashes que caem no mesmo balde de algum bloco.
+PHASH_BLOCOS = 4
+PHASH_BITS_BLOCO = 64 // PHASH_BLOCOS
+PHASH_RAIO_MAX = PHASH_BLOCOS - 1
+PHASH_RAIO_PADRAO = int(os.getenv("PHASH_RAIO_PADRAO", 3))
+# Hashes novos ficam num buffer (consultado balde a balde) até o índice ser reconstruído
+PHASH_PENDENTES_MAX = int(os.getenv("PHASH_PENDENTES_MAX", 2000))
+# Recarga completa periódica: pega imagens cujo hash foi calculado depois (backfill, outros workers)
+PHASH_INDICE_TTL = int(os.getenv("PHASH_INDICE_TTL", 600))
+# Baldes maiores que isso (ex.: bloco zerado de fotos uniformes) são subdivididos pelos outros 48 bits
+# em 4 sub-blocos de 12: a comparação par a par dentro do balde deixa de ser O(m²)
+PHASH_BALDE_MAX = int(os.getenv("PHASH_BALDE_MAX", 256))
+
+_MASCARA_BLOCO = np.uint64((1 << PHASH_BITS_BLOCO) - 1)
+_SUB_BLOCOS = 4
+_BITS_SUB_BLOCO = (64 - PHASH_BITS_BLOCO) // _SUB_BLOCOS
+_MASCARA_SUB_BLOCO = np.uint64((1 << _BITS_SUB_BLOCO) - 1)
+
+
+def calcular_dhash(imagem: Image.Image) -> int:
+    """
+    dHash de 64 bits: compara o brilho de pixels vizinhos numa miniatura 9x8 em tons de cinza.
+    Retornado como inteiro com sinal (cabe numa coluna BigInteger).
+    """
+    cinza = np.asarray(imagem.convert("L").resize((9, 8), Image.Resampling.BOX), dtype=np.int16)
+    bits = (cinza[:, 1:] > cinza[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0].astype(np.int64))
+
+
+def _pares_em_baldes(chaves: np.ndarray, ordem: np.ndarray, hashes: np.ndarray, raio: int,
+                     ativos: np.ndarray) -> List[np.ndarray]:
+    """
+    Pares (a, b, distância) a até `raio` bits entre elementos do mesmo balde. `chaves` está ordenado
+    e `ordem` leva cada posição ao elemento; `ativos` são as posições iniciais (vizinho seguinte no
+    mesmo balde). Avança o deslocamento d enquanto ainda houver baldes com mais de d elementos.
+    """
+    pares = []
+    d = 1
+    while ativos.size:
+        a, b = ordem[ativos], ordem[ativos + d]
+        distancias = np.bitwise_count(hashes[a] ^ hashes[b]).astype(np.int64)
+        proximos = distancias <= raio
+        pares.append(np.stack([a[proximos], b[proximos], distancias[proximos]], axis=1))
+        d += 1
+        ativos = ativos[ativos + d < chaves.size]
+        ativos = ativos[chaves[ativos] == chaves[ativos + d]]
+    return pares
+
+
+def _pares_balde_pesado(membros: np.ndarray, bloco: int, hashes: np.ndarray, raio: int) -> List[np.ndarray]:
+    # Todos do balde coincidem no bloco `bloco`; a distância <= 3 está nos outros 48 bits, então pelo
+    # mesmo princípio dois vizinhos coincidem em algum dos 4 sub-blocos de 12 bits desses 48
+    h = hashes[membros]
+    deslocamento = np.uint64(bloco * PHASH_BITS_BLOCO)
+    abaixo = h & ((np.uint64(1) << deslocamento) - np.uint64(1))
+    resto = abaixo | ((h >> (deslocamento + np.uint64(PHASH_BITS_BLOCO))) << deslocamento)
+    pares = []
+    for j in range(_SUB_BLOCOS):
+        chaves = (resto >> np.uint64(j * _BITS_SUB_BLOCO)) & _MASCARA_SUB_BLOCO
+        ordem = np.argsort(chaves, kind="stable")
+        chaves = chaves[ordem]
+        ativos = np.flatnonzero(chaves[:-1] == chaves[1:])
+        pares += _pares_em_baldes(chaves, membros[ordem], hashes, raio, ativos)
+    return pares
+
+
+def _componentes(pares: np.ndarray) -> List[np.ndarray]:
+    """Componentes conexos do grafo de pares (posições), por propagação de rótulos com pointer jumping."""
+    if pares.size == 0:
+        return []
+    nos, arestas = np.unique(pares, return_inverse=True)
+    arestas = arestas.reshape(-1, 2)
+    rotulos = np.arange(nos.size)
+    while True:
+        menor = np.minimum(rotulos[arestas[:, 0]], rotulos[arestas[:, 1]])
+        novos = rotulos.copy()
+        np.minimum.at(novos, arestas[:, 0], menor)
+        np.minimum.at(novos, arestas[:, 1], menor)
+        novos = novos[novos]
+        if np.array_equal(novos, rotulos):
+            break
+        rotulos = novos
+    ordem = np.argsort(rotulos, kind="stable")
+    cortes = np.flatnonzero(np.diff(rotulos[ordem])) + 1
+    return [nos[grupo] for grupo in np.split(ordem, cortes)]
+
+
+class IndiceHashPerceptual:
+    """
+    Índice em memória dos dHash das imagens de lesão para consultas por raio de Hamming.
+    Por bloco guarda os valores ordenados e a permutação correspondente: os baldes são
+    fatias contíguas, e a busca de pares é vetorizada sobre o índice inteiro. Os pares do índice
+    são calculados na reconstrução; a consulta filtra pelo raio e junta os do buffer pendente.
+    """
+
+    def __init__(self):
+        self._geracao = 0
+        self._cache_clusters = {}
+        self._limpar()
+        self._carregado_em = 0.0
+        self._lock = asyncio.Lock()
+        self.latencia = metrics.LatencyStats()
+
+    def _limpar(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.atendimentos = np.empty(0, dtype=np.int64)
+        self._blocos = []
+        self._unicos = np.empty(0, dtype=np.uint64)
+        self._representantes = np.empty(0, dtype=np.int64)
+        self._pares_base = np.empty((0, 2), dtype=np.int64)
+        self._distancias_base = np.empty(0, dtype=np.int64)
+        self._indexados = 0
+        self._ultimo_id = 0
+        self._geracao += 1
+
+    def _reconstruir(self):
+        """
+        Indexa os hashes distintos (cópias idênticas ligadas à primeira ocorrência) e já calcula os pares
+        até PHASH_RAIO_MAX, com a distância: consultas de clusters só filtram pelo raio.
+        """
+        n = self.hashes.size
+        unicos, primeira, inverso = np.unique(self.hashes, return_index=True, return_inverse=True)
+        blocos = []
+        for k in range(PHASH_BLOCOS):
+            chaves = (unicos >> np.uint64(k * PHASH_BITS_BLOCO)) & _MASCARA_BLOCO
+            ordem = np.argsort(chaves, kind="stable")
+            blocos.append((chaves[ordem], ordem))
+
+        pares = []
+        for k, (chaves, ordem) in enumerate(blocos):
+            cortes = np.flatnonzero(chaves[1:] != chaves[:-1]) + 1
+            inicios = np.concatenate([[0], cortes])
+            tamanhos = np.diff(np.concatenate([inicios, [chaves.size]]))
+            pesado = tamanhos > PHASH_BALDE_MAX
+            leve = np.repeat(~pesado, tamanhos)
+            ativos = np.flatnonzero((chaves[:-1] == chaves[1:]) & leve[:-1])
+            pares += _pares_em_baldes(chaves, ordem, unicos, PHASH_RAIO_MAX, ativos)
+            for inicio, tamanho in zip(inicios[pesado], tamanhos[pesado]):
+                pares += _pares_balde_pesado(ordem[inicio:inicio + tamanho], k, unicos, PHASH_RAIO_MAX)
+        pares = [p for p in pares if p.size]
+        pares = np.concatenate(pares) if pares else np.empty((0, 3), dtype=np.int64)
+        # O mesmo par aparece em mais de um bloco: fica uma vez, com o menor índice primeiro
+        pares[:, :2] = np.sort(pares[:, :2], axis=1)
+        pares = np.unique(pares, axis=0)
+
+        copias = np.flatnonzero(primeira[inverso] != np.arange(n))
+        self._pares_base = np.concatenate([
+            primeira[pares[:, :2]].reshape(-1, 2),
+            np.stack([copias, primeira[inverso[copias]]], axis=1),
+        ])
+        self._distancias_base = np.concatenate([pares[:, 2], np.zeros(copias.size, dtype=np.int64)])
+        self._unicos = unicos
+        self._representantes = primeira
+        self._blocos = blocos
+        self._indexados = n
+
+    def _adicionar(self, rows):
+        ids, hashes, atendimentos = zip(*rows)
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self.hashes = np.concatenate([self.hashes, np.asarray(hashes, dtype=np.int64).view(np.uint64)])
+        self.atendimentos = np.concatenate([self.atendimentos, np.asarray(atendimentos, dtype=np.int64)])
+        self._ultimo_id = max(self._ultimo_id, ids[-1])
+        self._geracao += 1
+
+    async def _buscar(self, apos_id: int):
+        async with SessionLocal() as db:
+            stmt = (
+                select(
+                    models.RegistroLesoesImagens.id,
+                    models.RegistroLesoesImagens.phash,
+                    models.RegistroLesoes.atendimento_id,
+                )
+                .join(models.RegistroLesoes, models.RegistroLesoes.id == models.RegistroLesoesImagens.registro_lesoes_id)
+                .filter(
+                    models.RegistroLesoesImagens.phash.is_not(None),
+                    models.RegistroLesoesImagens.id > apos_id
+                )
+                .order_by(models.RegistroLesoesImagens.id)
+            )
+            return (await db.execute(stmt)).all()
+
+    async def _atualizar(self):
+        """Recarrega tudo quando o TTL venceu; senão só traz as imagens com id acima do último visto."""
+        if time.monotonic() - self._carregado_em > PHASH_INDICE_TTL:
+            rows = await self._buscar(0)
+            self._limpar()
+            if rows:
+                self._adicionar(rows)
+            await asyncio.to_thread(self._reconstruir)
+            self._carregado_em = time.monotonic()
+            return
+
+        rows = await self._buscar(self._ultimo_id)
+        if rows:
+            self._adicionar(rows)
+            if self.hashes.size - self._indexados > PHASH_PENDENTES_MAX:
+                await asyncio.to_thread(self._reconstruir)
+
+    def _pares_pendentes(self, raio: int) -> List[np.ndarray]:
+        # Buffer ainda não indexado: contra o índice, pelos baldes de cada bloco (busca binária);
+        # entre si, todos contra todos (o buffer é pequeno)
+        pendentes = np.arange(self._indexados, self.hashes.size)
+        if not pendentes.size:
+            return []
+        pares = self._pares_subconjunto(pendentes, raio)
+        for k, (chaves, ordem) in enumerate(self._blocos):
+            alvo = (self.hashes[pendentes] >> np.uint64(k * PHASH_BITS_BLOCO)) & _MASCARA_BLOCO
+            inicios = np.searchsorted(chaves, alvo, side="left")
+            fins = np.searchsorted(chaves, alvo, side="right")
+            for posicao, inicio, fim in zip(pendentes, inicios, fins):
+                if inicio == fim:
+                    continue
+                # Candidatos são hashes distintos; cópias idênticas já estão ligadas ao representante
+                candidatos = ordem[inicio:fim]
+                vizinhos = self._representantes[candidatos[np.bitwise_count(self._unicos[candidatos] ^ self.hashes[posicao]) <= raio]]
+                pares.append(np.stack([vizinhos, np.full(vizinhos.size, posicao)], axis=1))
+        return pares
+
+    def _pares_subconjunto(self, posicoes: np.ndarray, raio: int) -> List[np.ndarray]:
+        # Poucos hashes (um atendimento, o buffer): comparação de todos contra todos
+        hashes = self.hashes[posicoes]
+        dist = np.bitwise_count(hashes[:, None] ^ hashes[None, :])
+        a, b = np.nonzero(np.triu(dist <= raio, k=1))
+        return [np.stack([posicoes[a], posicoes[b]], axis=1)]
+
+    def _clusters(self, raio: int, atendimento_id: Optional[int]) -> List[np.ndarray]:
+        if atendimento_id is not None:
+            pares = self._pares_subconjunto(np.flatnonzero(self.atendimentos == atendimento_id), raio)
+        else:
+            # Dataset inteiro: reaproveitado até o índice mudar (hashes novos ou recarga)
+            em_cache = self._cache_clusters.get(raio)
+            if em_cache is not None and em_cache[0] == self._geracao:
+                return em_cache[1]
+            pares = [self._pares_base[self._distancias_base <= raio]] + self._pares_pendentes(raio)
+        pares = [p for p in pares if p.size]
+        grupos = _componentes(np.concatenate(pares) if pares else np.empty((0, 2), dtype=np.int64))
+        grupos = sorted(grupos, key=len, reverse=True)
+        if atendimento_id is None:
+            self._cache_clusters[raio] = (self._geracao, grupos)
+        return grupos
+
+    async def clusters(self, raio: int, atendimento_id: Optional[int] = None) -> List[dict]:
+        """Grupos de quase-duplicatas (ids das imagens e dos atendimentos), do maior para o menor."""
+        if raio > PHASH_RAIO_MAX:
+            raise ValueError(f"raio máximo suportado pelo índice: {PHASH_RAIO_MAX}")
+        async with self._lock:
+            await self._atualizar()
+            with self.latencia.time():
+                grupos = await asyncio.to_thread(self._clusters, raio, atendimento_id)
+            return [
+                {
+                    "imagem_ids": self.ids[grupo].tolist(),
+                    "atendimento_ids": np.unique(self.atendimentos[grupo]).tolist(),
+                }
+                for grupo in grupos
+            ]
+
+    def stats(self) -> dict:
+        return {
+            "imagens": int(self.hashes.size),
+            "pendentes": int(self.hashes.size - self._indexados),
+            "consulta": self.latencia.snapshot(),
+        }
+
+
+indice_phash = IndiceHashPerceptual()
+metrics.register("phash", indice_phash.stats)
@@ -0,0 +1,143 @@
+import os
+import io
+import math
+import asyncio
+from typing import Optional
+
+from PIL import Image
+from sqlalchemy import update
+
+from ..database import models
+from ..database.database import SessionLocal
+from ..core import metrics
+from .cache import LRUBackend
+from .imagens import executar_no_pool
+from .storage import storage
+from .single_flight import get_group
+
+# Pirâmide de tiles no formato Deep Zoom (DZI): nível N = imagem inteira, cada nível abaixo
+# tem metade da resolução, até 1x1 px no nível 0. Gerada no primeiro acesso e guardada no armazenamento
+# ao lado do original: <base>_files/<nivel>/<coluna>_<linha>.jpg
+PIRAMIDE_TILE = int(os.getenv("PIRAMIDE_TILE", 256))
+PIRAMIDE_OVERLAP = int(os.getenv("PIRAMIDE_OVERLAP", 1))
+PIRAMIDE_QUALIDADE = int(os.getenv("PIRAMIDE_QUALIDADE", 85))
+PIRAMIDE_UPLOAD_CONCORRENCIA = int(os.getenv("PIRAMIDE_UPLOAD_CONCORRENCIA", 16))
+PIRAMIDE_CACHE_BYTES = int(os.getenv("PIRAMIDE_CACHE_BYTES", 128 * 1024 * 1024))
+
+# Tiles mais acessados ficam em memória (o conteúdo de um tile nunca muda)
+_tiles = LRUBackend(max_entries=100_000, max_bytes=PIRAMIDE_CACHE_BYTES)
+latencia_geracao = metrics.LatencyStats()
+metrics.register("piramide", lambda: {"geracao": latencia_geracao.snapshot(), "cache_tiles": _tiles.stats()})
+
+_geracoes = get_group("piramide")
+
+
+def gerar_piramide(dados: bytes) -> dict:
+    """Executado no pool de processos. Gera todos os tiles de todos os níveis a partir do original."""
+    with Image.open(io.BytesIO(dados)) as original:
+        imagem = original.convert("RGB")
+    largura, altura = imagem.size
+    nivel_max = max(math.ceil(math.log2(max(largura, altura))), 0)
+
+    tiles = {}
+    atual = imagem
+    for nivel in range(nivel_max, -1, -1):
+        w, h = atual.size
+        for coluna in range(math.ceil(w / PIRAMIDE_TILE)):
+            for linha in range(math.ceil(h / PIRAMIDE_TILE)):
+                # Sobreposição de PIRAMIDE_OVERLAP px com os vizinhos evita costuras no visualizador
+                x0 = max(coluna * PIRAMIDE_TILE - PIRAMIDE_OVERLAP, 0)
+                y0 = max(linha * PIRAMIDE_TILE - PIRAMIDE_OVERLAP, 0)
+                x1 = min((coluna + 1) * PIRAMIDE_TILE + PIRAMIDE_OVERLAP, w)
+                y1 = min((linha + 1) * PIRAMIDE_TILE + PIRAMIDE_OVERLAP, h)
+                buffer = io.BytesIO()
+                atual.crop((x0, y0, x1, y1)).save(buffer, format="JPEG", quality=PIRAMIDE_QUALIDADE)
+                tiles[chave_tile(nivel, coluna, linha)] = buffer.getvalue()
+        if nivel > 0:
+            # ceil(ceil(w/2)/2) == ceil(w/4): as dimensões batem com as do formato DZI
+            atual = atual.resize((math.ceil(w / 2), math.ceil(h / 2)), Image.Resampling.LANCZOS)
+
+    return {"largura": largura, "altura": altura, "nivel_max": nivel_max, "tiles": tiles}
+
+
+def chave_tile(nivel: int, coluna: int, linha: int) -> str:
+    return f"{nivel}/{coluna}_{linha}"
+
+
+def caminho_tile(arquivo_path: str, nivel: int, coluna: int, linha: int) -> str:
+    base, _ = os.path.splitext(arquivo_path)
+    return f"{base}_files/{chave_tile(nivel, coluna, linha)}.jpg"
+
+
+def tile_valido(largura: int, altura: int, nivel_max: int, nivel: int, coluna: int, linha: int) -> bool:
+    if not 0 <= nivel <= nivel_max or coluna < 0 or linha < 0:
+        return False
+    escala = 2 ** (nivel_max - nivel)
+    w, h = math.ceil(largura / escala), math.ceil(altura / escala)
+    return coluna < math.ceil(w / PIRAMIDE_TILE) and linha < math.ceil(h / PIRAMIDE_TILE)
+
+
+def descritor_dzi(largura: int, altura: int) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="jpg" '
+        f'Overlap="{PIRAMIDE_OVERLAP}" TileSize="{PIRAMIDE_TILE}">'
+        f'<Size Width="{largura}" Height="{altura}"/></Image>'
+    )
+
+
+async def _gerar(arquivo_path: str) -> dict:
+    with latencia_geracao.time():
+        dados = await storage.baixar(arquivo_path)
+        piramide = await executar_no_pool(gerar_piramide, dados)
+
+        limite = asyncio.Semaphore(PIRAMIDE_UPLOAD_CONCORRENCIA)
+
+        async def enviar(chave, tile):
+            nivel, posicao = chave.split("/")
+            coluna, linha = posicao.split("_")
+            object_name = caminho_tile(arquivo_path, int(nivel), int(coluna), int(linha))
+            async with limite:
+                await storage.enviar(object_name, tile, "image/jpeg")
+            _tiles.set_sync(object_name, tile)
+
+        await asyncio.gather(*(enviar(chave, tile) for chave, tile in piramide["tiles"].items()))
+
+    # Só marca depois que todos os tiles estão no armazenamento; vale para todas as linhas do mesmo objeto
+    async with SessionLocal() as db:
+        await db.execute(
+            update(models.RegistroLesoesImagens)
+            .where(models.RegistroLesoesImagens.arquivo_path == arquivo_path)
+            .values(piramide_nivel_max=piramide["nivel_max"], largura=piramide["largura"], altura=piramide["altura"])
+        )
+        await db.commit()
+    return piramide
+
+
+async def garantir_piramide(imagem: models.RegistroLesoesImagens) -> Optional[dict]:
+    """
+    Gera a pirâmide se ainda não existe. Os tiles de uma imagem são pedidos em rajada pelo
+    visualizador: o single-flight faz todas essas requisições aguardarem uma única geração.
+    Retorna a pirâmide recém-gerada (com os tiles em memória) ou None se ela já existia.
+    """
+    if imagem.piramide_nivel_max is not None:
+        return None
+    piramide = await _geracoes.do(imagem.arquivo_path, lambda: _gerar(imagem.arquivo_path))
+    imagem.piramide_nivel_max = piramide["nivel_max"]
+    imagem.largura, imagem.altura = piramide["largura"], piramide["altura"]
+    return piramide
+
+
+async def obter_tile(imagem: models.RegistroLesoesImagens, nivel: int, coluna: int, linha: int) -> Optional[bytes]:
+    piramide = await garantir_piramide(imagem)
+    if piramide is not None:
+        return piramide["tiles"].get(chave_tile(nivel, coluna, linha))
+
+    if not tile_valido(imagem.largura, imagem.altura, imagem.piramide_nivel_max, nivel, coluna, linha):
+        return None
+    object_name = caminho_tile(imagem.arquivo_path, nivel, coluna, linha)
+    tile = _tiles.get_sync(object_name)
+    if tile is None:
+        tile = await storage.baixar(object_name)
+        _tiles.set_sync(object_name, tile)
+    return tile
@@ -0,0 +1,68 @@
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+# Métricas calculadas sobre uma cópia em tons de cinza com o maior lado em QUALIDADE_TAMANHO_ANALISE:
+# mantém o custo baixo e torna a nitidez comparável entre fotos de resoluções diferentes
+QUALIDADE_TAMANHO_ANALISE = int(os.getenv("QUALIDADE_TAMANHO_ANALISE", 512))
+QUALIDADE_NITIDEZ_MIN = float(os.getenv("QUALIDADE_NITIDEZ_MIN", 100))
+QUALIDADE_CLIPPING_MAX = float(os.getenv("QUALIDADE_CLIPPING_MAX", 0.05))
+QUALIDADE_RESOLUCAO_MIN = int(os.getenv("QUALIDADE_RESOLUCAO_MIN", 800))
+# Orçamento de tempo por imagem; o excedente é contado nas métricas
+QUALIDADE_ALVO_MS = float(os.getenv("QUALIDADE_ALVO_MS", 15))
+
+# Pixels de cinza nestes extremos contam como estourados (sombra sem detalhe / luz estourada)
+LIMIAR_SUBEXPOSICAO = 5
+LIMIAR_SOBREEXPOSICAO = 250
+
+
+def _variancia_laplaciano(cinza: np.ndarray) -> float:
+    # Laplaciano de 4 vizinhos por fatiamento (sem convolução): bordas nítidas geram variância alta
+    laplaciano = (
+        cinza[:-2, 1:-1] + cinza[2:, 1:-1] + cinza[1:-1, :-2] + cinza[1:-1, 2:]
+        - 4 * cinza[1:-1, 1:-1]
+    )
+    return float(laplaciano.var())
+
+
+def avaliar_qualidade(imagem: Image.Image) -> dict:
+    """
+    Executado no pool de processos, na mesma passada da normalização.
+    Retorna nitidez (variância do Laplaciano), fração de pixels estourados em cada extremo,
+    brilho médio, e os alertas para os critérios não atendidos.
+    """
+    inicio = time.perf_counter()
+
+    reduzida = imagem.convert("L")
+    fator = max(reduzida.width, reduzida.height) // QUALIDADE_TAMANHO_ANALISE
+    if fator > 1:
+        reduzida = reduzida.reduce(fator)
+    cinza = np.asarray(reduzida, dtype=np.float32)
+
+    histograma = np.bincount(cinza.astype(np.uint8).ravel(), minlength=256)
+    total = cinza.size
+    subexposicao = float(histograma[:LIMIAR_SUBEXPOSICAO + 1].sum() / total)
+    sobreexposicao = float(histograma[LIMIAR_SOBREEXPOSICAO:].sum() / total)
+    nitidez = _variancia_laplaciano(cinza)
+
+    alertas = []
+    if nitidez < QUALIDADE_NITIDEZ_MIN:
+        alertas.append("Imagem desfocada")
+    if sobreexposicao > QUALIDADE_CLIPPING_MAX:
+        alertas.append("Imagem superexposta")
+    if subexposicao > QUALIDADE_CLIPPING_MAX:
+        alertas.append("Imagem subexposta")
+    if min(imagem.width, imagem.height) < QUALIDADE_RESOLUCAO_MIN:
+        alertas.append("Resolução baixa")
+
+    return {
+        "nitidez": round(nitidez, 2),
+        "subexposicao": round(subexposicao, 4),
+        "sobreexposicao": round(sobreexposicao, 4),
+        "brilho_medio": round(float(cinza.mean()), 2),
+        "aprovada": not alertas,
+        "alertas": alertas,
+        "tempo_ms": round((time.perf_counter() - inicio) * 1000, 3),
+    }
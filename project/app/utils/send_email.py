@@ -1,21 +1,257 @@
-from fastapi import BackgroundTasks
-from smtplib import SMTP
 import os
+import time
+import queue
+import smtplib
+import threading
+from concurrent.futures import Future
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from ..core import metrics
 
 
 smtp_server = os.getenv("SMTP_SERVER")
 smtp_port = int(os.getenv("SMTP_PORT", 587))
 smtp_username = os.getenv("SMTP_USERNAME")
 smtp_password = os.getenv("SMTP_PASSWORD")
+smtp_starttls = os.getenv("SMTP_STARTTLS", "True") == "True"
+
+# Conexões SMTP autenticadas mantidas abertas (uma por thread de envio)
+SMTP_CONEXOES = int(os.getenv("SMTP_CONEXOES", 2))
+# Quantas mensagens da fila uma thread envia de uma vez pela mesma conexão
+SMTP_LOTE = int(os.getenv("SMTP_LOTE", 50))
+# Conexão ociosa por mais que isso é fechada (servidores derrubam conexões paradas de qualquer forma)
+SMTP_OCIOSO_SEGUNDOS = float(os.getenv("SMTP_OCIOSO_SEGUNDOS", 30))
+# Limite de mensagens por conexão imposto por muitos provedores; depois disso a conexão é renovada
+SMTP_MENSAGENS_POR_CONEXAO = int(os.getenv("SMTP_MENSAGENS_POR_CONEXAO", 100))
+SMTP_TENTATIVAS = int(os.getenv("SMTP_TENTATIVAS", 3))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 30))
 
 backend_url = os.getenv("BACKEND_URL")
 
-def send_invite_email(email: str, invite_token: str):
+
+class _ConexaoSmtp:
+    """Conexão de uma thread de envio: aberta sob demanda e renovada depois de uma falha ou de N mensagens."""
+
+    def __init__(self, despachante):
+        self._despachante = despachante
+        self.smtp = None
+        self.enviadas = 0
+
+    def enviar(self, remetente, destinatario, mensagem):
+        if self.smtp is None or self.enviadas >= self._despachante.mensagens_por_conexao:
+            self.fechar()
+            self.smtp = self._despachante._conectar()
+            self.enviadas = 0
+        self.smtp.sendmail(remetente, destinatario, mensagem)
+        self.enviadas += 1
+
+    def rset(self):
+        # Depois de uma resposta de erro a conexão pode ter ficado no meio de uma transação
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.rset()
+        except Exception:
+            self.descartar()
+
+    def descartar(self):
+        """Conexão quebrada: fecha o socket sem QUIT."""
+        if self.smtp is not None:
+            self.smtp.close()
+            self.smtp = None
+
+    def fechar(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                self.smtp.close()
+            self.smtp = None
+
+
+class DespachanteEmail:
+    """
+    Fila de e-mails atendida por um pequeno pool de threads, cada uma com sua conexão SMTP
+    (STARTTLS + login feitos uma vez e reaproveitados). O chamador só enfileira: nada de rede
+    no event loop nem no handler da requisição.
+    """
+
+    def __init__(self, servidor, porta, usuario=None, senha=None, starttls=True,
+                 conexoes=SMTP_CONEXOES, lote=SMTP_LOTE, ocioso_segundos=SMTP_OCIOSO_SEGUNDOS,
+                 mensagens_por_conexao=SMTP_MENSAGENS_POR_CONEXAO, tentativas=SMTP_TENTATIVAS):
+        self.servidor = servidor
+        self.porta = porta
+        self.usuario = usuario
+        self.senha = senha
+        self.starttls = starttls
+        self.conexoes = conexoes
+        self.lote = lote
+        self.ocioso_segundos = ocioso_segundos
+        self.mensagens_por_conexao = mensagens_por_conexao
+        self.tentativas = tentativas
+
+        self._fila = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+        self.enviados = metrics.Counter()
+        self.falhas = metrics.Counter()
+        self.conexoes_abertas = metrics.Counter()
+        self.reconexoes = metrics.Counter()
+        self.latencia_lote = metrics.LatencyStats()
+
+    def stats(self) -> dict:
+        return {
+            "fila": self._fila.qsize(),
+            "enviados": self.enviados.value,
+            "falhas": self.falhas.value,
+            "conexoes_abertas": self.conexoes_abertas.value,
+            "reconexoes": self.reconexoes.value,
+            "lote": self.latencia_lote.snapshot(),
+        }
+
+    def enviar(self, remetente, destinatario, mensagem: str) -> Future:
+        """Enfileira a mensagem já montada; o Future é resolvido quando ela é aceita pelo servidor."""
+        futuro = Future()
+        self._iniciar()
+        self._fila.put((remetente, destinatario, mensagem, futuro))
+        return futuro
+
+    def _iniciar(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.conexoes):
+                thread = threading.Thread(target=self._trabalhar, name=f"smtp-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def encerrar(self, timeout=30):
+        """Envia o que ainda está na fila e fecha as conexões."""
+        for _ in self._threads:
+            self._fila.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _conectar(self):
+        smtp = smtplib.SMTP(self.servidor, self.porta, timeout=SMTP_TIMEOUT)
+        try:
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.usuario:
+                smtp.login(self.usuario, self.senha)
+        except BaseException:
+            smtp.close()
+            raise
+        self.conexoes_abertas.inc()
+        return smtp
+
+    def _proximo_lote(self):
+        """Bloqueia até a primeira mensagem (ou ociosidade) e junta as que já estão na fila."""
+        try:
+            primeiro = self._fila.get(timeout=self.ocioso_segundos)
+        except queue.Empty:
+            return None
+        lote = [primeiro]
+        while primeiro is not None and len(lote) < self.lote:
+            try:
+                item = self._fila.get_nowait()
+            except queue.Empty:
+                break
+            lote.append(item)
+            if item is None:
+                break
+        return lote
+
+    @staticmethod
+    def _transitorio(erro) -> bool:
+        # Códigos 4xx (ex.: 421 serviço indisponível, 451 erro local) valem nova tentativa
+        return isinstance(erro, smtplib.SMTPResponseException) and 400 <= erro.smtp_code < 500
+
+    def _enviar_lote(self, conexao: _ConexaoSmtp, mensagens):
+        for remetente, destinatario, mensagem, futuro in mensagens:
+            # Cancelado enquanto esperava na fila (ex.: timeout do outbox, que vai reenviar): não envia
+            if not futuro.set_running_or_notify_cancel():
+                continue
+            for tentativa in range(1, self.tentativas + 1):
+                try:
+                    conexao.enviar(remetente, destinatario, mensagem)
+                except smtplib.SMTPServerDisconnected as e:
+                    erro = e
+                except smtplib.SMTPException as e:
+                    if not self._transitorio(e):
+                        # Recusa definitiva (destinatário inválido, autenticação, 5xx): reenviar não adianta
+                        print(f"Erro ao enviar e-mail para {destinatario}: {str(e)}")
+                        self.falhas.inc()
+                        futuro.set_exception(e)
+                        conexao.rset()
+                        break
+                    erro = e
+                except OSError as e:
+                    erro = e
+                else:
+                    self.enviados.inc()
+                    futuro.set_result(True)
+                    break
+
+                # Falha de conexão ou temporária: reenvia numa conexão nova, com espera crescente
+                conexao.descartar()
+                self.reconexoes.inc()
+                if tentativa == self.tentativas:
+                    print(f"Erro ao enviar e-mail para {destinatario}: {str(erro)}")
+                    self.falhas.inc()
+                    futuro.set_exception(erro)
+                else:
+                    time.sleep(0.5 * 2 ** (tentativa - 1))
+
+    def _trabalhar(self):
+        conexao = _ConexaoSmtp(self)
+        while True:
+            lote = self._proximo_lote()
+            if lote is None:
+                # Ociosa: libera a conexão; a próxima mensagem abre outra
+                conexao.fechar()
+                continue
+
+            mensagens = [item for item in lote if item is not None]
+            if mensagens:
+                with self.latencia_lote.time():
+                    self._enviar_lote(conexao, mensagens)
+            if lote[-1] is None:
+                conexao.fechar()
+                return
+
+
+despachante_email = DespachanteEmail(
+    smtp_server, smtp_port, smtp_username, smtp_password, starttls=smtp_starttls
+)
+metrics.register("email", despachante_email.stats)
+
+
+def montar_mensagem(remetente, to_email, subject, body, html=False) -> str:
+    msg = MIMEMultipart()
+    msg["From"] = remetente
+    msg["To"] = to_email
+    msg["Subject"] = subject
+
+    # Definir o tipo de conteúdo como HTML ou texto simples
+    if html:
+        msg.attach(MIMEText(body, "html"))
+    else:
+        msg.attach(MIMEText(body, "plain"))
+    return msg.as_string()
+
+
+def email_convite(invite_token: str):
+    """Assunto e corpo (HTML) do convite para completar o cadastro."""
     subject = "Convite para completar seu cadastro"
     invite_link = f"{backend_url}/redirect?token={invite_token}&source=register"
-    
+
     body = f"""
     <html>
     <head></head>
@@ -32,12 +268,13 @@ def send_invite_email(email: str, invite_token: str):
     """
 
     print("LINK TOKEN", invite_link)
-    send_email(email, subject, body, html=True)
+    return subject, body
 
-def send_reset_password_email(email: str, invite_token: str):
+def email_redefinicao_senha(invite_token: str):
+    """Assunto e corpo (HTML) do e-mail de redefinição de senha."""
     subject = "Redefinição de Senha"
     reset_link = f"{backend_url}/redirect?token={invite_token}&source=reset-password"
-    
+
     body = f"""
     <html>
     <body>
@@ -51,22 +288,10 @@ def send_reset_password_email(email: str, invite_token: str):
     """
 
     print("LINK TOKEN", reset_link)
-    send_email(email, subject, body, html=True)
-
+    return subject, body
 
-def send_email(to_email, subject, body, html=False):
-    msg = MIMEMultipart()
-    msg["From"] = smtp_username
-    msg["To"] = to_email
-    msg["Subject"] = subject
-
-    # Definir o tipo de conteúdo como HTML ou texto simples
-    if html:
-        msg.attach(MIMEText(body, "html"))
-    else:
-        msg.attach(MIMEText(body, "plain"))
 
-    with SMTP(smtp_server, smtp_port) as smtp:
-        smtp.starttls()
-        smtp.login(smtp_username, smtp_password)
-        smtp.sendmail(smtp_username, to_email, msg.as_string())
+def send_email(to_email, subject, body, html=False) -> Future:
+    """Enfileira o e-mail no despachante (retorna imediatamente)."""
+    mensagem = montar_mensagem(smtp_username, to_email, subject, body, html)
+    return despachante_email.enviar(smtp_username, to_email, mensagem)
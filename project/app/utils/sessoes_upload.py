@@ -0,0 +1,73 @@
+import os
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy.future import select
+
+from ..database import models
+from ..database.database import SessionLocal
+from .storage import storage
+
+# Tamanho de cada bloco de um upload retomável: é o máximo reenviado após uma queda de conexão.
+# Vira uma parte do multipart upload, então não pode ser menor que o mínimo do S3 (5 MiB).
+UPLOAD_CHUNK_BYTES = max(int(os.getenv("UPLOAD_CHUNK_BYTES", 5 * 1024 * 1024)), 5 * 1024 * 1024)
+# Sessões sem atividade há mais que isso são abandonadas: as partes enviadas são descartadas
+UPLOAD_SESSAO_TTL_HORAS = int(os.getenv("UPLOAD_SESSAO_TTL_HORAS", 24))
+
+
+def expira_em(sessao: models.SessaoUpload) -> datetime:
+    return sessao.atualizado_em + timedelta(hours=UPLOAD_SESSAO_TTL_HORAS)
+
+
+def sessao_out(sessao: models.SessaoUpload) -> dict:
+    return {
+        "sessao_id": sessao.id,
+        "tamanho": sessao.tamanho,
+        "tamanho_chunk": sessao.tamanho_chunk,
+        "offset": sessao.bytes_recebidos,
+        "concluida": sessao.resultado is not None,
+        "expira_em": expira_em(sessao),
+    }
+
+
+async def remover_sessoes_abandonadas(lote: int = 500) -> dict:
+    """
+    Aborta os multipart uploads de sessões paradas há mais de UPLOAD_SESSAO_TTL_HORAS (liberando as partes
+    no armazenamento) e apaga as sessões; sessões finalizadas só perdem a linha.
+    """
+    corte = datetime.now() - timedelta(hours=UPLOAD_SESSAO_TTL_HORAS)
+    totais = {"abandonadas": 0, "finalizadas": 0, "bytes_descartados": 0}
+    while True:
+        async with SessionLocal() as db:
+            stmt = (
+                select(models.SessaoUpload)
+                .filter(models.SessaoUpload.atualizado_em < corte)
+                .order_by(models.SessaoUpload.atualizado_em)
+                .limit(lote)
+                .with_for_update(skip_locked=True)
+            )
+            sessoes = (await db.execute(stmt)).scalars().all()
+            if not sessoes:
+                break
+
+            async def descartar(sessao):
+                if sessao.resultado is None:
+                    await storage.abortar_multipart(sessao.object_name, sessao.upload_id)
+                # Objeto temporário montado por uma finalização que não chegou ao fim
+                await storage.remover(sessao.object_name)
+
+            falhas = await asyncio.gather(*(descartar(sessao) for sessao in sessoes), return_exceptions=True)
+            for sessao, falha in zip(sessoes, falhas):
+                if isinstance(falha, Exception):
+                    print(f"Erro ao descartar a sessão de upload {sessao.id}: {str(falha)}")
+                    continue
+                if sessao.resultado is None:
+                    totais["abandonadas"] += 1
+                    totais["bytes_descartados"] += sessao.bytes_recebidos
+                else:
+                    totais["finalizadas"] += 1
+                await db.delete(sessao)
+            await db.commit()
+            if len(sessoes) < lote or all(isinstance(falha, Exception) for falha in falhas):
+                break
+    return totais
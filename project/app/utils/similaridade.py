@@ -0,0 +1,324 @@
+import os
+import time
+import fcntl
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.future import select
+
+from ..database import models
+from ..database.database import SessionLocal
+from ..core import metrics
+from .descritores import DESCRITOR_DIMENSAO, DESCRITOR_VERSAO
+
+# Matriz de descritores num arquivo por versão do descritor, mapeado em memória por todos os processos
+# (as páginas ficam no page cache, compartilhadas, sem cópia no heap de cada worker). A coluna `descritor`
+# é a fonte da verdade: o arquivo recebe as imagens novas por marca d'água de id e é reconstruído do banco
+# periodicamente (descritores recalculados ou gravados fora de ordem), sempre sob flock.
+SIMILARIDADE_DIR = os.getenv("SIMILARIDADE_DIR", "data/similaridade")
+SIMILARIDADE_INDICE_TTL = int(os.getenv("SIMILARIDADE_INDICE_TTL", 86400))
+# Linhas por bloco na busca exata (produto matriz-vetor por bloco, sem carregar a matriz inteira)
+SIMILARIDADE_BLOCO = int(os.getenv("SIMILARIDADE_BLOCO", 65536))
+# A partir deste tamanho a busca usa o índice IVF (k-means sobre os descritores)
+SIMILARIDADE_IVF_LIMIAR = int(os.getenv("SIMILARIDADE_IVF_LIMIAR", 200_000))
+SIMILARIDADE_IVF_NPROBE = int(os.getenv("SIMILARIDADE_IVF_NPROBE", 16))
+SIMILARIDADE_IVF_ITERACOES = int(os.getenv("SIMILARIDADE_IVF_ITERACOES", 10))
+
+# Intervalo mínimo entre consultas ao banco por imagens novas disparadas pelas buscas (o processamento
+# de cada imagem já anexa a sua; isto cobre workers que não compartilham o diretório)
+_SINCRONIZAR_SEGUNDOS = 30
+
+# Uma linha do arquivo: id da imagem e o descritor; a matriz é a visão `["vetor"]` (float32, sem cópia)
+_LINHA = np.dtype([("id", "<i8"), ("vetor", "<f4", (DESCRITOR_DIMENSAO,))])
+_VAZIO = np.empty(0, dtype=_LINHA)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Posições dos k maiores scores, em ordem decrescente."""
+    if scores.size <= k:
+        return np.argsort(-scores)
+    parte = np.argpartition(-scores, k)[:k]
+    return parte[np.argsort(-scores[parte])]
+
+
+class _IVF:
+    """Arquivo invertido: cada vetor fica na lista do centróide mais próximo; a busca visita `nprobe` listas."""
+
+    def __init__(self, centroides: np.ndarray, n_treino: int):
+        self.centroides = centroides
+        self.n_treino = n_treino
+        self.listas: List[np.ndarray] = [np.empty(0, dtype=np.int64) for _ in range(len(centroides))]
+        self.indexados = 0
+
+    @classmethod
+    def treinar(cls, matriz: np.ndarray, iteracoes: int, rng) -> "_IVF":
+        n = matriz.shape[0]
+        n_listas = max(int(np.sqrt(n)), 1)
+        amostra = np.asarray(matriz[np.sort(rng.choice(n, size=min(n, 64 * n_listas), replace=False))])
+        centroides = amostra[rng.choice(amostra.shape[0], size=n_listas, replace=False)].copy()
+        # k-means esférico: vetores e centróides com norma 1, atribuição pelo maior produto interno
+        for _ in range(iteracoes):
+            atribuicao = np.argmax(amostra @ centroides.T, axis=1)
+            somas = np.zeros_like(centroides)
+            np.add.at(somas, atribuicao, amostra)
+            normas = np.linalg.norm(somas, axis=1, keepdims=True)
+            vazios = normas[:, 0] == 0
+            centroides = np.where(vazios[:, None], centroides, somas / np.maximum(normas, 1e-12))
+        ivf = cls(centroides.astype(np.float32), n)
+        ivf.adicionar(matriz)
+        return ivf
+
+    def adicionar(self, matriz: np.ndarray):
+        """Atribui às listas as linhas de `matriz` ainda não indexadas (append incremental)."""
+        novas = []
+        for inicio in range(self.indexados, matriz.shape[0], SIMILARIDADE_BLOCO):
+            bloco = np.asarray(matriz[inicio:inicio + SIMILARIDADE_BLOCO])
+            novas.append(np.argmax(bloco @ self.centroides.T, axis=1))
+        if not novas:
+            return
+        atribuicao = np.concatenate(novas)
+        posicoes = np.arange(self.indexados, matriz.shape[0])
+        ordem = np.argsort(atribuicao, kind="stable")
+        cortes = np.searchsorted(atribuicao[ordem], np.arange(len(self.centroides) + 1))
+        for lista in range(len(self.centroides)):
+            fatia = posicoes[ordem[cortes[lista]:cortes[lista + 1]]]
+            if fatia.size:
+                self.listas[lista] = np.concatenate([self.listas[lista], fatia])
+        self.indexados = matriz.shape[0]
+
+    def candidatos(self, consulta: np.ndarray, nprobe: int) -> np.ndarray:
+        listas = _top_k(self.centroides @ consulta, nprobe)
+        return np.concatenate([self.listas[lista] for lista in listas])
+
+
+def _abrir(caminho: str) -> Tuple[np.ndarray, Optional[int]]:
+    """Mapeia as linhas completas do arquivo (um append em andamento deixa a última pela metade) e o inode."""
+    try:
+        f = open(caminho, "rb")
+    except FileNotFoundError:
+        return _VAZIO, None
+    with f:
+        stat = os.fstat(f.fileno())
+        n = stat.st_size // _LINHA.itemsize
+        linhas = np.memmap(f, dtype=_LINHA, mode="r", shape=(n,)) if n else _VAZIO
+    return linhas, stat.st_ino
+
+
+async def _gravar_do_banco(f, *filtros) -> int:
+    """Grava em `f` as imagens com descritor que passam nos filtros, em ordem de id; retorna quantas."""
+    modelo = models.RegistroLesoesImagens
+    total = 0
+    async with SessionLocal() as db:
+        stmt = (
+            select(modelo.id, modelo.descritor)
+            .filter(modelo.descritor.is_not(None), *filtros)
+            .order_by(modelo.id)
+            .execution_options(yield_per=10_000)
+        )
+        result = await db.stream(stmt)
+        async for lote in result.partitions():
+            linhas = np.empty(len(lote), dtype=_LINHA)
+            linhas["id"] = [row.id for row in lote]
+            vetores = np.frombuffer(b"".join(row.descritor for row in lote), dtype=np.float32)
+            linhas["vetor"] = vetores.reshape(-1, DESCRITOR_DIMENSAO)
+            # Uma escrita por lote: quem mapeia o arquivo no meio dela só enxerga linhas completas
+            await asyncio.to_thread(f.write, linhas.tobytes())
+            total += linhas.size
+    return total
+
+
+class IndiceSimilaridade:
+    """
+    Busca top-k por similaridade de cosseno sobre os descritores das imagens de lesão.
+    Abaixo de SIMILARIDADE_IVF_LIMIAR a busca é exata (varredura por blocos);
+    acima, aproximada pelo IVF, retreinado quando o corpus dobra desde o último treino.
+
+    As consultas nunca esperam o banco: usam o mapeamento atual enquanto uma tarefa em segundo plano
+    anexa imagens novas, reconstrói o arquivo vencido e remapeia (só a primeira consulta do processo espera).
+    """
+
+    def __init__(self, diretorio: str = SIMILARIDADE_DIR):
+        self.diretorio = diretorio
+        self.caminho = os.path.join(diretorio, f"descritores_v{DESCRITOR_VERSAO}_{DESCRITOR_DIMENSAO}.bin")
+        self.caminho_lock = self.caminho + ".lock"
+        # mtime = última reconstrução completa (os appends mudam o mtime do próprio arquivo)
+        self.caminho_reconstruido = self.caminho + ".reconstruido"
+        # (linhas, ivf, inode) trocados juntos: uma consulta lê um estado consistente sem lock
+        self._estado: Tuple[np.ndarray, Optional[_IVF], Optional[int]] = (_VAZIO, None, None)
+        self._atualizacao: Optional[asyncio.Task] = None
+        self._treino: Optional[asyncio.Task] = None
+        self._sincronizado_em = 0.0
+        self._lock = asyncio.Lock()
+        self._lock_arquivo = asyncio.Lock()
+        self._rng = np.random.default_rng(0)
+        self.latencia = metrics.LatencyStats()
+
+    @asynccontextmanager
+    async def _travado(self):
+        """flock do arquivo (entre processos); o asyncio.Lock evita prender threads do pool neste processo."""
+        async with self._lock_arquivo:
+            os.makedirs(self.diretorio, exist_ok=True)
+            with open(self.caminho_lock, "a") as lock:
+                await asyncio.to_thread(fcntl.flock, lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _reconstrucao_vencida(self) -> bool:
+        try:
+            return time.time() - os.path.getmtime(self.caminho_reconstruido) > SIMILARIDADE_INDICE_TTL
+        except FileNotFoundError:
+            return True
+
+    async def _reconstruir(self):
+        """Regrava o arquivo inteiro a partir do banco e o troca atomicamente (quem já mapeou segue no antigo)."""
+        async with self._travado():
+            if not self._reconstrucao_vencida():
+                # Outro processo reconstruiu enquanto este esperava o lock
+                return
+            temporario = self.caminho + ".tmp"
+            with open(temporario, "wb") as f:
+                await _gravar_do_banco(f)
+            os.replace(temporario, self.caminho)
+            with open(self.caminho_reconstruido, "a"):
+                os.utime(self.caminho_reconstruido)
+
+    async def sincronizar(self, ids: Iterable[int] = ()):
+        """
+        Anexa ao arquivo as imagens com descritor que ainda não estão nele: id acima do maior gravado e,
+        dentre os `ids` informados, os que foram processados fora de ordem. Chamado depois do processamento
+        de imagens; sem o arquivo ainda não faz nada (a primeira consulta o constrói do banco).
+        """
+        modelo = models.RegistroLesoesImagens
+        async with self._travado():
+            linhas, inode = await asyncio.to_thread(_abrir, self.caminho)
+            if inode is None:
+                return
+            gravados = linhas["id"]
+            ultimo = int(gravados.max()) if gravados.size else 0
+            fora = np.asarray(list(ids), dtype=np.int64)
+            fora = fora[fora <= ultimo]
+            if fora.size:
+                fora = await asyncio.to_thread(np.setdiff1d, fora, gravados)
+            filtro = modelo.id > ultimo
+            if fora.size:
+                filtro = or_(filtro, modelo.id.in_(fora.tolist()))
+            with open(self.caminho, "ab") as f:
+                await _gravar_do_banco(f, filtro)
+
+    def _mapear(self, estado):
+        """Novo estado se o arquivo cresceu (appends de qualquer processo) ou foi trocado por uma reconstrução."""
+        linhas, ivf, inode = estado
+        novas, novo_inode = _abrir(self.caminho)
+        if novo_inode == inode and novas.size == linhas.size:
+            return estado
+        if ivf is not None:
+            if novo_inode != inode:
+                # Posições mudaram: reatribui às listas com os centróides já treinados
+                ivf = _IVF(ivf.centroides, ivf.n_treino)
+            ivf.adicionar(novas["vetor"])
+        return novas, ivf, novo_inode
+
+    async def _atualizar(self):
+        try:
+            if self._reconstrucao_vencida():
+                await self._reconstruir()
+                self._sincronizado_em = time.monotonic()
+            elif time.monotonic() - self._sincronizado_em > _SINCRONIZAR_SEGUNDOS:
+                await self.sincronizar()
+                self._sincronizado_em = time.monotonic()
+        except Exception as e:
+            print(f"Erro ao atualizar o arquivo do índice de similaridade: {str(e)}")
+        async with self._lock:
+            self._estado = await asyncio.to_thread(self._mapear, self._estado)
+
+        n = self._estado[0].size
+        ivf = self._estado[1]
+        precisa_treino = n >= SIMILARIDADE_IVF_LIMIAR and (ivf is None or n >= 2 * ivf.n_treino)
+        if precisa_treino and (self._treino is None or self._treino.done()):
+            # Treina em segundo plano; enquanto isso as consultas usam o índice anterior (ou a busca exata)
+            self._treino = asyncio.create_task(self._treinar())
+
+    async def _treinar(self):
+        linhas, _, inode = self._estado
+        ivf = await asyncio.to_thread(_IVF.treinar, linhas["vetor"], SIMILARIDADE_IVF_ITERACOES, self._rng)
+        async with self._lock:
+            linhas, _, inode_atual = self._estado
+            if inode_atual != inode:
+                # O arquivo foi reconstruído durante o treino: as posições indexadas não valem mais
+                ivf = _IVF(ivf.centroides, ivf.n_treino)
+            await asyncio.to_thread(ivf.adicionar, linhas["vetor"])
+            self._estado = (linhas, ivf, inode_atual)
+
+    def _buscar(self, estado, consulta: np.ndarray, k: int, excluir: set) -> List[Tuple[int, float]]:
+        linhas, ivf, _ = estado
+        matriz, ids = linhas["vetor"], linhas["id"]
+        # Pede folga para compensar os excluídos
+        alvo = k + len(excluir)
+        if ivf is not None:
+            posicoes = ivf.candidatos(consulta, SIMILARIDADE_IVF_NPROBE)
+            # O IVF pode já ter indexado linhas de um remapeamento posterior a este estado
+            posicoes = np.sort(posicoes[posicoes < linhas.size])
+            scores = np.asarray(matriz[posicoes]) @ consulta
+            ordem = _top_k(scores, alvo)
+            melhores, scores_melhores = posicoes[ordem], scores[ordem]
+        else:
+            parciais_pos, parciais_score = [], []
+            for inicio in range(0, linhas.size, SIMILARIDADE_BLOCO):
+                scores = np.asarray(matriz[inicio:inicio + SIMILARIDADE_BLOCO]) @ consulta
+                topo = _top_k(scores, alvo)
+                parciais_pos.append(topo + inicio)
+                parciais_score.append(scores[topo])
+            if not parciais_pos:
+                return []
+            posicoes = np.concatenate(parciais_pos)
+            scores = np.concatenate(parciais_score)
+            ordem = _top_k(scores, alvo)
+            melhores, scores_melhores = posicoes[ordem], scores[ordem]
+
+        resultado = []
+        vistos = set(excluir)
+        for posicao, score in zip(melhores, scores_melhores):
+            imagem_id = int(ids[posicao])
+            if imagem_id in vistos:
+                continue
+            vistos.add(imagem_id)
+            resultado.append((imagem_id, float(score)))
+            if len(resultado) == k:
+                break
+        return resultado
+
+    async def buscar(self, descritor: bytes, k: int, excluir: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """Os k ids de imagem mais similares ao descritor, com o score (cosseno), do maior para o menor."""
+        consulta = np.frombuffer(descritor, dtype=np.float32)
+        if self._atualizacao is None or self._atualizacao.done():
+            self._atualizacao = asyncio.create_task(self._atualizar())
+        if self._estado[2] is None:
+            # Primeira consulta do processo: espera o mapeamento (e a construção do arquivo, se faltar)
+            await asyncio.shield(self._atualizacao)
+        estado = self._estado
+        with self.latencia.time():
+            return await asyncio.to_thread(self._buscar, estado, consulta, k, set(excluir))
+
+    @property
+    def aproximado(self) -> bool:
+        return self._estado[1] is not None
+
+    def stats(self) -> dict:
+        linhas, ivf, _ = self._estado
+        return {
+            "imagens": linhas.size,
+            "ivf": None if ivf is None else {
+                "listas": len(ivf.centroides),
+                "treinado_com": ivf.n_treino,
+            },
+            "consulta": self.latencia.snapshot(),
+        }
+
+
+indice_similaridade = IndiceSimilaridade()
+metrics.register("similaridade", indice_similaridade.stats)
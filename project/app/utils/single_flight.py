@@ -0,0 +1,95 @@
+import asyncio
+import inspect
+import functools
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from ..core import metrics
+from .cache import PARAMETROS_IGNORADOS, make_key
+
+
+class SingleFlight:
+    """
+    Coalesce chamadas concorrentes idênticas: enquanto uma computação para a chave
+    está em andamento, as demais chamadas aguardam o mesmo resultado em vez de repeti-la.
+    Nada é guardado depois que a computação termina (isso é papel do cache).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.calls = metrics.Counter()
+        self.executions = metrics.Counter()
+        self.coalesced = metrics.Counter()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        self.calls.inc()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._done, key))
+            self.executions.inc()
+        else:
+            self.coalesced.inc()
+        # shield: o cancelamento de um dos clientes não cancela a computação dos demais
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # evita "exception was never retrieved" quando todos desistiram
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls.value,
+            "executions": self.executions.value,
+            "coalesced": self.coalesced.value,
+            "in_flight": len(self._inflight),
+        }
+
+
+_groups: Dict[str, SingleFlight] = {}
+metrics.register("single_flight", lambda: {name: group.stats() for name, group in _groups.items()})
+
+
+def get_group(name: str) -> SingleFlight:
+    if name not in _groups:
+        _groups[name] = SingleFlight(name)
+    return _groups[name]
+
+
+def auth_scope(current_user) -> str:
+    """Escopo de autorização usado na chave: o nível de acesso efetivo do usuário."""
+    if current_user is None:
+        return "anonimo"
+    niveis = [role.nivel_acesso for role in current_user.roles]
+    return f"nivel:{min(niveis)}" if niveis else "sem-role"
+
+
+def single_flight(
+    scope: Optional[Callable[[dict], str]] = None,
+    ignore: Iterable[str] = PARAMETROS_IGNORADOS,
+):
+    """
+    Decorator para handlers assíncronos. A chave é rota + parâmetros + escopo de autorização
+    (por padrão derivado de `current_user`, quando o handler o recebe).
+    O resultado é compartilhado entre requisições, então deve ser independente da sessão (dicts, não ORM).
+    """
+    ignore = tuple(ignore)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        group = get_group(f"{func.__module__}.{func.__qualname__}")
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {name: value for name, value in bound.arguments.items() if name not in ignore}
+            arguments["_scope"] = scope(bound.arguments) if scope else auth_scope(bound.arguments.get("current_user"))
+            return await group.do(make_key(func, arguments), lambda: func(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,463 @@
+import os
+import uuid
+import asyncio
+import hashlib
+import shutil
+import tempfile
+import mimetypes
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+from fastapi import HTTPException
+from minio.error import S3Error
+from ..core import metrics
+from . import minio
+from .minio import (
+    ArquivoMuitoGrandeError, LeitorLimitado, calcular_sha256, nome_objeto_por_conteudo
+)
+
+# Onde os objetos ficam: "minio" (padrão) ou "local" (sistema de arquivos em STORAGE_DIR)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "minio")
+STORAGE_DIR = os.getenv("STORAGE_DIR", "data/storage")
+# Tamanho de cada bloco lido no download em streaming: a memória por download não depende do arquivo
+STORAGE_CHUNK = int(os.getenv("STORAGE_CHUNK", 256 * 1024))
+# Prefixo das URLs de download servidas pela própria API (backend local)
+STORAGE_URL_BASE = os.getenv("STORAGE_URL_BASE", "")
+STORAGE_MAX_UPLOADS_CONCORRENTES = int(os.getenv("STORAGE_MAX_UPLOADS_CONCORRENTES", 8))
+# Camada fria: objetos antigos vão para este prefixo (alvo de regras de ILM/transição do MinIO)
+TIERING_PREFIXO = os.getenv("TIERING_PREFIXO", "frio/")
+
+# Limita quantos uploads grandes ocupam o pool/disco ao mesmo tempo; leituras rápidas não ficam presas atrás deles
+_uploads_concorrentes = asyncio.Semaphore(STORAGE_MAX_UPLOADS_CONCORRENTES)
+
+
+@dataclass(frozen=True, slots=True)
+class InfoObjeto:
+    tamanho: int
+    content_type: str
+    etag: str
+    modificado_em: datetime
+
+
+class MinioStorage:
+    """Objetos no bucket MINIO_BUCKET (todas as chamadas passam pelo pool de `utils.minio`)."""
+
+    nome = "minio"
+
+    async def preparar(self):
+        await minio.executar(minio.ensure_bucket)
+
+    async def stat(self, object_name) -> Optional[InfoObjeto]:
+        stat = await minio.stat_objeto(object_name)
+        if stat is None:
+            return None
+        return InfoObjeto(
+            tamanho=stat.size,
+            content_type=(stat.content_type or "application/octet-stream").split(";")[0].strip(),
+            etag=f'"{stat.etag}"',
+            modificado_em=stat.last_modified,
+        )
+
+    async def baixar(self, object_name) -> bytes:
+        return await minio.baixar_objeto(object_name)
+
+    async def enviar(self, object_name, dados, content_type="application/octet-stream", metadata=None):
+        await minio.garantir_bucket()
+        await minio.enviar_bytes(object_name, dados, content_type, metadata=metadata)
+
+    async def enviar_stream(self, object_name, leitor, content_type="application/octet-stream"):
+        await minio.garantir_bucket()
+        await minio.enviar_stream(object_name, leitor, content_type)
+
+    async def remover(self, object_name):
+        await minio.remover_objeto(object_name)
+
+    async def copiar(self, origem, destino, content_type=None, metadata=None):
+        await minio.copiar_objeto(origem, destino, content_type, metadata)
+
+    async def remover_prefixo(self, prefixo) -> int:
+        return await minio.remover_prefixo(prefixo)
+
+    async def iniciar_multipart(self, object_name, content_type) -> str:
+        await minio.garantir_bucket()
+        return await minio.iniciar_multipart(object_name, content_type)
+
+    async def enviar_parte(self, object_name, upload_id, numero, dados) -> str:
+        return await minio.enviar_parte(object_name, upload_id, numero, dados)
+
+    async def concluir_multipart(self, object_name, upload_id, partes):
+        await minio.concluir_multipart(object_name, upload_id, partes)
+
+    async def abortar_multipart(self, object_name, upload_id):
+        await minio.abortar_multipart(object_name, upload_id)
+
+    def ler_intervalo(self, object_name, inicio, tamanho) -> AsyncIterator[bytes]:
+        return minio.ler_intervalo(object_name, inicio, tamanho, STORAGE_CHUNK)
+
+    def caminho_local(self, object_name) -> Optional[str]:
+        return None
+
+    async def url_upload(self, object_name) -> str:
+        return await minio.gerar_url_upload(object_name)
+
+    async def urls_download(self, object_names) -> dict:
+        return await minio.gerar_urls_download(object_names)
+
+
+class LocalStorage:
+    """
+    Objetos como arquivos sob STORAGE_DIR (o nome do objeto é o caminho relativo).
+    Gravações vão para um temporário no mesmo diretório e são renomeadas: leitores nunca veem arquivo pela metade.
+    """
+
+    nome = "local"
+
+    def __init__(self, raiz):
+        self.raiz = os.path.abspath(raiz)
+
+    def caminho_local(self, object_name) -> str:
+        caminho = os.path.normpath(os.path.join(self.raiz, object_name))
+        if not caminho.startswith(self.raiz + os.sep):
+            raise ValueError(f"Nome de objeto inválido: {object_name}")
+        return caminho
+
+    def _gravar(self, object_name, escrever):
+        caminho = self.caminho_local(object_name)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(temporario, "wb") as destino:
+                escrever(destino)
+            os.replace(temporario, caminho)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    async def preparar(self):
+        os.makedirs(self.raiz, exist_ok=True)
+
+    async def stat(self, object_name) -> Optional[InfoObjeto]:
+        try:
+            st = await asyncio.to_thread(os.stat, self.caminho_local(object_name))
+        except FileNotFoundError:
+            return None
+        return InfoObjeto(
+            tamanho=st.st_size,
+            content_type=mimetypes.guess_type(object_name)[0] or "application/octet-stream",
+            etag=f'"{st.st_mtime_ns:x}-{st.st_size:x}"',
+            modificado_em=datetime.fromtimestamp(st.st_mtime, tz=timezone.utc),
+        )
+
+    async def baixar(self, object_name) -> bytes:
+        def ler():
+            with open(self.caminho_local(object_name), "rb") as arquivo:
+                return arquivo.read()
+        return await asyncio.to_thread(ler)
+
+    async def enviar(self, object_name, dados, content_type="application/octet-stream", metadata=None):
+        await asyncio.to_thread(self._gravar, object_name, lambda destino: destino.write(dados))
+
+    async def enviar_stream(self, object_name, leitor, content_type="application/octet-stream"):
+        await asyncio.to_thread(
+            self._gravar, object_name, lambda destino: shutil.copyfileobj(leitor, destino, STORAGE_CHUNK)
+        )
+
+    async def remover(self, object_name):
+        try:
+            await asyncio.to_thread(os.remove, self.caminho_local(object_name))
+        except FileNotFoundError:
+            pass
+
+    async def copiar(self, origem, destino, content_type=None, metadata=None):
+        def copiar():
+            with open(self.caminho_local(origem), "rb") as fonte:
+                self._gravar(destino, lambda arquivo: shutil.copyfileobj(fonte, arquivo, STORAGE_CHUNK))
+        await asyncio.to_thread(copiar)
+
+    async def remover_prefixo(self, prefixo) -> int:
+        def remover():
+            diretorio, inicio_nome = os.path.split(self.caminho_local(prefixo.rstrip("/")))
+            if prefixo.endswith("/"):
+                inicio_nome += os.sep
+            alvo = os.path.join(diretorio, inicio_nome)
+            removidos = 0
+            for nome in os.listdir(diretorio) if os.path.isdir(diretorio) else []:
+                caminho = os.path.join(diretorio, nome)
+                e_pasta = os.path.isdir(caminho)
+                # Como no S3, o prefixo casa com o caminho completo (pastas terminam em "/")
+                if not (caminho + os.sep if e_pasta else caminho).startswith(alvo):
+                    continue
+                if e_pasta:
+                    removidos += sum(len(arquivos) for _, _, arquivos in os.walk(caminho))
+                    shutil.rmtree(caminho)
+                else:
+                    os.remove(caminho)
+                    removidos += 1
+            return removidos
+        return await asyncio.to_thread(remover)
+
+    def _pasta_multipart(self, upload_id) -> str:
+        # Partes ficam fora do espaço de nomes dos objetos (nomes de objeto não começam com ".")
+        return os.path.join(self.raiz, ".multipart", upload_id)
+
+    async def iniciar_multipart(self, object_name, content_type) -> str:
+        upload_id = uuid.uuid4().hex
+        await asyncio.to_thread(os.makedirs, self._pasta_multipart(upload_id))
+        return upload_id
+
+    async def enviar_parte(self, object_name, upload_id, numero, dados) -> str:
+        def gravar():
+            caminho = os.path.join(self._pasta_multipart(upload_id), f"{numero:05d}")
+            with open(f"{caminho}.tmp", "wb") as parte:
+                parte.write(dados)
+            os.replace(f"{caminho}.tmp", caminho)
+        await asyncio.to_thread(gravar)
+        return hashlib.md5(dados).hexdigest()
+
+    async def concluir_multipart(self, object_name, upload_id, partes):
+        pasta = self._pasta_multipart(upload_id)
+
+        def concatenar(destino):
+            for numero, _ in partes:
+                with open(os.path.join(pasta, f"{numero:05d}"), "rb") as parte:
+                    shutil.copyfileobj(parte, destino, STORAGE_CHUNK)
+
+        await asyncio.to_thread(self._gravar, object_name, concatenar)
+        await asyncio.to_thread(shutil.rmtree, pasta, True)
+
+    async def abortar_multipart(self, object_name, upload_id):
+        await asyncio.to_thread(shutil.rmtree, self._pasta_multipart(upload_id), True)
+
+    async def ler_intervalo(self, object_name, inicio, tamanho) -> AsyncIterator[bytes]:
+        arquivo = await asyncio.to_thread(open, self.caminho_local(object_name), "rb")
+        try:
+            fim = inicio + tamanho
+            while inicio < fim:
+                chunk = await asyncio.to_thread(os.pread, arquivo.fileno(), min(STORAGE_CHUNK, fim - inicio), inicio)
+                if not chunk:
+                    break
+                inicio += len(chunk)
+                yield chunk
+        finally:
+            arquivo.close()
+
+    async def url_upload(self, object_name) -> str:
+        raise HTTPException(status_code=501, detail="Upload direto não disponível com armazenamento local")
+
+    async def urls_download(self, object_names) -> dict:
+        # Sem URLs pré-assinadas: os arquivos são servidos pela própria API (rota autenticada /arquivos)
+        return {object_name: f"{STORAGE_URL_BASE}/arquivos/{quote(object_name)}" for object_name in dict.fromkeys(object_names)}
+
+
+def criar_storage():
+    if STORAGE_BACKEND == "minio":
+        return MinioStorage()
+    if STORAGE_BACKEND == "local":
+        return LocalStorage(STORAGE_DIR)
+    raise ValueError(f"STORAGE_BACKEND desconhecido: {STORAGE_BACKEND}")
+
+
+storage = criar_storage()
+
+downloads = {
+    "downloads": metrics.Counter(),
+    "parciais": metrics.Counter(),
+    "bytes_enviados": metrics.Counter(),
+}
+metrics.register("storage", lambda: {"backend": storage.nome, **{nome: c.value for nome, c in downloads.items()}})
+
+
+def nomes_camada_fria(object_name):
+    """Onde o job de tiering pode ter colocado o objeto: mesmo nome sob o prefixo frio, ou recomprimido em WebP."""
+    base, _ = os.path.splitext(object_name)
+    return [f"{TIERING_PREFIXO}{object_name}", f"{TIERING_PREFIXO}{base}.webp"]
+
+
+async def localizar_objeto(object_name):
+    """Nome atual do objeto endereçado por conteúdo (camada quente ou fria), ou None se não existe."""
+    candidatos = [object_name] + nomes_camada_fria(object_name)
+    stats = await asyncio.gather(*(storage.stat(candidato) for candidato in candidatos))
+    for candidato, stat in zip(candidatos, stats):
+        if stat is not None:
+            return candidato
+    return None
+
+
+# Deduplicação de uploads (reenvios do mesmo arquivo reaproveitam o objeto existente)
+_dedup = {
+    "uploads": metrics.Counter(),
+    "deduplicados": metrics.Counter(),
+    "bytes_recebidos": metrics.Counter(),
+    "bytes_economizados": metrics.Counter(),
+}
+
+
+def _dedup_stats():
+    uploads = _dedup["uploads"].value
+    return {
+        **{nome: contador.value for nome, contador in _dedup.items()},
+        "dedup_ratio": round(_dedup["deduplicados"].value / uploads, 4) if uploads else 0.0,
+    }
+
+
+metrics.register("deduplicacao", _dedup_stats)
+
+
+async def armazenar_upload(file, folder_name, allowed_types=None, max_size_mb=50):
+    try:
+        # Validação de tipo de arquivo
+        if allowed_types and file.content_type not in allowed_types:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Tipo de arquivo não permitido. Tipos aceitos: {', '.join(allowed_types)}"
+            )
+
+        # Validação de tamanho antecipada quando o cliente informou o tamanho
+        max_size_bytes = max_size_mb * 1024 * 1024
+        erro_tamanho = HTTPException(
+            status_code=400,
+            detail=f"Arquivo muito grande. Tamanho máximo: {max_size_mb}MB"
+        )
+        if file.size is not None and file.size > max_size_bytes:
+            raise erro_tamanho
+
+        # 1ª passada (arquivo já está no disco/memória do servidor): SHA-256 e limite de tamanho
+        await file.seek(0)
+        try:
+            sha256, tamanho = await asyncio.to_thread(calcular_sha256, file.file, max_size_bytes)
+        except ArquivoMuitoGrandeError:
+            raise erro_tamanho
+
+        object_name = nome_objeto_por_conteudo(folder_name, sha256, file.filename)
+        _dedup["uploads"].inc()
+        _dedup["bytes_recebidos"].inc(tamanho)
+
+        # Conteúdo já armazenado (quente ou já movido para a camada fria): referencia o objeto existente
+        existente = await localizar_objeto(object_name)
+        if existente is not None:
+            _dedup["deduplicados"].inc()
+            _dedup["bytes_economizados"].inc(tamanho)
+            await file.seek(0)
+            return {
+                "url": existente,
+                "sha256": sha256,
+                "tamanho": tamanho,
+                "content_type": file.content_type,
+                "reutilizado": True
+            }
+
+        # Upload em streaming: um bloco por vez (no MinIO, multipart quando passa de MINIO_PART_SIZE),
+        # então a memória por upload fica limitada ao tamanho do bloco
+        await file.seek(0)
+        leitor = LeitorLimitado(file.file, max_size_bytes)
+        try:
+            async with _uploads_concorrentes:
+                await storage.enviar_stream(object_name, leitor, file.content_type)
+        except ArquivoMuitoGrandeError:
+            # O SDK aborta o multipart upload em andamento (e o backend local apaga o temporário)
+            raise erro_tamanho
+
+        # Reposiciona o ponteiro do arquivo para o início (caso precise usar novamente)
+        await file.seek(0)
+
+        return {
+            "url": object_name,
+            "sha256": leitor.sha256,
+            "tamanho": leitor.tamanho,
+            "content_type": file.content_type,
+            "reutilizado": False
+        }
+
+    except S3Error as e:
+        raise HTTPException(status_code=500, detail=f"Erro no MinIO: {str(e)}")
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao fazer upload: {str(e)}")
+
+
+async def armazenar_por_conteudo(dados: bytes, folder_name, extensao, content_type):
+    """
+    Grava bytes já processados no servidor (ex.: imagem normalizada) com chave endereçada pelo conteúdo.
+    Mesmo retorno de `armazenar_upload`; conteúdo já armazenado não é reenviado.
+    """
+    sha256 = await asyncio.to_thread(lambda: hashlib.sha256(dados).hexdigest())
+    object_name = nome_objeto_por_conteudo(folder_name, sha256, f"arquivo{extensao}")
+    _dedup["uploads"].inc()
+    _dedup["bytes_recebidos"].inc(len(dados))
+
+    metadata = {
+        "url": object_name,
+        "sha256": sha256,
+        "tamanho": len(dados),
+        "content_type": content_type,
+        "reutilizado": True
+    }
+    existente = await localizar_objeto(object_name)
+    if existente is not None:
+        _dedup["deduplicados"].inc()
+        _dedup["bytes_economizados"].inc(len(dados))
+        metadata["url"] = existente
+        return metadata
+
+    async with _uploads_concorrentes:
+        await storage.enviar(object_name, dados, content_type)
+    metadata["reutilizado"] = False
+    return metadata
+
+
+async def armazenar_objeto_por_conteudo(origem, sha256, tamanho, folder_name, extensao, content_type):
+    """
+    Como `armazenar_por_conteudo`, para um objeto que já está no armazenamento com hash conhecido
+    (ex.: montado por um upload retomável): o conteúdo é copiado no servidor, sem passar pela API.
+    """
+    object_name = nome_objeto_por_conteudo(folder_name, sha256, f"arquivo{extensao}")
+    _dedup["uploads"].inc()
+    _dedup["bytes_recebidos"].inc(tamanho)
+
+    metadata = {
+        "url": object_name,
+        "sha256": sha256,
+        "tamanho": tamanho,
+        "content_type": content_type,
+        "reutilizado": True
+    }
+    existente = await localizar_objeto(object_name)
+    if existente is not None:
+        _dedup["deduplicados"].inc()
+        _dedup["bytes_economizados"].inc(tamanho)
+        metadata["url"] = existente
+        return metadata
+
+    await storage.copiar(origem, object_name)
+    metadata["reutilizado"] = False
+    return metadata
+
+
+async def baixar_para_temporario(object_name, tamanho) -> str:
+    """
+    Copia o objeto em blocos para um arquivo temporário local e retorna o caminho (o chamador apaga).
+    A memória usada é a de um bloco, e o pool de processos abre o arquivo pelo caminho.
+    """
+    destino = await asyncio.to_thread(tempfile.NamedTemporaryFile, prefix="objeto-", delete=False)
+    try:
+        async for chunk in storage.ler_intervalo(object_name, 0, tamanho):
+            await asyncio.to_thread(destino.write, chunk)
+    except BaseException:
+        destino.close()
+        os.unlink(destino.name)
+        raise
+    destino.close()
+    return destino.name
+
+
+async def sha256_objeto(object_name, max_bytes):
+    """Lê um objeto já armazenado (ex.: enviado direto ao MinIO) em blocos e retorna (sha256, tamanho)."""
+    hash_ = hashlib.sha256()
+    tamanho = 0
+    async for chunk in storage.ler_intervalo(object_name, 0, max_bytes):
+        await asyncio.to_thread(hash_.update, chunk)
+        tamanho += len(chunk)
+    return hash_.hexdigest(), tamanho
@@ -0,0 +1,299 @@
+import os
+import time
+import random
+import socket
+import asyncio
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, Optional
+
+from sqlalchemy import func, delete, update, extract, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..core import metrics
+from ..database import models
+from ..database.database import SessionLocal
+
+# Prazo para concluir (renovado enquanto a tarefa roda); vencido, outra execução pode reivindicá-la
+TAREFAS_VISIBILIDADE_SEGUNDOS = int(os.getenv("TAREFAS_VISIBILIDADE_SEGUNDOS", 300))
+TAREFAS_TENTATIVAS = int(os.getenv("TAREFAS_TENTATIVAS", 5))
+# Espera antes da n-ésima nova tentativa: base * 2^(n-1) segundos, limitada ao máximo (com jitter)
+TAREFAS_BACKOFF_BASE = float(os.getenv("TAREFAS_BACKOFF_BASE", 10))
+TAREFAS_BACKOFF_MAX = float(os.getenv("TAREFAS_BACKOFF_MAX", 1800))
+# Espera entre consultas quando não há tarefas disponíveis
+TAREFAS_INTERVALO = float(os.getenv("TAREFAS_INTERVALO", 1))
+# Tarefas concluídas são apagadas depois disso (as que falharam ficam para inspeção)
+TAREFAS_RETENCAO_DIAS = int(os.getenv("TAREFAS_RETENCAO_DIAS", 7))
+
+PRIORIDADE_BAIXA = -10
+PRIORIDADE_NORMAL = 0
+PRIORIDADE_ALTA = 10
+
+_MANUTENCAO_SEGUNDOS = 60
+
+
+class FalhaDefinitiva(Exception):
+    """Levantada pelo handler quando repetir não adianta (a tarefa vai direto para "falhou")."""
+
+
+@dataclass
+class TipoTarefa:
+    fn: Callable
+    # "async": corrotina no event loop; "thread"/"processo": função síncrona no pool correspondente do worker
+    executor: str
+    tentativas: int
+    visibilidade_segundos: int
+
+
+_tipos: Dict[str, TipoTarefa] = {}
+
+_fila = {"pendentes": 0, "executando": 0, "falhas_definitivas": 0, "idade_max_segundos": 0.0}
+enfileiradas = metrics.Counter()
+concluidas = metrics.Counter()
+retentativas = metrics.Counter()
+falhas = metrics.Counter()
+expiradas = metrics.Counter()
+_latencias: Dict[str, metrics.LatencyStats] = {}
+
+
+def stats() -> dict:
+    return {
+        **_fila,
+        "enfileiradas": enfileiradas.value,
+        "concluidas": concluidas.value,
+        "retentativas": retentativas.value,
+        "falhas": falhas.value,
+        "expiradas": expiradas.value,
+        "latencia": {tipo: latencia.snapshot() for tipo, latencia in _latencias.items()},
+    }
+
+
+metrics.register("tarefas", stats)
+
+
+def tarefa(tipo: str, executor: str = "async", tentativas: int = TAREFAS_TENTATIVAS,
+           visibilidade_segundos: int = TAREFAS_VISIBILIDADE_SEGUNDOS):
+    """Registra o handler de um tipo de tarefa; o payload é passado como argumentos nomeados."""
+    if executor not in ("async", "thread", "processo"):
+        raise ValueError(f"Executor inválido: {executor}")
+
+    def decorador(fn):
+        _tipos[tipo] = TipoTarefa(fn, executor, tentativas, visibilidade_segundos)
+        _latencias[tipo] = metrics.LatencyStats()
+        return fn
+    return decorador
+
+
+def tipos_registrados():
+    return sorted(_tipos)
+
+
+def enfileirar_tarefa(db: AsyncSession, tipo: str, payload: dict, prioridade: int = PRIORIDADE_NORMAL,
+                      atraso_segundos: float = 0):
+    """
+    Grava a tarefa na sessão do chamador: o worker só a enxerga depois do commit da mesma transação
+    que criou os dados dela (e ela some junto num rollback).
+    """
+    config = _tipos.get(tipo)
+    if config is None:
+        raise ValueError(f"Tipo de tarefa não registrado: {tipo}")
+    linha = models.Tarefa(
+        tipo=tipo,
+        payload=payload,
+        prioridade=prioridade,
+        max_tentativas=config.tentativas,
+        visibilidade_segundos=config.visibilidade_segundos,
+    )
+    if atraso_segundos:
+        linha.disponivel_em = func.now() + timedelta(seconds=atraso_segundos)
+    db.add(linha)
+    enfileiradas.inc()
+
+
+def _prazo(segundos):
+    return func.now() + literal_column("interval '1 second'") * segundos
+
+
+def _espera(tentativas: int) -> timedelta:
+    segundos = min(TAREFAS_BACKOFF_BASE * 2 ** (tentativas - 1), TAREFAS_BACKOFF_MAX)
+    return timedelta(seconds=segundos * random.uniform(0.5, 1.0))
+
+
+async def reivindicar(quantidade: int, worker: str, tipos: Optional[Iterable[str]] = None):
+    """
+    Marca até `quantidade` tarefas como "executando" numa única instrução (UPDATE ... WHERE id IN
+    (SELECT ... FOR UPDATE SKIP LOCKED) RETURNING): workers concorrentes nunca pegam a mesma linha
+    e a transação termina logo, sem segurar locks enquanto a tarefa roda.
+    """
+    tarefas = models.Tarefa.__table__
+    candidatas = (
+        select(tarefas.c.id)
+        .where(tarefas.c.status.in_(("pendente", "executando")), tarefas.c.disponivel_em <= func.now())
+        .order_by(tarefas.c.prioridade.desc(), tarefas.c.disponivel_em)
+        .limit(quantidade)
+        .with_for_update(skip_locked=True)
+    )
+    if tipos is not None:
+        candidatas = candidatas.where(tarefas.c.tipo.in_(list(tipos)))
+    stmt = (
+        update(tarefas)
+        .where(tarefas.c.id.in_(candidatas))
+        .values(
+            status="executando",
+            tentativas=tarefas.c.tentativas + 1,
+            disponivel_em=_prazo(tarefas.c.visibilidade_segundos),
+            worker=worker,
+        )
+        .returning(tarefas.c.id, tarefas.c.tipo, tarefas.c.payload, tarefas.c.tentativas,
+                   tarefas.c.max_tentativas, tarefas.c.visibilidade_segundos)
+        .execution_options(synchronize_session=False)
+    )
+    async with SessionLocal() as db:
+        linhas = (await db.execute(stmt)).all()
+        await db.commit()
+    return linhas
+
+
+async def _atualizar_execucao(linha, **valores):
+    """Só altera a tarefa se ainda for desta execução (o prazo pode ter vencido e outra tê-la reivindicado)."""
+    tarefas = models.Tarefa.__table__
+    stmt = (
+        update(tarefas)
+        .where(tarefas.c.id == linha.id, tarefas.c.status == "executando", tarefas.c.tentativas == linha.tentativas)
+        .values(**valores)
+        .execution_options(synchronize_session=False)
+    )
+    async with SessionLocal() as db:
+        await db.execute(stmt)
+        await db.commit()
+
+
+async def _renovar_prazo(linha):
+    # Tarefa longa: renova a visibilidade na metade do prazo para não ser reivindicada de novo
+    while True:
+        await asyncio.sleep(linha.visibilidade_segundos / 2)
+        try:
+            await _atualizar_execucao(linha, disponivel_em=_prazo(linha.visibilidade_segundos))
+        except Exception as e:
+            print(f"Erro ao renovar o prazo da tarefa {linha.id}: {str(e)}")
+
+
+async def _chamar(config: TipoTarefa, payload: dict):
+    if config.executor == "async":
+        return await config.fn(**payload)
+    if config.executor == "thread":
+        return await asyncio.to_thread(config.fn, **payload)
+    from .imagens import get_process_pool
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), _chamar_com_nomes, config.fn, payload)
+
+
+def _chamar_com_nomes(fn, payload):
+    return fn(**payload)
+
+
+async def executar_tarefa(linha):
+    config = _tipos.get(linha.tipo)
+    if config is None:
+        # Outro worker (de outra versão) pode conhecer o tipo: devolve sem gastar tentativa
+        print(f"Tarefa {linha.id}: tipo desconhecido {linha.tipo}")
+        await _atualizar_execucao(linha, status="pendente", tentativas=linha.tentativas - 1,
+                         disponivel_em=func.now() + timedelta(minutes=1))
+        return
+
+    if linha.tentativas > linha.max_tentativas:
+        # Reivindicada de novo depois de um prazo vencido na última tentativa (worker morto ou travado)
+        expiradas.inc()
+        falhas.inc()
+        await _atualizar_execucao(linha, status="falhou", ultimo_erro="Prazo de visibilidade vencido na última tentativa")
+        return
+
+    renovacao = asyncio.create_task(_renovar_prazo(linha))
+    erro = None
+    try:
+        with _latencias[linha.tipo].time():
+            await _chamar(config, linha.payload or {})
+    except Exception as e:
+        erro = e
+    finally:
+        renovacao.cancel()
+
+    if erro is None:
+        concluidas.inc()
+        await _atualizar_execucao(linha, status="concluida", ultimo_erro=None, data_conclusao=func.now())
+        return
+
+    print(f"Erro na tarefa {linha.id} ({linha.tipo}, tentativa {linha.tentativas}): {str(erro)}")
+    if isinstance(erro, FalhaDefinitiva) or linha.tentativas >= linha.max_tentativas:
+        falhas.inc()
+        await _atualizar_execucao(linha, status="falhou", ultimo_erro=str(erro)[:500])
+    else:
+        retentativas.inc()
+        await _atualizar_execucao(linha, status="pendente", ultimo_erro=str(erro)[:500],
+                         disponivel_em=func.now() + _espera(linha.tentativas))
+
+
+async def _manutencao():
+    """Atualiza profundidade/idade da fila e apaga as tarefas concluídas há mais de TAREFAS_RETENCAO_DIAS."""
+    tarefas = models.Tarefa
+    async with SessionLocal() as db:
+        stmt = select(tarefas.status, func.count(), extract("epoch", func.now() - func.min(tarefas.data_criacao))) \
+            .filter(tarefas.status.in_(("pendente", "executando", "falhou"))) \
+            .group_by(tarefas.status)
+        por_status = {status: (total, idade) for status, total, idade in (await db.execute(stmt)).all()}
+        await db.execute(delete(tarefas).filter(
+            tarefas.status == "concluida",
+            tarefas.data_conclusao < func.now() - timedelta(days=TAREFAS_RETENCAO_DIAS),
+        ))
+        await db.commit()
+
+    _fila["pendentes"] = por_status.get("pendente", (0, None))[0]
+    _fila["executando"] = por_status.get("executando", (0, None))[0]
+    _fila["falhas_definitivas"] = por_status.get("falhou", (0, None))[0]
+    _fila["idade_max_segundos"] = round(float(por_status.get("pendente", (0, None))[1] or 0), 1)
+
+
+async def executar_worker(parar: asyncio.Event, concorrencia: int, tipos: Optional[Iterable[str]] = None):
+    """
+    Laço do worker: mantém até `concorrencia` tarefas em execução, reivindicando só o que cabe.
+    Com `parar` sinalizado não reivindica mais nada e espera as que estão rodando.
+    """
+    nome = f"{socket.gethostname()}:{os.getpid()}"
+    tipos = list(tipos) if tipos is not None else None
+    em_execucao = set()
+    ultima_manutencao = 0.0
+
+    while not parar.is_set():
+        livres = concorrencia - len(em_execucao)
+        linhas = []
+        if livres > 0:
+            try:
+                linhas = await reivindicar(livres, nome, tipos)
+            except Exception as e:
+                print(f"Erro ao reivindicar tarefas: {str(e)}")
+        for linha in linhas:
+            execucao = asyncio.create_task(executar_tarefa(linha))
+            em_execucao.add(execucao)
+            execucao.add_done_callback(em_execucao.discard)
+
+        if time.monotonic() - ultima_manutencao >= _MANUTENCAO_SEGUNDOS:
+            try:
+                await _manutencao()
+                print(f"[worker {nome}] {stats()}")
+            except Exception as e:
+                print(f"Erro na manutenção da fila de tarefas: {str(e)}")
+            ultima_manutencao = time.monotonic()
+
+        if len(em_execucao) >= concorrencia:
+            # Sem vagas: volta a reivindicar assim que uma tarefa terminar
+            await asyncio.wait(set(em_execucao), timeout=TAREFAS_INTERVALO, return_when=asyncio.FIRST_COMPLETED)
+        elif not linhas:
+            try:
+                await asyncio.wait_for(parar.wait(), timeout=TAREFAS_INTERVALO)
+            except asyncio.TimeoutError:
+                pass
+
+    if em_execucao:
+        print(f"[worker {nome}] aguardando {len(em_execucao)} tarefa(s) em execução")
+        await asyncio.gather(*em_execucao, return_exceptions=True)
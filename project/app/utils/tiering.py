@@ -0,0 +1,205 @@
+import os
+import io
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from PIL import Image
+from sqlalchemy import bindparam
+from sqlalchemy.future import select
+
+from ..database import models
+from ..database.database import SessionLocal
+from ..crud.objetos import _bloquear_hashes
+from .imagens import executar_no_pool
+from .storage import storage, nomes_camada_fria, TIERING_PREFIXO
+
+# Objetos mais antigos que isso (pela data de modificação no armazenamento) vão para a camada fria
+TIERING_IDADE_DIAS = int(os.getenv("TIERING_IDADE_DIAS", 365))
+TIERING_CONCORRENCIA = int(os.getenv("TIERING_CONCORRENCIA", 8))
+# Classe de armazenamento dos objetos frios (ex.: REDUCED_REDUNDANCY no MinIO: menos paridade)
+TIERING_STORAGE_CLASS = os.getenv("TIERING_STORAGE_CLASS") or None
+
+# Só formatos sem perda são recomprimidos (PNG -> WebP lossless); JPEG/PDF são movidos como estão
+TIPOS_RECOMPRIMIVEIS = {"image/png"}
+
+TABELAS = (
+    ("tiering:imagens_lesao", models.RegistroLesoesImagens),
+    ("tiering:termos_consentimento", models.TermoConsentimento),
+)
+
+TOTAIS_VAZIOS = {"objetos_movidos": 0, "objetos_recomprimidos": 0, "bytes_movidos": 0, "bytes_economizados": 0}
+
+
+def recomprimir_sem_perda(dados: bytes) -> Optional[bytes]:
+    """
+    Executado no pool de processos. PNG de 8 bits -> WebP lossless, conferido pixel a pixel.
+    Retorna None quando não se aplica (outro formato, 16 bits) ou quando não fica menor.
+    """
+    with Image.open(io.BytesIO(dados)) as original:
+        if original.format != "PNG" or original.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+            return None
+        original.load()
+        icc_profile = original.info.get("icc_profile")
+        tem_alfa = original.mode in ("LA", "RGBA") or "transparency" in original.info
+        imagem = original.convert("RGBA" if tem_alfa else "RGB")
+
+    buffer = io.BytesIO()
+    opcoes = {"lossless": True, "quality": 100, "method": 6}
+    if icc_profile:
+        opcoes["icc_profile"] = icc_profile
+    imagem.save(buffer, format="WEBP", **opcoes)
+    webp = buffer.getvalue()
+
+    with Image.open(io.BytesIO(webp)) as conferida:
+        if conferida.convert(imagem.mode).tobytes() != imagem.tobytes():
+            return None
+    return webp if len(webp) < len(dados) else None
+
+
+async def _mover(arquivo_path: str, corte: datetime, limite: asyncio.Semaphore) -> Optional[dict]:
+    async with limite:
+        stat = await storage.stat(arquivo_path)
+        if stat is None or stat.modificado_em > corte:
+            return None
+
+        metadata = {"x-amz-storage-class": TIERING_STORAGE_CLASS} if TIERING_STORAGE_CLASS else None
+        destino, tamanho_final = nomes_camada_fria(arquivo_path)[0], stat.tamanho
+
+        webp = None
+        if stat.content_type in TIPOS_RECOMPRIMIVEIS:
+            dados = await storage.baixar(arquivo_path)
+            webp = await executar_no_pool(recomprimir_sem_perda, dados)
+        if webp is not None:
+            destino, tamanho_final = nomes_camada_fria(arquivo_path)[1], len(webp)
+            await storage.enviar(destino, webp, "image/webp", metadata=metadata)
+        else:
+            await storage.copiar(arquivo_path, destino, stat.content_type, metadata)
+
+        return {
+            "b_origem": arquivo_path,
+            "b_destino": destino,
+            "bytes_antes": stat.tamanho,
+            "bytes_depois": tamanho_final,
+            "recomprimido": webp is not None,
+        }
+
+
+async def _atualizar_caminhos(db, modelo, movidos):
+    """Um UPDATE por tabela para o lote inteiro (executemany), inclusive a contagem de referências."""
+    valores = {"arquivo_path": bindparam("b_destino")}
+    if modelo is models.RegistroLesoesImagens:
+        # Os tiles são derivados do caminho do original: a pirâmide é gerada de novo no próximo acesso
+        valores["piramide_nivel_max"] = None
+    parametros = [{"b_origem": m["b_origem"], "b_destino": m["b_destino"]} for m in movidos]
+    tabela = modelo.__table__
+    await db.execute(tabela.update().where(tabela.c.arquivo_path == bindparam("b_origem")).values(**valores), parametros)
+    objetos = models.ObjetoArmazenado.__table__
+    await db.execute(
+        objetos.update().where(objetos.c.object_name == bindparam("b_origem")).values(object_name=bindparam("b_destino")),
+        parametros
+    )
+
+
+async def _remover_originais(nome: str, modelo, movidos, limite: asyncio.Semaphore):
+    """
+    Apaga os originais quentes depois do commit dos caminhos novos (nunca há registro apontando para
+    objeto removido). Roda com o lock de cada sha256, como a limpeza de órfãos: um upload deduplicado
+    que resolveu o caminho antigo ou registrou antes (e é corrigido aqui, na mesma transação) ou
+    registra depois e confere que o objeto sumiu.
+    """
+    async with SessionLocal() as db:
+        objetos = models.ObjetoArmazenado
+        stmt = select(objetos.sha256).filter(objetos.object_name.in_([m["b_destino"] for m in movidos]))
+        await _bloquear_hashes(db, (await db.execute(stmt)).scalars().all())
+
+        async def remover(movido):
+            async with limite:
+                await storage.remover(movido["b_origem"])
+                if modelo is models.RegistroLesoesImagens:
+                    base, _ = os.path.splitext(movido["b_origem"])
+                    await storage.remover_prefixo(f"{base}_files/")
+
+        falhas = await asyncio.gather(*(remover(movido) for movido in movidos), return_exceptions=True)
+        for movido, falha in zip(movidos, falhas):
+            if isinstance(falha, Exception):
+                print(f"[{nome}] erro ao remover {movido['b_origem']}: {str(falha)}")
+
+        await _atualizar_caminhos(db, modelo, movidos)
+        await db.commit()
+
+
+async def _carregar_progresso(nome: str, reiniciar: bool):
+    if reiniciar:
+        return 0, dict(TOTAIS_VAZIOS)
+    async with SessionLocal() as db:
+        progresso = await db.get(models.ProgressoJob, nome)
+        if progresso is None:
+            return 0, dict(TOTAIS_VAZIOS)
+        return progresso.ultimo_id, {**TOTAIS_VAZIOS, **(progresso.totais or {})}
+
+
+async def _mover_tabela(nome: str, modelo, lote: int, idade_dias: int, reiniciar: bool) -> dict:
+    ultimo_id, totais = await _carregar_progresso(nome, reiniciar)
+    if ultimo_id:
+        print(f"[{nome}] retomando após o id {ultimo_id}")
+    corte = datetime.now(timezone.utc) - timedelta(days=idade_dias)
+    limite = asyncio.Semaphore(TIERING_CONCORRENCIA)
+
+    while True:
+        async with SessionLocal() as db:
+            stmt = (
+                select(modelo.id, modelo.arquivo_path)
+                .filter(modelo.id > ultimo_id, ~modelo.arquivo_path.startswith(TIERING_PREFIXO))
+                .order_by(modelo.id)
+                .limit(lote)
+            )
+            rows = (await db.execute(stmt)).all()
+        if not rows:
+            break
+
+        caminhos = list(dict.fromkeys(row.arquivo_path for row in rows))
+        resultados = await asyncio.gather(*(_mover(caminho, corte, limite) for caminho in caminhos), return_exceptions=True)
+        movidos = []
+        for caminho, resultado in zip(caminhos, resultados):
+            if isinstance(resultado, Exception):
+                print(f"[{nome}] erro ao mover {caminho}: {str(resultado)}")
+            elif resultado is not None:
+                movidos.append(resultado)
+
+        ultimo_id = rows[-1].id
+        for movido in movidos:
+            totais["objetos_movidos"] += 1
+            totais["objetos_recomprimidos"] += int(movido["recomprimido"])
+            totais["bytes_movidos"] += movido["bytes_antes"]
+            totais["bytes_economizados"] += movido["bytes_antes"] - movido["bytes_depois"]
+
+        # Caminhos novos e ponto de retomada na mesma transação
+        async with SessionLocal() as db:
+            if movidos:
+                await _atualizar_caminhos(db, modelo, movidos)
+            await db.merge(models.ProgressoJob(nome=nome, ultimo_id=ultimo_id, totais=totais))
+            await db.commit()
+
+        if movidos:
+            await _remover_originais(nome, modelo, movidos, limite)
+
+        print(f"[{nome}] até o id {ultimo_id}: {totais['objetos_movidos']} objetos movidos, "
+              f"{totais['bytes_economizados']} bytes economizados")
+
+    # Passada completa: a próxima execução recomeça do início (objetos que envelheceram desde então)
+    async with SessionLocal() as db:
+        await db.merge(models.ProgressoJob(nome=nome, ultimo_id=0, totais=None))
+        await db.commit()
+    return totais
+
+
+async def executar_tiering(lote: int = 500, idade_dias: int = TIERING_IDADE_DIAS, reiniciar: bool = False) -> dict:
+    """
+    Move para a camada fria os objetos antigos de todas as tabelas e retorna os totais por tabela.
+    Interrompido, retoma do último lote confirmado (a menos que `reiniciar`).
+    """
+    return {
+        nome: await _mover_tabela(nome, modelo, lote, idade_dias, reiniciar)
+        for nome, modelo in TABELAS
+    }
@@ -0,0 +1,53 @@
+"""
+Worker da fila de tarefas (tabela `tarefas`): roda fora dos processos da API, quantas réplicas
+forem necessárias (as tarefas são reivindicadas com SKIP LOCKED).
+
+Uso (a partir de project/):
+    python -m app.worker [--concorrencia 4] [--threads 8] [--processos N] [--tipos imagens.processar ...]
+
+SIGTERM/SIGINT: para de reivindicar e termina as tarefas em execução antes de sair.
+"""
+import os
+import signal
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils import tarefas
+# Importar os módulos registra os tipos de tarefa (@tarefa)
+from app.utils.imagens import IMAGENS_MAX_WORKERS, configurar_process_pool, shutdown_process_pool
+
+# Tarefas executadas ao mesmo tempo por este worker
+TAREFAS_WORKER_CONCORRENCIA = int(os.getenv("TAREFAS_WORKER_CONCORRENCIA", 4))
+# Pool de threads padrão do event loop (asyncio.to_thread e handlers com executor="thread")
+TAREFAS_WORKER_THREADS = int(os.getenv("TAREFAS_WORKER_THREADS", 8))
+
+
+async def main(concorrencia: int, threads: int, tipos):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=threads, thread_name_prefix="tarefas"))
+
+    parar = asyncio.Event()
+    for sinal in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sinal, parar.set)
+
+    print(f"Worker iniciado: concorrência {concorrencia}, tipos {', '.join(tipos)}")
+    await tarefas.executar_worker(parar, concorrencia, tipos)
+    print("Worker encerrado")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa as tarefas da fila em Postgres")
+    parser.add_argument("--concorrencia", type=int, default=TAREFAS_WORKER_CONCORRENCIA)
+    parser.add_argument("--threads", type=int, default=TAREFAS_WORKER_THREADS)
+    parser.add_argument("--processos", type=int, default=IMAGENS_MAX_WORKERS,
+                        help="Tamanho do pool de processos (trabalho de CPU: imagens, ABCD, pirâmides)")
+    parser.add_argument("--tipos", nargs="+", choices=tarefas.tipos_registrados(), default=tarefas.tipos_registrados(),
+                        help="Só reivindica estes tipos de tarefa (padrão: todos os registrados)")
+    args = parser.parse_args()
+
+    configurar_process_pool(args.processos)
+    try:
+        asyncio.run(main(args.concorrencia, args.threads, args.tipos))
+    finally:
+        shutdown_process_pool()
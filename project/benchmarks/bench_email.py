@@ -0,0 +1,113 @@
+"""
+Vazão de envio de e-mails contra um servidor SMTP local que só descarta as mensagens (sink).
+
+Compara o envio antigo (uma conexão nova por e-mail: conexão + EHLO + envio + QUIT) com o
+DespachanteEmail (pool de conexões persistentes, mensagens em lote). `--rtt-ms` atrasa cada
+resposta do servidor, simulando a latência de rede até um provedor real; o handshake TLS e o
+login, ausentes no sink, custariam ainda mais idas e voltas por conexão no envio antigo.
+
+Uso (a partir de project/):
+    python -m benchmarks.bench_email [--mensagens 500] [--conexoes 2] [--lote 50] [--rtt-ms 5]
+"""
+import argparse
+import smtplib
+import socketserver
+import threading
+import time
+
+from app.utils.send_email import DespachanteEmail, montar_mensagem
+
+
+class _SessaoSink(socketserver.StreamRequestHandler):
+    """SMTP mínimo: responde 250 a tudo e descarta o conteúdo após DATA."""
+
+    def _responder(self, linha: str):
+        if self.server.rtt:
+            time.sleep(self.server.rtt)
+        self.wfile.write(linha.encode() + b"\r\n")
+
+    def handle(self):
+        self._responder("220 sink ESMTP")
+        while True:
+            linha = self.rfile.readline()
+            if not linha:
+                return
+            comando = linha.strip().upper()
+            if comando.startswith((b"EHLO", b"HELO")):
+                self._responder("250-sink\r\n250 8BITMIME")
+            elif comando == b"DATA":
+                self._responder("354 fim com <CRLF>.<CRLF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with self.server.lock:
+                    self.server.recebidas += 1
+                self._responder("250 OK")
+            elif comando == b"QUIT":
+                self._responder("221 tchau")
+                return
+            else:
+                self._responder("250 OK")
+
+
+class ServidorSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, rtt: float):
+        super().__init__(("127.0.0.1", 0), _SessaoSink)
+        self.rtt = rtt
+        self.recebidas = 0
+        self.lock = threading.Lock()
+
+
+def _envio_antigo(porta, mensagens):
+    for destinatario, mensagem in mensagens:
+        with smtplib.SMTP("127.0.0.1", porta) as smtp:
+            smtp.sendmail("bench@example.com", destinatario, mensagem)
+
+
+def _envio_despachante(porta, mensagens, conexoes, lote):
+    despachante = DespachanteEmail("127.0.0.1", porta, starttls=False, conexoes=conexoes, lote=lote)
+    futuros = [despachante.enviar("bench@example.com", destinatario, mensagem) for destinatario, mensagem in mensagens]
+    for futuro in futuros:
+        futuro.result()
+    despachante.encerrar()
+    return despachante.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mensagens", type=int, default=500)
+    parser.add_argument("--conexoes", type=int, default=2)
+    parser.add_argument("--lote", type=int, default=50)
+    parser.add_argument("--rtt-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    servidor = ServidorSink(args.rtt_ms / 1000)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    porta = servidor.server_address[1]
+
+    corpo = "<html><body><p>Olá,</p><p>" + "Texto do convite. " * 40 + "</p></body></html>"
+    mensagens = [
+        (f"usuario{i}@example.com", montar_mensagem("bench@example.com", f"usuario{i}@example.com", "Convite", corpo, html=True))
+        for i in range(args.mensagens)
+    ]
+
+    inicio = time.perf_counter()
+    _envio_antigo(porta, mensagens)
+    antigo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    stats = _envio_despachante(porta, mensagens, args.conexoes, args.lote)
+    despachante = time.perf_counter() - inicio
+
+    servidor.shutdown()
+    # Cada modo envia todas as mensagens uma vez
+    print(f"{args.mensagens} mensagens, RTT simulado {args.rtt_ms} ms, {servidor.recebidas // 2} recebidas pelo sink por modo")
+    print(f"  uma conexão por e-mail: {antigo:.2f} s ({args.mensagens / antigo:.0f} msg/s)")
+    print(f"  despachante ({args.conexoes} conexões, lote {args.lote}): {despachante:.2f} s "
+          f"({args.mensagens / despachante:.0f} msg/s, {stats['conexoes_abertas']} conexões abertas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Vazão da normalização de imagens no upload (decodificação, EXIF, métricas de qualidade,
+redimensionamento, reencode JPEG) e custo das métricas de qualidade frente a QUALIDADE_ALVO_MS.
+
+Roda `normalizar_imagem` sobre todas as imagens de uma pasta: primeiro em série
+(um núcleo, equivalente a fazer o trabalho no event loop) e depois no pool de processos.
+
+Uso (a partir de project/):
+    python -m benchmarks.bench_normalizacao <pasta> [--workers N] [--repeticoes 3]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.utils.imagens import normalizar_imagem, ImagemInvalidaError, IMAGENS_MAX_WORKERS
+from app.utils.qualidade import QUALIDADE_ALVO_MS
+
+EXTENSOES = {".jpg", ".jpeg", ".png", ".webp", ".heic", ".heif"}
+
+
+def _carregar(pasta: str):
+    arquivos = []
+    for nome in sorted(os.listdir(pasta)):
+        if os.path.splitext(nome)[1].lower() in EXTENSOES:
+            with open(os.path.join(pasta, nome), "rb") as f:
+                arquivos.append((nome, f.read()))
+    return arquivos
+
+
+def _normalizar(dados: bytes):
+    try:
+        normalizada = normalizar_imagem(dados)
+        return len(normalizada["dados"]), normalizada["qualidade"]["tempo_ms"]
+    except ImagemInvalidaError:
+        return None
+
+
+def _medir(mapear, imagens, repeticoes):
+    melhor = float("inf")
+    tamanhos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        tamanhos = list(mapear(_normalizar, imagens))
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, tamanhos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pasta")
+    parser.add_argument("--workers", type=int, default=IMAGENS_MAX_WORKERS)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    arquivos = _carregar(args.pasta)
+    if not arquivos:
+        raise SystemExit(f"Nenhuma imagem ({', '.join(sorted(EXTENSOES))}) em {args.pasta}")
+    imagens = [dados for _, dados in arquivos]
+    bytes_originais = sum(len(dados) for dados in imagens)
+
+    t_serie, tamanhos = _medir(map, imagens, args.repeticoes)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(_normalizar, imagens[:args.workers]))  # aquece os processos
+        t_pool, _ = _medir(pool.map, imagens, args.repeticoes)
+
+    validas = [resultado for resultado in tamanhos if resultado is not None]
+    invalidas = len(tamanhos) - len(validas)
+    bytes_normalizados = sum(tamanho for tamanho, _ in validas)
+    tempos_qualidade = sorted(tempo_ms for _, tempo_ms in validas)
+    mb = bytes_originais / (1024 * 1024)
+
+    print(f"{len(imagens)} imagens, {mb:.1f} MB ({invalidas} inválidas)")
+    print(f"tamanho normalizado: {bytes_normalizados / (1024 * 1024):.1f} MB "
+          f"({bytes_normalizados / bytes_originais:.0%} do original)")
+    if tempos_qualidade:
+        p95 = tempos_qualidade[min(int(len(tempos_qualidade) * 0.95), len(tempos_qualidade) - 1)]
+        print(f"métricas de qualidade: média {sum(tempos_qualidade) / len(tempos_qualidade):.2f} ms, "
+              f"p95 {p95:.2f} ms (alvo {QUALIDADE_ALVO_MS:.0f} ms)")
+    print(f"{'modo':<22}{'tempo (s)':>12}{'imagens/s':>12}{'MB/s':>10}")
+    for nome, tempo in (("série (1 núcleo)", t_serie), (f"pool ({args.workers} processos)", t_pool)):
+        print(f"{nome:<22}{tempo:>12.2f}{len(imagens) / tempo:>12.1f}{mb / tempo:>10.1f}")
+    print(f"ganho do pool: {t_serie / t_pool:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
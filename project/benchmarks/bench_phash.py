@@ -0,0 +1,83 @@
+"""
+Tempo de agrupamento de quase-duplicatas no índice de dHash, com hashes sintéticos.
+
+Gera N hashes aleatórios e, para uma fração deles, cópias com até `raio` bits trocados
+(fotos da mesma lesão tiradas em sequência); `--uniformes` é a fração de hashes com o primeiro
+bloco de 16 bits zerado (fotos quase uniformes, que caem todas no mesmo balde). Mede a reconstrução
+do índice e a busca de clusters no dataset inteiro (primeira consulta, repetida com o índice
+inalterado e depois de um hash novo) e em um atendimento, sem banco de dados.
+
+Uso (a partir de project/):
+    python -m benchmarks.bench_phash [--imagens 1000000] [--duplicatas 0.05] [--uniformes 0.01] [--raio 3]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.utils.phash import IndiceHashPerceptual
+
+
+def _hashes(n: int, fracao: float, uniformes: float, raio: int, rng):
+    originais = rng.integers(0, 2**63, size=n, dtype=np.int64)
+    originais[:int(n * uniformes)] &= ~np.int64(0xFFFF)
+    copias = rng.choice(n, size=int(n * fracao), replace=False)
+    # Até `raio` bits trocados por cópia (posições sorteadas podem repetir: distância <= raio)
+    bits = rng.integers(0, 64, size=(copias.size, raio), dtype=np.uint64)
+    mascaras = np.bitwise_or.reduce(np.uint64(1) << bits, axis=1)
+    hashes = originais.view(np.uint64)
+    hashes = np.concatenate([hashes, hashes[copias] ^ mascaras])
+    return hashes.view(np.int64), copias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--imagens", type=int, default=1_000_000)
+    parser.add_argument("--duplicatas", type=float, default=0.05)
+    parser.add_argument("--uniformes", type=float, default=0.01)
+    parser.add_argument("--raio", type=int, default=3)
+    parser.add_argument("--pendentes", type=int, default=1000)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    hashes, copias = _hashes(args.imagens, args.duplicatas, args.uniformes, args.raio, rng)
+    ids = np.arange(1, hashes.size + 1)
+    atendimentos = rng.integers(1, max(hashes.size // 20, 2), size=hashes.size)
+    atendimentos[args.imagens:] = atendimentos[copias]  # a cópia é do mesmo atendimento
+
+    indice = IndiceHashPerceptual()
+    corte = hashes.size - args.pendentes
+    indice._adicionar(list(zip(ids[:corte], hashes[:corte], atendimentos[:corte])))
+    inicio = time.perf_counter()
+    indice._reconstruir()
+    t_reconstrucao = time.perf_counter() - inicio
+    indice._adicionar(list(zip(ids[corte:-1], hashes[corte:-1], atendimentos[corte:-1])))
+
+    inicio = time.perf_counter()
+    grupos = indice._clusters(args.raio, None)
+    t_dataset = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    indice._clusters(args.raio, None)
+    t_cache = time.perf_counter() - inicio
+
+    indice._adicionar([(ids[-1], hashes[-1], atendimentos[-1])])
+    inicio = time.perf_counter()
+    indice._clusters(args.raio, None)
+    t_novo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    indice._clusters(args.raio, int(atendimentos[corte - 1]))
+    t_atendimento = time.perf_counter() - inicio
+
+    print(f"{hashes.size} hashes ({copias.size} quase-duplicatas, {int(args.imagens * args.uniformes)} uniformes, "
+          f"{args.pendentes} pendentes), raio {args.raio}")
+    print(f"reconstrução do índice:   {t_reconstrucao * 1000:8.1f} ms")
+    print(f"clusters (dataset):       {t_dataset * 1000:8.1f} ms  -> {len(grupos)} clusters")
+    print(f"clusters (em cache):      {t_cache * 1000:8.1f} ms")
+    print(f"clusters (+1 hash novo):  {t_novo * 1000:8.1f} ms")
+    print(f"clusters (atendimento):   {t_atendimento * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Custo de serialização por resposta das rotas de atendimento.
+
+antes:  retorno sem response_model -> jsonable_encoder -> json.dumps (JSONResponse)
+depois: response_model pydantic v2 -> validate + dump(mode="json") -> orjson (ORJSONResponse)
+
+Uso (a partir de project/):
+    python -m benchmarks.bench_serializacao [--repeticoes 200]
+"""
+import argparse
+import json
+import random
+import timeit
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.database.schemas import AtendimentoResumoOut, InformacoesCompletasOut, LesaoOut, PacienteOut
+
+
+def _paciente(i: int):
+    return SimpleNamespace(
+        id=i,
+        nome_paciente=f"Paciente {i}",
+        data_nascimento=date(1950, 1, 1) + timedelta(days=i % 20000),
+        sexo=random.choice(["M", "F", "NB", "NR", "O"]),
+        sexo_outro=None,
+        cpf_paciente=f"{10000000000 + i:011d}",
+        num_cartao_sus=f"{100000000000000 + i}",
+        endereco_paciente="Rua das Flores, 123 - Centro, São Paulo - SP, 01000-000",
+        telefone_paciente=f"{11000000000 + i:011d}",
+        email_paciente=f"paciente{i}@exemplo.com",
+        autoriza_pesquisa=bool(i % 2),
+    )
+
+
+def _atendimentos(n: int):
+    agora = datetime(2025, 1, 1, 12, 0)
+    return [
+        {
+            "id": i,
+            "data_atendimento": agora + timedelta(hours=i),
+            "paciente_id": i,
+            "nome_paciente": f"Paciente {i}",
+            "cpf_paciente": f"{10000000000 + i:011d}",
+            "termo_consentimento_id": i,
+            "saude_geral_id": i,
+            "avaliacao_fototipo_id": None,
+        }
+        for i in range(n)
+    ]
+
+
+def _informacoes_completas():
+    return {
+        "message": "Informações cadastradas com sucesso!",
+        "saude_geral": SimpleNamespace(
+            id=1, doencas_cronicas=True, hipertenso=True, diabetes=False, cardiopatia=False,
+            outras_doencas="Hipertensão leve", diagnostico_cancer=False, tipo_cancer=None,
+            uso_medicamentos=True, medicamentos="Losartana 50mg", possui_alergia=False, alergias=None,
+            ciruturgias_dermatologicas=False, tipo_procedimento=None, pratica_atividade_fisica=True,
+            frequencia_atividade_fisica="Moderada",
+        ),
+        "avaliacao_fototipo": SimpleNamespace(
+            id=1, cor_pele=4, cor_olhos=2, cor_cabelo=1, quantidade_sardas=0,
+            reacao_sol=2, bronzeamento=4, sensibilidade_solar=1,
+        ),
+        "historico_cancer_pele": SimpleNamespace(
+            id=1, historico_familiar=True, grau_parentesco="Mãe", tipo_cancer_familiar="Melanoma",
+            tipo_cancer_familiar_outro=None, diagnostico_pessoal=False, tipo_cancer_pessoal=None,
+            tipo_cancer_pessoal_outro=None, lesoes_precancerigenas=False, tratamento_lesoes=False,
+            tipo_tratamento=None, tipo_tratamento_outro=None,
+        ),
+        "fatores_risco_protecao": SimpleNamespace(
+            id=1, exposicao_solar_prolongada=True, frequencia_exposicao_solar="Diariamente",
+            queimaduras_graves=False, quantidade_queimaduras=None, uso_protetor_solar=True,
+            fator_protecao_solar="50", uso_chapeu_roupa_protecao=False, bronzeamento_artificial=False,
+            checkups_dermatologicos=True, frequencia_checkups="Anualmente", frequencia_checkups_outro=None,
+            participacao_campanhas_prevencao=False,
+        ),
+        "investigacao_lesoes_suspeitas": SimpleNamespace(
+            id=1, mudanca_pintas_manchas=True, sintomas_lesoes=False, tempo_alteracoes="1-3 meses",
+            caracteristicas_lesoes=True, consulta_medica=False, diagnostico_lesoes=None,
+        ),
+    }
+
+
+def _lesoes(n: int, imagens_por_lesao: int):
+    return [
+        {
+            "id": i,
+            "local_lesao_id": i % 31 + 1,
+            "local_lesao_nome": "Antebraço esquerdo",
+            "descricao_lesao": "Lesão pigmentada assimétrica com bordas irregulares " * 4,
+            "imagens": [
+                f"imagens-lesoes/imagens-lesoes_20250101120000_{i:04d}{k:04d}.jpg"
+                for k in range(imagens_por_lesao)
+            ],
+        }
+        for i in range(n)
+    ]
+
+
+def antes(payload) -> bytes:
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False).encode("utf-8")
+
+
+def depois(adapter: TypeAdapter):
+    def serializar(payload) -> bytes:
+        return orjson.dumps(adapter.dump_python(adapter.validate_python(payload, from_attributes=True), mode="json"))
+    return serializar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+    random.seed(0)
+
+    cenarios = [
+        ("paciente", _paciente(1), TypeAdapter(PacienteOut)),
+        ("informacoes-completas", _informacoes_completas(), TypeAdapter(InformacoesCompletasOut)),
+        ("atendimentos x100", _atendimentos(100), TypeAdapter(List[AtendimentoResumoOut])),
+        ("atendimentos x2000", _atendimentos(2000), TypeAdapter(List[AtendimentoResumoOut])),
+        ("lesoes x50 (4 imagens)", _lesoes(50, 4), TypeAdapter(List[LesaoOut])),
+    ]
+
+    print(f"{'cenário':<26}{'bytes':>10}{'antes (µs)':>14}{'depois (µs)':>14}{'ganho':>8}")
+    for nome, payload, adapter in cenarios:
+        serializar = depois(adapter)
+        tamanho = len(serializar(payload))
+        t_antes = min(timeit.repeat(lambda: antes(payload), number=args.repeticoes, repeat=3)) / args.repeticoes
+        t_depois = min(timeit.repeat(lambda: serializar(payload), number=args.repeticoes, repeat=3)) / args.repeticoes
+        print(f"{nome:<26}{tamanho:>10}{t_antes * 1e6:>14.1f}{t_depois * 1e6:>14.1f}{t_antes / t_depois:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Chamadas ao MinIO não podem travar o event loop: com o MinIO parado (um servidor local que aceita
+a conexão e nunca responde), as outras rotas continuam respondendo e o upload falha pelo timeout
+da operação.
+
+Uso (a partir de project/):
+    python -m pytest tests
+"""
+import time
+import asyncio
+import threading
+import socketserver
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.utils import minio as minio_utils
+
+# Limite para uma rota que não toca no MinIO responder enquanto um upload está parado
+LIMITE_RESPOSTA_SEGUNDOS = 0.5
+
+
+class _ServidorParado(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+@pytest.fixture
+def minio_parado(monkeypatch):
+    """Servidor no lugar do MinIO: lê a requisição e segura a conexão sem responder até o fim do teste."""
+    liberar = threading.Event()
+
+    class Segurar(socketserver.BaseRequestHandler):
+        def handle(self):
+            self.request.recv(65536)
+            liberar.wait()
+
+    servidor = _ServidorParado(("127.0.0.1", 0), Segurar)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    monkeypatch.setenv("MINIO_ENDPOINT", f"127.0.0.1:{servidor.server_address[1]}")
+    monkeypatch.setenv("MINIO_ACCESS_KEY", "teste")
+    monkeypatch.setenv("MINIO_SECRET_KEY", "teste-segredo")
+    monkeypatch.setenv("MINIO_SECURE", "False")
+    monkeypatch.setenv("MINIO_BUCKET", "teste")
+    monkeypatch.setattr(minio_utils, "MINIO_REGION", "us-east-1")
+    monkeypatch.setattr(minio_utils, "MINIO_TIMEOUT_OPERACAO", 2.0)
+    monkeypatch.setattr(minio_utils, "_client", None)
+    monkeypatch.setattr(minio_utils, "_buckets_verificados", {"teste"})
+    yield
+    # Fecha as conexões seguradas: as threads do pool do MinIO saem com erro em vez de esperar o read timeout
+    liberar.set()
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload():
+        await minio_utils.enviar_bytes("lento.bin", b"x" * 1024)
+        return {"ok": True}
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_rotas_respondem_com_upload_parado(minio_parado, app):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://teste") as client:
+        upload = asyncio.create_task(client.post("/upload"))
+        # Dá tempo do upload chegar ao servidor parado
+        await asyncio.sleep(0.2)
+
+        inicio = time.perf_counter()
+        respostas = await asyncio.gather(*(client.get("/ping") for _ in range(5)))
+        decorrido = time.perf_counter() - inicio
+
+        assert all(resposta.status_code == 200 for resposta in respostas)
+        assert decorrido < LIMITE_RESPOSTA_SEGUNDOS
+        assert not upload.done()
+
+        await upload
+
+
+@pytest.mark.asyncio
+async def test_upload_parado_falha_pelo_timeout_da_operacao(minio_parado, app):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://teste") as client:
+        inicio = time.perf_counter()
+        resposta = await client.post("/upload")
+        decorrido = time.perf_counter() - inicio
+
+    assert resposta.status_code == 504
+    assert decorrido < minio_utils.MINIO_TIMEOUT_OPERACAO + 1